@@ -1,11 +1,14 @@
 import time
-import numpy as np
-import torch
-from flask import Flask, request, jsonify, make_response
+# time is imported before the other modules on purpose: the startup time (sheep_startup_seconds) is measured from
+# here to the service being ready, so it includes the imports of the app (flask, and torch with the models) too
+startup_start_time = time.perf_counter()
+import os
+from flask import Flask, Response, request, jsonify, make_response
 from flask_restplus import Api, Resource, fields
-from threading import Thread
-from sheep_env import SheepEnv
-from sheep_model import SheepModel
+from sheep_metrics import CONTENT_TYPE, render, value_family
+from sheep_protocol import BINARY_MIMETYPE
+from sheep_recorder import TrajectoryRecorder
+from sheep_service import SheepService, AGENT_CKPT_PATH
 
 flask_app = Flask(__name__)
 app = Api(
@@ -20,37 +23,79 @@ model = app.model(
     'DI-sheep params', {
         'command': fields.String(required=False, description="Command Field", help="reset, step"),
         'argument': fields.Integer(required=False, description="Argument Field", help="reset->level, step->action"),
+        'version': fields.Integer(required=False, description="Protocol Version Field", help="1 (default), 2 (delta)"),
     }
 )
-MAX_ENV_NUM = 50
-ENV_TIMEOUT_SECOND = 60
-envs = {}
-model = SheepModel(item_obs_size=80, item_num=30, global_obs_size=19)
-ckpt = torch.load('ckpt_best.pth.tar', map_location='cpu')['model']
-ckpt = {'item_encoder.encoder' + k.split('item_encoder')[-1] if 'item_encoder' in k else k: v for k, v in ckpt.items()}  # compatibility for v1 and v2 model
-model.load_state_dict(ckpt)
+# the inference backend of the model: eager, torchscript, torchscript_int8, onnx or onnx_int8 (see sheep_export.py)
+BACKEND = os.environ.get('SHEEP_BACKEND', 'eager')
+# the checkpoint of each level, with its item encoder type and dead item mode if they are not saved in it, e.g.:
+# SHEEP_CKPT='1-9:ckpt_best.pth.tar::pack;10:ckpt_level10.pth.tar:MLP' (see sheep_registry.py), the changed
+# checkpoint files are swapped in without restart, polled every SHEEP_CKPT_POLL_SECOND
+CKPT = os.environ.get('SHEEP_CKPT', AGENT_CKPT_PATH)
+CKPT_POLL_SECOND = float(os.environ.get('SHEEP_CKPT_POLL_SECOND', 2))
+registry = None
+# the sessions are sharded over SHEEP_SHARD_NUM worker processes if it is set, e.g.:
+# SHEEP_SHARD_NUM=4 FLASK_APP=agent_app.py flask run
+SHARD_NUM = int(os.environ.get('SHEEP_SHARD_NUM', 0))
+# the session limit of the service, or of each of its worker processes, the least recently used session is evicted
+MAX_ENV_NUM = int(os.environ.get('SHEEP_MAX_ENV_NUM', 50))
+# the games are recorded to SHEEP_RECORD_PATH if it is set (see sheep_recorder.py)
+RECORD_PATH = os.environ.get('SHEEP_RECORD_PATH')
+recorder = TrajectoryRecorder(RECORD_PATH) if RECORD_PATH and SHARD_NUM == 0 else None
+# the agent actions are from the models of SHEEP_CKPT (model) or from the lookahead search (lookahead)
+AGENT_POLICY = os.environ.get('SHEEP_AGENT_POLICY', 'model')
+assert AGENT_POLICY in ['model', 'lookahead'], AGENT_POLICY
+if AGENT_POLICY == 'lookahead':
+    # the model options are not used, rather than silently ignored
+    for name in ['SHEEP_CKPT', 'SHEEP_CKPT_POLL_SECOND', 'SHEEP_BACKEND', 'SHEEP_SHARD_NUM']:
+        assert name not in os.environ, '{} is not supported by SHEEP_AGENT_POLICY=lookahead'.format(name)
+if SHARD_NUM > 0:
+    # each worker process loads the models with its own ModelRegistry, whose metrics are in service.collect_metrics()
+    from sheep_shard import ShardedSheepService
+    service = ShardedSheepService(
+        SHARD_NUM,
+        agent=True,
+        ckpt_path=CKPT,
+        backend=BACKEND,
+        record_path=RECORD_PATH,
+        ckpt_poll_interval=CKPT_POLL_SECOND,
+        max_env_num=MAX_ENV_NUM
+    )
+    # wait for the workers to load their models
+    service.stats()
+elif AGENT_POLICY == 'lookahead':
+    # Monte-Carlo rollouts of each legal action instead of the model, within a time budget per request, e.g.:
+    # SHEEP_AGENT_POLICY=lookahead SHEEP_LOOKAHEAD_BUDGET_MS=50 FLASK_APP=agent_app.py flask run
+    from sheep_lookahead import LookaheadPolicy
+    ROLLOUT_NUM = int(os.environ.get('SHEEP_LOOKAHEAD_ROLLOUT_NUM', 16))
+    BUDGET_MS = float(os.environ.get('SHEEP_LOOKAHEAD_BUDGET_MS', 50))
+    service = SheepService(
+        agent=True, policy=LookaheadPolicy(ROLLOUT_NUM, BUDGET_MS), max_env_num=MAX_ENV_NUM, recorder=recorder
+    )
+else:
+    from sheep_registry import ModelRegistry
+    # the observations of the concurrent requests are batched for one forward, SHEEP_BATCH_SIZE=1 disables it
+    BATCH_SIZE = int(os.environ.get('SHEEP_BATCH_SIZE', 16))
+    BATCH_WAIT_MS = float(os.environ.get('SHEEP_BATCH_WAIT_MS', 2))
+    registry = ModelRegistry(CKPT, BACKEND, BATCH_SIZE, BATCH_WAIT_MS, CKPT_POLL_SECOND)
+    service = SheepService(
+        agent=True, max_env_num=MAX_ENV_NUM, recorder=recorder, policy_fn=registry.session_policy
+    )
+startup_time = time.perf_counter() - startup_start_time
+print('DI-sheep agent app started in {:.2f}s'.format(startup_time))
 
 
-def random_action(obs, env):
-    action_mask = obs['action_mask']
-    action = np.random.choice(len(action_mask), p=action_mask / action_mask.sum())
-    return action
-
-
-def env_monitor():
-    while True:
-        cur_time = time.time()
-        pop_keys = []
-        for k, v in envs.items():
-            if cur_time - v['update_time'] >= ENV_TIMEOUT_SECOND:
-                pop_keys.append(k)
-        for k in pop_keys:
-            envs.pop(k)
-        time.sleep(1)
-
-
-app.env_thread = Thread(target=env_monitor, daemon=True)
-app.env_thread.start()
+@flask_app.route("/metrics")
+def metrics():
+    # the request/phase latency histograms, request counters and session metrics in the Prometheus text format, with
+    # the model registry ones (the sharded service has them from its workers)
+    families = service.collect_metrics() + (registry.collect_metrics() if registry is not None else [])
+    families.append(
+        value_family(
+            'sheep_startup_seconds', 'gauge', 'Time from the import of the app to the ready service.', startup_time
+        )
+    )
+    return Response(render(families), content_type=CONTENT_TYPE)
 
 
 @name_space.route("/")
@@ -66,82 +111,23 @@ class MainClass(Resource):
     @app.expect(model)
     def post(self):
         try:
-            t_start = time.time()
             data = request.json
             cmd, arg, uid = data['command'], data['argument'], data['uid']
-            ip = request.remote_addr + uid
-
-            if ip not in envs:
-                if cmd == 'reset':
-                    if len(envs) >= MAX_ENV_NUM:
-                        response = jsonify(
-                            {
-                                "statusCode": 501,
-                                "status": "No enough env resource, please wait a moment",
-                            }
-                        )
-                        response.headers.add('Access-Control-Allow-Origin', '*')
-                        return response
-                    else:
-                        env = SheepEnv(1, agent=True, max_padding=True)
-                        env.seed(0)
-                        envs[ip] = {'env': env, 'update_time': time.time()}
-                else:
-                    response = jsonify(
-                        {
-                            "statusCode": 501,
-                            "status": "No response for too long time, please reset the game",
-                        }
-                    )
-                    response.headers.add('Access-Control-Allow-Origin', '*')
-                    return response
-            else:
-                env = envs[ip]['env']
-                envs[ip]['update_time'] = time.time()
+            version = data.get('version', 1)
+            # binary responses (version 2 only) are negotiated by the Accept header, errors are always json
+            binary = BINARY_MIMETYPE in request.headers.get('Accept', '')
+            ip = request.remote_addr
+            ip = str(ip) + str(uid)
 
-            if cmd == 'reset':
-                obs = env.reset(arg)
-                action = model.compute_action(obs)
-                # action = random_action(obs, env)
-                scene = [item.to_json() for item in env.scene if item is not None]
-                response = jsonify(
-                    {
-                        "statusCode": 200,
-                        "status": "Execution action",
-                        "result": {
-                            "scene": scene,
-                            "max_item_num": env.total_item_num,
-                            "action": action,
-                        }
-                    }
-                )
-            elif cmd == 'step':
-                obs, _, done, _ = env.step(arg)
-                action = model.compute_action(obs)
-                # action = random_action(obs, env)
-                scene = [item.to_json() for item in env.scene if item is not None]
-                bucket = [item.to_json() for item in env.bucket]
-                response = jsonify(
-                    {
-                        "statusCode": 200,
-                        "status": "Execution action",
-                        "result": {
-                            "scene": scene,
-                            "bucket": bucket,
-                            "done": done,
-                            "action": action,
-                        }
-                    }
-                )
+            status_code, status, result = service.execute(ip, cmd, arg, version, binary)
+            if isinstance(result, bytes):
+                response = make_response(result)
+                response.mimetype = BINARY_MIMETYPE
             else:
-                response = jsonify({
-                    "statusCode": 500,
-                    "status": "Invalid command: {}".format(cmd),
-                })
-                response.headers.add('Access-Control-Allow-Origin', '*')
-                return response
-            print('backend process time: {}'.format(time.time() - t_start))
-            print('current env number: {}'.format(len(envs)))
+                response = {"statusCode": status_code, "status": status}
+                if result is not None:
+                    response["result"] = result
+                response = jsonify(response)
             response.headers.add('Access-Control-Allow-Origin', '*')
             return response
         except Exception as e:
@@ -1,8 +1,10 @@
-import time
-from flask import Flask, request, jsonify, make_response
+import os
+from flask import Flask, Response, request, jsonify, make_response
 from flask_restplus import Api, Resource, fields
-from threading import Thread
-from sheep_env import SheepEnv
+from sheep_metrics import CONTENT_TYPE
+from sheep_protocol import BINARY_MIMETYPE
+from sheep_recorder import TrajectoryRecorder
+from sheep_service import SheepService
 
 flask_app = Flask(__name__)
 app = Api(
@@ -17,27 +19,27 @@ model = app.model(
     'DI-sheep params', {
         'command': fields.String(required=False, description="Command Field", help="reset, step"),
         'argument': fields.Integer(required=False, description="Argument Field", help="reset->level, step->action"),
+        'version': fields.Integer(required=False, description="Protocol Version Field", help="1 (default), 2 (delta)"),
     }
 )
-MAX_ENV_NUM = 50
-ENV_TIMEOUT_SECOND = 60
-envs = {}
+# the sessions are sharded over SHEEP_SHARD_NUM worker processes if it is set, e.g.:
+# SHEEP_SHARD_NUM=4 FLASK_APP=app.py flask run
+SHARD_NUM = int(os.environ.get('SHEEP_SHARD_NUM', 0))
+# the session limit of the service, or of each of its worker processes, the least recently used session is evicted
+MAX_ENV_NUM = int(os.environ.get('SHEEP_MAX_ENV_NUM', 50))
+# the games are recorded to SHEEP_RECORD_PATH if it is set (see sheep_recorder.py)
+RECORD_PATH = os.environ.get('SHEEP_RECORD_PATH')
+if SHARD_NUM > 0:
+    from sheep_shard import ShardedSheepService
+    service = ShardedSheepService(SHARD_NUM, record_path=RECORD_PATH, max_env_num=MAX_ENV_NUM)
+else:
+    service = SheepService(max_env_num=MAX_ENV_NUM, recorder=TrajectoryRecorder(RECORD_PATH) if RECORD_PATH else None)
 
 
-def env_monitor():
-    while True:
-        cur_time = time.time()
-        pop_keys = []
-        for k, v in envs.items():
-            if cur_time - v['update_time'] >= ENV_TIMEOUT_SECOND:
-                pop_keys.append(k)
-        for k in pop_keys:
-            envs.pop(k)
-        time.sleep(1)
-
-
-app.env_thread = Thread(target=env_monitor, daemon=True)
-app.env_thread.start()
+@flask_app.route("/metrics")
+def metrics():
+    # the request/phase latency histograms, request counters and session metrics in the Prometheus text format
+    return Response(service.metrics_text(), content_type=CONTENT_TYPE)
 
 
 @name_space.route("/")
@@ -53,75 +55,23 @@ class MainClass(Resource):
     @app.expect(model)
     def post(self):
         try:
-            t_start = time.time()
             data = request.json
             cmd, arg, uid = data['command'], data['argument'], data['uid']
+            version = data.get('version', 1)
+            # binary responses (version 2 only) are negotiated by the Accept header, errors are always json
+            binary = BINARY_MIMETYPE in request.headers.get('Accept', '')
             ip = request.remote_addr
             ip = str(ip) + str(uid)
 
-            if ip not in envs:
-                if cmd == 'reset':
-                    if len(envs) >= MAX_ENV_NUM:
-                        response = jsonify(
-                            {
-                                "statusCode": 501,
-                                "status": "No enough env resource, please wait a moment",
-                            }
-                        )
-                        response.headers.add('Access-Control-Allow-Origin', '*')
-                        return response
-                    else:
-                        env = SheepEnv(1, agent=False)
-                        envs[ip] = {'env': env, 'update_time': time.time()}
-                else:
-                    response = jsonify(
-                        {
-                            "statusCode": 501,
-                            "status": "No response for too long time, please reset the game",
-                        }
-                    )
-                    response.headers.add('Access-Control-Allow-Origin', '*')
-                    return response
-            else:
-                env = envs[ip]['env']
-                envs[ip]['update_time'] = time.time()
-            if cmd == 'reset':
-                env.reset(arg)
-                scene = [item.to_json() for item in env.scene if item is not None]
-                response = jsonify(
-                    {
-                        "statusCode": 200,
-                        "status": "Execution action",
-                        "result": {
-                            "scene": scene,
-                            "max_item_num": env.total_item_num,
-                        }
-                    }
-                )
-            elif cmd == 'step':
-                _, _, done, _ = env.step(arg)
-                scene = [item.to_json() for item in env.scene if item is not None]
-                bucket = [item.to_json() for item in env.bucket]
-                response = jsonify(
-                    {
-                        "statusCode": 200,
-                        "status": "Execution action",
-                        "result": {
-                            "scene": scene,
-                            "bucket": bucket,
-                            "done": done,
-                        }
-                    }
-                )
+            status_code, status, result = service.execute(ip, cmd, arg, version, binary)
+            if isinstance(result, bytes):
+                response = make_response(result)
+                response.mimetype = BINARY_MIMETYPE
             else:
-                response = jsonify({
-                    "statusCode": 500,
-                    "status": "Invalid command: {}".format(cmd),
-                })
-                response.headers.add('Access-Control-Allow-Origin', '*')
-                return response
-            print('backend process time: {}'.format(time.time() - t_start))
-            print('current env number: {}'.format(len(envs)))
+                response = {"statusCode": status_code, "status": status}
+                if result is not None:
+                    response["result"] = result
+                response = jsonify(response)
             response.headers.add('Access-Control-Allow-Origin', '*')
             return response
         except Exception as e:
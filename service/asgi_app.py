@@ -0,0 +1,96 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from urllib.parse import parse_qs
+from sheep_metrics import CONTENT_TYPE
+from sheep_service import SheepService, AGENT_CKPT_PATH, agent_policy
+
+# asyncio game server, each game keeps a WebSocket open instead of a POST per move, e.g.:
+# uvicorn asgi_app:app (or SHEEP_AGENT=1 uvicorn asgi_app:app for the agent actions)
+# the client sends {"command": "reset"/"step", "argument": level/action, "version": 1/2} text messages and receives
+# {"statusCode": ..., "status": ..., "result": ...} text messages, or the binary results if it connects with ?binary=1
+# (see sheep_protocol.py), the game is closed with the WebSocket, the metrics are served on GET /metrics
+MAX_ENV_NUM = 1000
+# the connected players may stay idle for a long time
+ENV_TIMEOUT_SECOND = 3600
+EXECUTOR_WORKER_NUM = 4
+
+if os.environ.get('SHEEP_AGENT'):
+    from sheep_export import load_actor
+    agent_model = load_actor(AGENT_CKPT_PATH, os.environ.get('SHEEP_BACKEND', 'eager'))
+    service = SheepService(
+        agent=True,
+        max_env_num=MAX_ENV_NUM,
+        env_timeout=ENV_TIMEOUT_SECOND,
+        **agent_policy(agent_model, int(os.environ.get('SHEEP_BATCH_SIZE', 16)))
+    )
+else:
+    service = SheepService(max_env_num=MAX_ENV_NUM, env_timeout=ENV_TIMEOUT_SECOND)
+# env stepping and model forward run in the executor, so the event loop only handles the connections
+executor = ThreadPoolExecutor(EXECUTOR_WORKER_NUM)
+connection_id = count()
+
+
+async def websocket_session(scope, receive, send) -> None:
+    query = parse_qs(scope.get('query_string', b'').decode())
+    binary = query.get('binary', ['0'])[0] == '1'
+    client = scope.get('client') or ('', 0)
+    key = 'ws:{}:{}:{}'.format(client[0], client[1], next(connection_id))
+    loop = asyncio.get_running_loop()
+
+    message = await receive()
+    assert message['type'] == 'websocket.connect', message
+    await send({'type': 'websocket.accept'})
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            try:
+                data = json.loads(message.get('text') or message.get('bytes'))
+                cmd, arg, version = data['command'], data['argument'], data.get('version', 1)
+                status_code, status, result = await loop.run_in_executor(
+                    executor, service.execute, key, cmd, arg, version, binary
+                )
+            except Exception as e:
+                import traceback
+                print(repr(e))
+                print(traceback.format_exc())
+                status_code, status, result = 500, "Could not execute action", None
+            if isinstance(result, bytes):
+                await send({'type': 'websocket.send', 'bytes': result})
+            else:
+                response = {"statusCode": status_code, "status": status}
+                if result is not None:
+                    response["result"] = result
+                await send({'type': 'websocket.send', 'text': json.dumps(response)})
+    finally:
+        service.remove(key)
+
+
+async def lifespan(scope, receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    if scope['type'] == 'websocket':
+        await websocket_session(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await lifespan(scope, receive, send)
+    elif scope['type'] == 'http' and scope['path'] == '/metrics':
+        body = service.metrics_text().encode()
+        headers = [(b'content-type', CONTENT_TYPE.encode())]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+    else:
+        await send({'type': 'http.response.start', 'status': 404, 'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b'DI-sheep: connect with a WebSocket'})
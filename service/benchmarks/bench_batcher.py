@@ -0,0 +1,72 @@
+# throughput and latency of the agent policy for concurrent requests, per-request compute_action vs BatchedPolicy
+# usage (in the service directory): python -m benchmarks.bench_batcher
+import time
+from threading import Thread, Lock
+import numpy as np
+from sheep_env import SheepEnv
+from sheep_model import SheepModel
+from sheep_batcher import BatchedPolicy
+
+
+def make_obs_list(num: int = 64, seed: int = 0) -> list:
+    env = SheepEnv(1, agent=True, max_padding=True)
+    env.seed(seed)
+    obs_list = []
+    for level in range(num):
+        obs = env.reset(level % SheepEnv.max_level + 1)
+        obs_list.append(obs)
+    return obs_list
+
+
+def bench_policy(policy, obs_list: list, concurrency: int, request_num: int = 100) -> dict:
+    # each thread plays a client sending request_num requests one after another
+    latency = []
+    lock = Lock()
+
+    def client(i):
+        local = []
+        for j in range(request_num):
+            t = time.perf_counter()
+            policy(obs_list[(i + j) % len(obs_list)])
+            local.append(time.perf_counter() - t)
+        with lock:
+            latency.extend(local)
+
+    threads = [Thread(target=client, args=(i, )) for i in range(concurrency)]
+    t = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - t
+    latency = np.array(latency) * 1000
+    return {
+        'qps': len(latency) / duration,
+        'p50_ms': np.percentile(latency, 50),
+        'p99_ms': np.percentile(latency, 99),
+    }
+
+
+def main() -> None:
+    model = SheepModel(item_obs_size=80, item_num=30, global_obs_size=19)
+    model.eval()
+    obs_list = make_obs_list()
+    policies = {'single': model.compute_action}
+    for batch_size, wait_ms in [(8, 1.), (16, 2.), (32, 5.)]:
+        policies['batch{}_wait{}'.format(batch_size, wait_ms)] = BatchedPolicy(model, batch_size, wait_ms)
+    print('{:>12} {:>16} {:>10} {:>8} {:>8}'.format('concurrency', 'policy', 'qps', 'p50_ms', 'p99_ms'))
+    for concurrency in [1, 4, 16, 64]:
+        for name, policy in policies.items():
+            s = bench_policy(policy, obs_list, concurrency)
+            print(
+                '{:>12} {:>16} {:>10.0f} {:>8.2f} {:>8.2f}'.format(
+                    concurrency, name, s['qps'], s['p50_ms'], s['p99_ms']
+                )
+            )
+    for policy in policies.values():
+        if isinstance(policy, BatchedPolicy):
+            policy.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# reset/step/full obs rates of SheepEnv for each level, with and without agent (visibility) and max_padding
+# usage (in the service directory): python -m benchmarks.bench_env
+import time
+import numpy as np
+from sheep_env import SheepEnv
+
+MODES = [(False, False), (True, False), (True, True)]  # (agent, max_padding)
+
+
+def bench_env(level: int, agent: bool, max_padding: bool, episode_num: int = 200, seed: int = 0) -> dict:
+    env = SheepEnv(level, agent=agent, max_padding=max_padding)
+    env.seed(seed)
+    rng = np.random.default_rng(seed)
+    reset_time, step_time, obs_time, step_num = 0., 0., 0., 0
+    for _ in range(episode_num):
+        t = time.perf_counter()
+        env.reset()
+        reset_time += time.perf_counter() - t
+        done = False
+        while not done:
+            legal = np.flatnonzero(env.alive & env.accessible)
+            action = int(legal[rng.integers(len(legal))])
+            t = time.perf_counter()
+            _, _, done, _ = env.step(action)
+            step_time += time.perf_counter() - t
+            # building the whole obs (the step only rewrites the changed items)
+            env._dirty_items = None
+            t = time.perf_counter()
+            env._get_obs()
+            obs_time += time.perf_counter() - t
+            step_num += 1
+    return {
+        'reset_us': reset_time / episode_num * 1e6,
+        'step_us': step_time / step_num * 1e6,
+        'obs_us': obs_time / step_num * 1e6,
+        'step_per_s': step_num / step_time,
+    }
+
+
+def run() -> dict:
+    bench_env(1, False, False, episode_num=20)  # warm up
+    results = {}
+    for level in range(1, SheepEnv.max_level + 1):
+        for agent, max_padding in MODES:
+            results['level{}_agent{}_padding{}'.format(level, int(agent), int(max_padding))] = bench_env(
+                level, agent, max_padding
+            )
+    return results
+
+
+def main() -> None:
+    print('{:>28} {:>10} {:>10} {:>10} {:>12}'.format('case', 'reset_us', 'step_us', 'obs_us', 'step_per_s'))
+    for case, s in run().items():
+        print(
+            '{:>28} {:>10.1f} {:>10.1f} {:>10.1f} {:>12.0f}'.format(
+                case, s['reset_us'], s['step_us'], s['obs_us'], s['step_per_s']
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# envstep/sec of the env managers on the level 10 training config (8 collector envs, random actions):
+# subprocess with pickled obs, subprocess with the obs copied into shared memory, sheep_subprocess with the envs
+# writing their obs into shared memory, and the single-process sheep_batched
+# usage (in the service directory): python -m benchmarks.bench_env_manager [env number]
+import sys
+import time
+import numpy as np
+from easydict import EasyDict
+from ding.envs import create_env_manager, DingEnvWrapper
+from sheep_env import SheepEnv
+from sheep_env_manager import BatchedSheepEnvManager, SheepSubprocessEnvManager
+
+LEVEL = 10
+MANAGERS = {
+    'subprocess_pickle': dict(type='subprocess', shared_memory=False),
+    'subprocess_shm': dict(type='subprocess', shared_memory=True),
+    'sheep_subprocess': dict(type='sheep_subprocess', shared_memory=True),
+    'sheep_batched': dict(type='sheep_batched'),
+}
+
+
+def bench_manager(name: str, env_num: int, step_num: int = 2000) -> float:
+    if name == 'sheep_batched':
+        cfg = EasyDict(BatchedSheepEnvManager.default_config())
+        env_fn = lambda: SheepEnv(LEVEL)
+    else:
+        cfg = EasyDict(SheepSubprocessEnvManager.default_config())
+        env_fn = lambda: DingEnvWrapper(SheepEnv(LEVEL))  # as sheep_env_fn of sheep_ppo_main.py
+    cfg.update(MANAGERS[name])
+    env_manager = create_env_manager(cfg, [env_fn for _ in range(env_num)])
+    env_manager.seed(0)
+    env_manager.launch()
+    rng = np.random.default_rng(0)
+    count, t = 0, time.perf_counter()
+    while count < step_num:
+        obs = env_manager.ready_obs
+        actions = {i: rng.choice(np.flatnonzero(o['action_mask'])) for i, o in obs.items()}
+        count += len(env_manager.step(actions))
+    duration = time.perf_counter() - t
+    env_manager.close()
+    return count / duration
+
+
+def main() -> None:
+    env_num = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    print('{:>18} {:>12}'.format('manager', 'envstep/s'))
+    for name in MANAGERS:
+        print('{:>18} {:>12.0f}'.format(name, bench_manager(name, env_num)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# argmax parity with eager mode and latency of the exported inference backends for each level
+# usage (in the service directory): python -m benchmarks.bench_export [ckpt path], random weights without ckpt
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import torch
+from ding.torch_utils import to_tensor, unsqueeze
+from sheep_env import SheepEnv
+from sheep_model import SheepModel
+from sheep_service import load_agent_model
+from sheep_export import BACKENDS, export_actor
+
+
+def collect_obs(level: int, episode_num: int = 5, seed: int = 0) -> list:
+    env = SheepEnv(level, agent=True, max_padding=True)
+    env.seed(seed)
+    obs_list = []
+    for _ in range(episode_num):
+        obs, done = env.reset(), False
+        while not done:
+            obs_list.append(obs)
+            action = int(np.random.choice(np.flatnonzero(obs['action_mask'])))
+            obs, _, done, _ = env.step(action)
+    return obs_list
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        model = load_agent_model(sys.argv[1])
+    else:
+        model = SheepModel(item_obs_size=80, item_num=30, global_obs_size=19)
+    model.eval()
+    tmp_dir = tempfile.mkdtemp()
+    actors = {'eager': model}
+    for backend in BACKENDS[1:]:
+        try:
+            actors[backend] = export_actor(model, os.path.join(tmp_dir, backend), backend)
+        except ImportError as e:
+            print('skip {}: {}'.format(backend, e))
+    print('{:>5} {:>18} {:>10} {:>10}'.format('level', 'backend', 'parity', 'us'))
+    for level in [1, 5, 10]:
+        obs_list = collect_obs(level)
+        inputs = [unsqueeze(to_tensor(obs)) for obs in obs_list]
+        with torch.no_grad():
+            expected = [model.compute_actor(x)['logit'].argmax(-1).item() for x in inputs]
+        for name, actor in actors.items():
+            with torch.no_grad():
+                actions = [actor.compute_actor(x)['logit'].argmax(-1).item() for x in inputs]
+                t = time.perf_counter()
+                for x in inputs:
+                    actor.compute_actor(x)
+                us = (time.perf_counter() - t) / len(inputs) * 1e6
+            parity = np.mean(np.array(actions) == np.array(expected))
+            print('{:>5} {:>18} {:>10.3f} {:>10.1f}'.format(level, name, parity, us))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# forward latency and throughput of SheepModel.compute_actor for each item encoder type and batch size, with the dense
+# item_obs and the sparse one of SheepEnv(sparse_obs=True)
+# usage (in the service directory): python -m benchmarks.bench_model
+import time
+import torch
+from sheep_env import ITEM_INDEX_SLOT_NUM
+from sheep_model import ItemEncoder, SheepModel
+
+BATCH_SIZES = [1, 8, 64]
+ITEM_NUM = 30
+
+
+def make_inputs(batch_size: int, item_num: int = ITEM_NUM, sparse: bool = False) -> dict:
+    if sparse:
+        item_obs = torch.randint(0, 81, (batch_size, item_num, ITEM_INDEX_SLOT_NUM), dtype=torch.uint8)
+    else:
+        item_obs = torch.rand(batch_size, item_num, 80).round()
+    return {
+        'item_obs': item_obs,
+        'bucket_obs': torch.rand(batch_size, 30).round(),
+        'global_obs': torch.rand(batch_size, 19).round(),
+        'action_mask': torch.ones(batch_size, item_num),
+    }
+
+
+def bench_model(item_encoder_type: str, batch_size: int, sparse: bool = False, min_seconds: float = 0.5) -> dict:
+    torch.manual_seed(0)
+    model = SheepModel(item_obs_size=80, item_num=ITEM_NUM, item_encoder_type=item_encoder_type, global_obs_size=19)
+    model.eval()
+    x = make_inputs(batch_size, sparse=sparse)
+    with torch.no_grad():
+        model.compute_actor(x)  # warm up
+        latency = []
+        t_start = time.perf_counter()
+        while time.perf_counter() - t_start < min_seconds or len(latency) < 10:
+            t = time.perf_counter()
+            model.compute_actor(x)
+            latency.append(time.perf_counter() - t)
+    latency = torch.tensor(latency) * 1000
+    return {
+        'p50_ms': latency.median().item(),
+        'mean_ms': latency.mean().item(),
+        'sample_per_s': batch_size * len(latency) / latency.sum().item() * 1000,
+    }
+
+
+def run() -> dict:
+    results = {}
+    for item_encoder_type in ItemEncoder.encoder_type:
+        for batch_size in BATCH_SIZES:
+            results['{}_batch{}'.format(item_encoder_type, batch_size)] = bench_model(item_encoder_type, batch_size)
+            results['{}_sparse_batch{}'.format(item_encoder_type, batch_size)] = bench_model(
+                item_encoder_type, batch_size, sparse=True
+            )
+    return results
+
+
+def main() -> None:
+    print('{:>29} {:>10} {:>10} {:>14}'.format('case', 'p50_ms', 'mean_ms', 'sample_per_s'))
+    for case, s in run().items():
+        print('{:>29} {:>10.3f} {:>10.3f} {:>14.0f}'.format(case, s['p50_ms'], s['mean_ms'], s['sample_per_s']))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# payload size and encode time of the step/reset responses for each level and encoding
+# usage (in the service directory): python -m benchmarks.bench_protocol
+import json
+import time
+import numpy as np
+from sheep_env import SheepEnv
+from sheep_protocol import snapshot, reset_result, step_result, reset_binary, step_binary
+
+ENCODERS = {
+    'json_v1': (lambda env: json.dumps(reset_result(env, 1)), lambda *args: json.dumps(step_result(*args, 1))),
+    'json_v2': (lambda env: json.dumps(reset_result(env, 2)), lambda *args: json.dumps(step_result(*args, 2))),
+    'binary': (reset_binary, step_binary),
+}
+
+
+def bench_level(level: int, episode_num: int = 10, seed: int = 0) -> dict:
+    stat = {name: {'reset_bytes': 0, 'reset_us': 0., 'step_bytes': 0, 'step_us': 0.} for name in ENCODERS}
+    env = SheepEnv(level, agent=False)
+    env.seed(seed)
+    reset_num, step_num = 0, 0
+    for _ in range(episode_num):
+        env.reset()
+        reset_num += 1
+        for name, (encode_reset, _) in ENCODERS.items():
+            t = time.perf_counter()
+            payload = encode_reset(env)
+            stat[name]['reset_us'] += (time.perf_counter() - t) * 1e6
+            stat[name]['reset_bytes'] += len(payload)
+        done = False
+        while not done:
+            action = int(np.random.choice(np.flatnonzero(env.alive & env.accessible)))
+            last_snapshot = snapshot(env)
+            _, _, done, _ = env.step(action)
+            step_num += 1
+            for name, (_, encode_step) in ENCODERS.items():
+                t = time.perf_counter()
+                payload = encode_step(env, action, done, last_snapshot)
+                stat[name]['step_us'] += (time.perf_counter() - t) * 1e6
+                stat[name]['step_bytes'] += len(payload)
+    for s in stat.values():
+        s['reset_bytes'] /= reset_num
+        s['reset_us'] /= reset_num
+        s['step_bytes'] /= step_num
+        s['step_us'] /= step_num
+    return stat
+
+
+def main() -> None:
+    print(
+        '{:>5} {:>8} {:>12} {:>10} {:>12} {:>10}'.format(
+            'level', 'encoding', 'reset_bytes', 'reset_us', 'step_bytes', 'step_us'
+        )
+    )
+    for level in range(1, SheepEnv.max_level + 1):
+        for name, s in bench_level(level).items():
+            print(
+                '{:>5} {:>8} {:>12.0f} {:>10.1f} {:>12.0f} {:>10.1f}'.format(
+                    level, name, s['reset_bytes'], s['reset_us'], s['step_bytes'], s['step_us']
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
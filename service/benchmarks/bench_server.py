@@ -0,0 +1,110 @@
+# end-to-end request latency percentiles of the game servers under concurrent clients, each client plays whole
+# games with reset/step requests (the agent action as its step with agent_app, a random accessible item otherwise)
+# usage (in the service directory): python -m benchmarks.bench_server [target] [client number], the target is
+# app/agent_app (in-process flask test client), service (SheepService without http) or the url of a running server
+import json
+import sys
+import time
+import urllib.request
+from threading import Thread, Lock
+import numpy as np
+
+REQUEST_NUM = 200  # per client
+
+
+def make_client(target: str):
+    # a function sending a request dict and returning the response dict
+    if target.startswith('http'):
+
+        def post(data):
+            request = urllib.request.Request(
+                target, json.dumps(data).encode(), headers={'Content-Type': 'application/json'}
+            )
+            with urllib.request.urlopen(request) as response:
+                return json.loads(response.read())
+
+        return post
+    if target == 'service':
+        from sheep_service import SheepService
+        service = SheepService(max_env_num=1000)
+
+        def post(data):
+            status_code, status, result = service.execute(str(data['uid']), data['command'], data['argument'])
+            return {'statusCode': status_code, 'status': status, 'result': result}
+
+        return post
+    flask_app = __import__(target).flask_app
+
+    def post(data):
+        # a test client for each call, so that the client threads do not share one
+        return flask_app.test_client().post('/DI-sheep/', json=data).get_json()
+
+    return post
+
+
+def play(post, uid: int, request_num: int, rng: np.random.Generator) -> list:
+    latency, done = [], True
+    for _ in range(request_num):
+        if done:
+            data = {'command': 'reset', 'argument': int(rng.integers(1, 11)), 'uid': uid}
+        else:
+            data = {'command': 'step', 'argument': action, 'uid': uid}
+        t = time.perf_counter()
+        response = post(data)
+        latency.append(time.perf_counter() - t)
+        assert response['statusCode'] == 200, response
+        result = response['result']
+        done = result.get('done', False)
+        if 'action' in result:
+            action = result['action']
+        elif not done:
+            items = [json.loads(item) if isinstance(item, str) else item for item in result['scene']]
+            accessible = [item['uid'] for item in items if item['accessible']]
+            action = accessible[rng.integers(len(accessible))]
+    return latency
+
+
+def bench_server(target: str, client_num: int, request_num: int = REQUEST_NUM) -> dict:
+    post = make_client(target)
+    latency = []
+    lock = Lock()
+
+    def client(i):
+        local = play(post, i, request_num, np.random.default_rng(i))
+        with lock:
+            latency.extend(local)
+
+    threads = [Thread(target=client, args=(i, )) for i in range(client_num)]
+    t = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - t
+    latency = np.array(latency) * 1000
+    return {
+        'qps': len(latency) / duration,
+        'p50_ms': np.percentile(latency, 50),
+        'p90_ms': np.percentile(latency, 90),
+        'p99_ms': np.percentile(latency, 99),
+    }
+
+
+def run(target: str = 'service', client_nums: tuple = (1, 8, 32)) -> dict:
+    return {'{}_client{}'.format(target, n): bench_server(target, n) for n in client_nums}
+
+
+def main() -> None:
+    target = sys.argv[1] if len(sys.argv) > 1 else 'service'
+    client_nums = (int(sys.argv[2]), ) if len(sys.argv) > 2 else (1, 8, 32)
+    print('{:>24} {:>10} {:>10} {:>10} {:>10}'.format('case', 'qps', 'p50_ms', 'p90_ms', 'p99_ms'))
+    for case, s in run(target, client_nums).items():
+        print(
+            '{:>24} {:>10.0f} {:>10.2f} {:>10.2f} {:>10.2f}'.format(
+                case, s['qps'], s['p50_ms'], s['p90_ms'], s['p99_ms']
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# solvability of the levels by the exact solver (with all the icons known), its solve time and nodes/sec, and the gap
+# between the solvable games and the games won by the agent policy
+# usage (in the service directory): python -m benchmarks.bench_solver [ckpt path], no policy win rate without ckpt
+import sys
+import numpy as np
+from sheep_env import SheepEnv
+from sheep_service import load_agent_model
+from sheep_solver import solve, SOLVED, UNSOLVABLE
+
+GAME_NUM = 20
+MAX_NODE_NUM = 10 ** 5
+MAX_SECONDS = 5.
+
+
+def policy_win(model, env: SheepEnv) -> bool:
+    # greedy policy on the current game of env
+    obs, done = env._get_obs(), False
+    while not done:
+        obs, _, done, _ = env.step(model.compute_action(obs))
+    return env.cur_item_num == 0
+
+
+def main() -> None:
+    model = load_agent_model(sys.argv[1]) if len(sys.argv) > 1 else None
+    print(
+        '{:>5} {:>6} {:>7} {:>10} {:>7} {:>10} {:>10} {:>10} {:>7}'.format(
+            'level', 'bucket', 'solved', 'unsolvable', 'budget', 'mean ms', 'max ms', 'nodes/s', 'policy'
+        )
+    )
+    for bucket_length in [7, 4]:
+        for level in range(1, SheepEnv.max_level + 1):
+            env = SheepEnv(level, bucket_length=bucket_length, agent=True, max_padding=True)
+            status, times, node_num, wins = [], [], 0, []
+            for seed in range(GAME_NUM):
+                env.seed(seed)
+                env.reset()
+                result = solve(env, MAX_NODE_NUM, MAX_SECONDS)
+                status.append(result['status'])
+                times.append(result['time'])
+                node_num += result['node_num']
+                if model is not None and bucket_length == 7:
+                    wins.append(policy_win(model, env))
+            status = np.array(status)
+            print(
+                '{:>5} {:>6} {:>7.2f} {:>10.2f} {:>7.2f} {:>10.2f} {:>10.2f} {:>10.0f} {:>7}'.format(
+                    level, bucket_length, np.mean(status == SOLVED), np.mean(status == UNSOLVABLE),
+                    np.mean((status != SOLVED) & (status != UNSOLVABLE)), np.mean(times) * 1e3,
+                    np.max(times) * 1e3, node_num / sum(times), '{:.2f}'.format(np.mean(wins)) if wins else '-'
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
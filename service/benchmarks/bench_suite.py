@@ -0,0 +1,91 @@
+# the env, model and server benchmarks in one machine-readable JSON, compared against a saved baseline
+# usage (in the service directory):
+# python -m benchmarks.bench_suite --output baseline.json  # save a baseline
+# python -m benchmarks.bench_suite --output current.json --baseline baseline.json  # exit 1 on a regression
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+import torch
+from benchmarks import bench_env, bench_model, bench_server
+
+SUITES = ['env', 'model', 'server']
+# the direction of each metric by its unit suffix
+LOWER_BETTER = ('_us', '_ms')
+HIGHER_BETTER = ('_per_s', 'qps')
+# the tail latencies are too noisy to fail on by default
+TAIL_METRICS = ('p90_ms', 'p99_ms')
+
+
+def compare(current: dict, baseline: dict, tolerance: float, check_tail: bool = False) -> list:
+    # (suite, case, metric, baseline, current, relative change) of the metrics worse than the baseline by more than
+    # tolerance, the cases missing in either result are skipped
+    regressions = []
+    for suite, cases in current['results'].items():
+        for case, metrics in cases.items():
+            base_metrics = baseline['results'].get(suite, {}).get(case, {})
+            for metric, value in metrics.items():
+                if metric not in base_metrics or base_metrics[metric] == 0:
+                    continue
+                if metric in TAIL_METRICS and not check_tail:
+                    continue
+                change = (value - base_metrics[metric]) / base_metrics[metric]
+                if (metric.endswith(LOWER_BETTER) and change > tolerance) or \
+                        (metric.endswith(HIGHER_BETTER) and change < -tolerance):
+                    regressions.append((suite, case, metric, base_metrics[metric], value, change))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='DI-sheep benchmark suite')
+    parser.add_argument('--suites', default=','.join(SUITES), help='comma separated of {}'.format(SUITES))
+    parser.add_argument('--server-target', default='service', help='see benchmarks/bench_server.py')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--tolerance', type=float, default=0.2, help='the relative change counted as a regression')
+    parser.add_argument('--check-tail', action='store_true', help='also compare the p90/p99 latencies')
+    args = parser.parse_args()
+
+    results = {}
+    for suite in args.suites.split(','):
+        assert suite in SUITES, suite
+        t = time.time()
+        if suite == 'env':
+            results[suite] = bench_env.run()
+        elif suite == 'model':
+            results[suite] = bench_model.run()
+        else:
+            results[suite] = bench_server.run(args.server_target)
+        print('{}: {} cases in {:.1f}s'.format(suite, len(results[suite]), time.time() - t))
+    current = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'torch': torch.__version__,
+            'machine': platform.machine(),
+            'torch_threads': torch.get_num_threads(),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=2, sort_keys=True)
+    print('saved to {}'.format(args.output))
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance, args.check_tail)
+        for suite, case, metric, base_value, value, change in regressions:
+            print(
+                'REGRESSION {}/{}/{}: {:.3f} -> {:.3f} ({:+.1%})'.format(suite, case, metric, base_value, value, change)
+            )
+        print('{} regressions against {} (tolerance {:.0%})'.format(len(regressions), args.baseline, args.tolerance))
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+from typing import Dict, List
+from concurrent.futures import Future
+from threading import Thread
+import queue
+import time
+import numpy as np
+import torch
+from ding.torch_utils import to_tensor
+
+
+class BatchedPolicy(object):
+    # callable policy (obs -> action) for the threaded servers, the observations of concurrent requests are collected
+    # for at most max_wait_ms (or until max_batch_size is reached) and their actions are computed in one forward
+    # for each item number (i.e.: level) in the batch, the other obs sizes must be the same, e.g.: envs with max_padding
+
+    def __init__(self, model: torch.nn.Module, max_batch_size: int = 16, max_wait_ms: float = 2.) -> None:
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.
+        self._queue = queue.Queue()
+        self.batch_num = 0
+        self.obs_num = 0
+        self._thread = Thread(target=self._run, daemon=True, name='sheep_batched_policy')
+        self._thread.start()
+
+    def __call__(self, obs: Dict[str, np.ndarray]) -> int:
+        future = Future()
+        self._queue.put((obs, future))
+        return future.result()
+
+    def _collect(self) -> List:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # leave the close signal for the next collection
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch[0] is None:
+                break
+            groups = {}
+            for obs, future in batch:
+                groups.setdefault(obs['item_obs'].shape, []).append((obs, future))
+            for group in groups.values():
+                try:
+                    actions = self.compute_actions([obs for obs, _ in group])
+                    for (_, future), action in zip(group, actions):
+                        future.set_result(action)
+                except Exception as e:
+                    for _, future in group:
+                        future.set_exception(e)
+
+    def compute_actions(self, obs_list: List[Dict[str, np.ndarray]]) -> List[int]:
+        x = to_tensor({k: np.stack([obs[k] for obs in obs_list]) for k in obs_list[0]})
+        with torch.no_grad():
+            logit = self.model.compute_actor(x)['logit']
+        self.batch_num += 1
+        self.obs_num += len(obs_list)
+        return logit.argmax(dim=-1).tolist()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
@@ -0,0 +1,98 @@
+import os
+import time
+import torch
+import torch.nn.functional as F
+from easydict import EasyDict
+from tensorboardX import SummaryWriter
+
+from sheep_dataloader import StreamingDataLoader, record_tasks, solve_tasks
+from sheep_model import SheepModel
+from sheep_recorder import RESULT_WIN
+
+# supervised pretraining of the actor of SheepModel (behavior cloning) on the games recorded by the servers (see
+# sheep_recorder.py) or on the solutions of the exact solver, the saved checkpoint is loaded like the PPO ones
+sheep_bc_config = dict(
+    exp_name='sheep_bc_seed0',
+    data=dict(
+        # the games recorded to record_path (e.g.: SHEEP_RECORD_PATH of the servers), the solver demonstrations of
+        # game_num games of each of the levels if None
+        record_path=None,
+        results=[RESULT_WIN],
+        levels=list(range(1, 10)),
+        game_num=2000,
+        worker_num=4,
+        prefetch_num=16,
+    ),
+    # the same shapes as the agent model of the servers (max padding obs)
+    model=dict(item_obs_size=80, item_num=30, item_encoder_type='TF', global_obs_size=19, dead_item='pack'),
+    learn=dict(
+        epoch_num=10,
+        batch_size=256,
+        learning_rate=1e-3,
+        weight_decay=1e-4,
+        log_freq=100,
+    ),
+    cuda=False,
+)
+sheep_bc_config = EasyDict(sheep_bc_config)
+main_config = sheep_bc_config
+
+
+def main(cfg, seed=0):
+    torch.manual_seed(seed)
+    device = 'cuda' if cfg.cuda and torch.cuda.is_available() else 'cpu'
+    if cfg.data.record_path is not None:
+        tasks = record_tasks(cfg.data.record_path, results=cfg.data.results)
+    else:
+        tasks = solve_tasks(cfg.data.levels, cfg.data.game_num, seed=seed)
+    loader = StreamingDataLoader(
+        tasks,
+        cfg.learn.batch_size,
+        worker_num=cfg.data.worker_num,
+        prefetch_num=cfg.data.prefetch_num,
+        seed=seed,
+    )
+    model = SheepModel(**cfg.model).to(device)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=cfg.learn.learning_rate, weight_decay=cfg.learn.weight_decay)
+    tb_logger = SummaryWriter(os.path.join('./{}/log/'.format(cfg.exp_name), 'bc'))
+
+    train_iter = 0
+    for epoch in range(cfg.learn.epoch_num):
+        sample_num, wait_time, start_time = 0, 0., time.time()
+        data_time = time.time()
+        for batch in loader:
+            # the time waiting for the data loader, near 0 if it keeps up with the training
+            wait_time += time.time() - data_time
+            batch = {k: torch.from_numpy(v).to(device) for k, v in batch.items()}
+            logit = model.compute_actor(batch)['logit']
+            loss = F.cross_entropy(logit, batch['action'])
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+            train_iter += 1
+            sample_num += len(batch['action'])
+            if train_iter % cfg.learn.log_freq == 0:
+                accuracy = (logit.argmax(dim=-1) == batch['action']).float().mean().item()
+                tb_logger.add_scalar('bc/loss', loss.item(), train_iter)
+                tb_logger.add_scalar('bc/accuracy', accuracy, train_iter)
+                print(
+                    'epoch {} iter {}: loss {:.4f}, accuracy {:.3f}, {:.0f} samples/s, data wait {:.1%}'.format(
+                        epoch, train_iter, loss.item(), accuracy, sample_num / (time.time() - start_time),
+                        wait_time / (time.time() - start_time)
+                    )
+                )
+            data_time = time.time()
+        os.makedirs(os.path.join(cfg.exp_name, 'ckpt'), exist_ok=True)
+        # the format of the DI-engine checkpoints, e.g.: for load_agent_model or the initial weights of PPO, plus the
+        # item encoder options, so that load_agent_model builds the same model
+        ckpt = {
+            'model': model.state_dict(),
+            'item_encoder_type': cfg.model.item_encoder_type,
+            'dead_item': cfg.model.dead_item,
+        }
+        torch.save(ckpt, os.path.join(cfg.exp_name, 'ckpt', 'ckpt_bc.pth.tar'))
+
+
+if __name__ == "__main__":
+    main(main_config, seed=0)
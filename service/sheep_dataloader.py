@@ -0,0 +1,169 @@
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import multiprocessing as mp
+import traceback
+import numpy as np
+from sheep_env import SheepEnv
+from sheep_recorder import TrajectoryDataset, replay
+from sheep_solver import make_demonstration
+
+# the obs are regenerated from the recorded (seed, actions) of the episodes or from the solutions of the solver, so
+# only the compact records are read (memory mapped) and the dense obs only exist in the batches being prefetched
+# a task is a chunk of episodes:
+# ('record', path, shard_id, begin, end, results): the records [begin, end) of a shard of a TrajectoryRecorder path,
+# the episodes of the results (e.g.: (RESULT_WIN, )) only if results is not None
+# ('solve', level, seed_begin, seed_end, max_node_num, max_seconds): the solved games of the seeds [begin, end)
+
+
+def record_tasks(path: str, chunk_size: int = 256, results: Optional[Sequence[int]] = None) -> List[Tuple]:
+    dataset = TrajectoryDataset(path)
+    results = tuple(results) if results is not None else None
+    tasks = []
+    for shard_id, shard_size in enumerate(dataset.shard_sizes):
+        for begin in range(0, shard_size, chunk_size):
+            tasks.append(('record', path, shard_id, begin, min(begin + chunk_size, shard_size), results))
+    return tasks
+
+
+def solve_tasks(
+        levels: Sequence[int],
+        game_num: int,
+        chunk_size: int = 16,
+        seed: int = 0,
+        max_node_num: int = 10 ** 5,
+        max_seconds: float = 1.
+) -> List[Tuple]:
+    tasks = []
+    for level in levels:
+        for begin in range(0, game_num, chunk_size):
+            end = min(begin + chunk_size, game_num)
+            tasks.append(('solve', level, seed + begin, seed + end, max_node_num, max_seconds))
+    return tasks
+
+
+def task_steps(task: Tuple, agent: bool = True, max_padding: bool = True) -> Iterator[Tuple[int, Dict, int]]:
+    # the (level, obs, action) of each step of the episodes of a task
+    if task[0] == 'record':
+        _, path, shard_id, begin, end, results = task
+        for record in TrajectoryDataset(path).shard(shard_id)[begin:end]:
+            if results is not None and int(record['result']) not in results:
+                continue
+            level = int(record['level'])
+            for obs, action, _, _ in replay(record, agent, max_padding):
+                yield level, obs, action
+    elif task[0] == 'solve':
+        _, level, seed_begin, seed_end, max_node_num, max_seconds = task
+        env = SheepEnv(level, agent=agent, max_padding=max_padding)
+        for seed in range(seed_begin, seed_end):
+            env.seed(seed)
+            env.reset()
+            data = make_demonstration(env, max_node_num, max_seconds)
+            for step in data or []:
+                yield level, step['obs'], step['action']
+    else:
+        raise ValueError('invalid task: {}'.format(task[0]))
+
+
+def collate(steps: List[Tuple[Dict, int]]) -> Dict[str, np.ndarray]:
+    # the steps of a batch are of the same level, so their item numbers are the same
+    batch = {k: np.stack([obs[k] for obs, _ in steps]) for k in steps[0][0]}
+    batch['action'] = np.array([action for _, action in steps], dtype=np.int64)
+    return batch
+
+
+def _batches(
+        tasks: Iterator[Tuple], batch_size: int, shuffle_size: int, agent: bool, max_padding: bool,
+        rng: np.random.Generator
+) -> Iterator[Dict[str, np.ndarray]]:
+    # a shuffle buffer of each level, a batch of random steps is taken out whenever it is full, then the rest
+    buffers = {}
+    for task in tasks:
+        for level, obs, action in task_steps(task, agent, max_padding):
+            buffer = buffers.setdefault(level, [])
+            buffer.append((obs, action))
+            if len(buffer) >= shuffle_size:
+                rng.shuffle(buffer)
+                yield collate(buffer[-batch_size:])
+                del buffer[-batch_size:]
+    for buffer in buffers.values():
+        rng.shuffle(buffer)
+        for i in range(0, len(buffer), batch_size):
+            yield collate(buffer[i:i + batch_size])
+
+
+def _loader_worker(
+        task_queue, batch_queue, batch_size: int, shuffle_size: int, agent: bool, max_padding: bool, seed: int
+) -> None:
+    try:
+        tasks = iter(task_queue.get, None)
+        for batch in _batches(tasks, batch_size, shuffle_size, agent, max_padding, np.random.default_rng(seed)):
+            # blocks while prefetch_num batches are waiting, so the workers never run ahead of the trainer
+            batch_queue.put(batch)
+        batch_queue.put(None)
+    except Exception:
+        batch_queue.put(traceback.format_exc())
+
+
+class StreamingDataLoader(object):
+    # iterates over the batches ({obs key: (B, ...), 'action': (B, )} numpy arrays, of one level each) of the steps of
+    # tasks (see record_tasks and solve_tasks), shuffled within shuffle_size steps of each level
+    # the obs are regenerated by worker_num processes (in this process if 0), at most prefetch_num batches are queued
+    # each iteration is an epoch over all the tasks, in a new order
+
+    def __init__(
+            self,
+            tasks: List[Tuple],
+            batch_size: int = 256,
+            worker_num: int = 4,
+            prefetch_num: int = 16,
+            shuffle_size: Optional[int] = None,
+            agent: bool = True,
+            max_padding: bool = True,
+            seed: int = 0
+    ) -> None:
+        self.tasks = tasks
+        self.batch_size = batch_size
+        self.worker_num = worker_num
+        self.prefetch_num = prefetch_num
+        self.shuffle_size = shuffle_size if shuffle_size is not None else batch_size * 8
+        assert self.shuffle_size >= batch_size
+        self.agent = agent
+        self.max_padding = max_padding
+        self._rng = np.random.default_rng(seed)
+
+    def __iter__(self) -> Iterator[Dict[str, np.ndarray]]:
+        tasks = [self.tasks[i] for i in self._rng.permutation(len(self.tasks))]
+        if self.worker_num == 0:
+            yield from _batches(tasks, self.batch_size, self.shuffle_size, self.agent, self.max_padding, self._rng)
+            return
+        ctx = mp.get_context('spawn')
+        task_queue, batch_queue = ctx.Queue(), ctx.Queue(self.prefetch_num)
+        for task in tasks:
+            task_queue.put(task)
+        for _ in range(self.worker_num):
+            task_queue.put(None)
+        seeds = self._rng.integers(2 ** 31, size=self.worker_num).tolist()
+        workers = [
+            ctx.Process(
+                target=_loader_worker,
+                args=(
+                    task_queue, batch_queue, self.batch_size, self.shuffle_size, self.agent, self.max_padding, seeds[i]
+                ),
+                daemon=True
+            ) for i in range(self.worker_num)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            running_num = self.worker_num
+            while running_num > 0:
+                batch = batch_queue.get()
+                if batch is None:
+                    running_num -= 1
+                elif isinstance(batch, str):
+                    raise RuntimeError('data loader worker failed:\n' + batch)
+                else:
+                    yield batch
+        finally:
+            for worker in workers:
+                worker.terminate()
+                worker.join()
@@ -1,32 +1,150 @@
-from typing import Tuple, Optional, Dict
-from collections import deque
-import copy
+from typing import Tuple, Optional, Dict, List, Union
 import gym
 import json
-import uuid
 import numpy as np
 
 
 class Item:
+    # thin view of an item of SheepEnv, whose state is stored in the env columns, for the json/UI path
+    __slots__ = ('env', 'uid')
 
-    def __init__(self, icon, offset, row, column):
-        self.icon = icon
-        self.offset = offset
-        self.row = row
-        self.column = column
-        self.uid = str(uuid.uuid4())
-        self.x = column * 100 + offset
-        self.y = row * 100 + offset
-        self.grid_x = self.x % 25
-        self.grid_y = self.y % 25
-        self.accessible = 1
-        self.visible = 1
+    def __init__(self, env: 'SheepEnv', uid: int) -> None:
+        self.env = env
+        self.uid = uid
+
+    @property
+    def icon(self) -> int:
+        return int(self.env.icon[self.uid])
+
+    @property
+    def x(self) -> int:
+        return int(self.env.x[self.uid])
+
+    @property
+    def y(self) -> int:
+        return int(self.env.y[self.uid])
+
+    @property
+    def accessible(self) -> int:
+        return int(self.env.accessible[self.uid])
+
+    @property
+    def visible(self) -> int:
+        return int(self.env.visible[self.uid])
 
     def __repr__(self) -> str:
         return 'icon({})'.format(self.icon)
 
+    def to_dict(self) -> Dict:
+        x, y = self.x, self.y
+        return {
+            'uid': self.uid,
+            'icon': self.icon,
+            'offset': x % 100,
+            'row': y // 100,
+            'column': x // 100,
+            'x': x,
+            'y': y,
+            'grid_x': x % 25,
+            'grid_y': y % 25,
+            'accessible': self.accessible,
+            'visible': self.visible,
+        }
+
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True, indent=2)
+        return json.dumps(self.to_dict(), sort_keys=True, indent=2)
+
+
+def fill_item_obs(
+        item_obs: np.ndarray,
+        icon: np.ndarray,
+        x: np.ndarray,
+        y: np.ndarray,
+        alive: np.ndarray,
+        visible: np.ndarray,
+        accessible: np.ndarray,
+        L: int,
+        N: int,
+        rows: Optional[np.ndarray] = None
+) -> None:
+    # (re)write the one-hot features of the given items (all if None) into item_obs (item_num, item_size) in place
+    p1, p2, p3 = L + N, L + N + N, L + N + N + 2
+    if rows is None:
+        rows = np.arange(len(item_obs))
+        item_obs[:] = 0
+    else:
+        item_obs[rows] = 0
+    item_obs[rows[~alive[rows]], L - 1] = 1  # move out
+    live = rows[alive[rows]]
+    item_obs[live, L + x[live] % 25] = 1
+    item_obs[live, p1 + y[live] % 25] = 1
+    item_obs[live, p3 + visible[live]] = 1
+    shown = live[visible[live]]
+    item_obs[shown, icon[shown]] = 1
+    item_obs[shown, p2 + accessible[shown]] = 1
+    item_obs[live[~visible[live]], L - 2] = 1
+
+
+# the slots of the sparse item obs (see fill_item_index), each one holds the index of a one of the item_obs row
+ITEM_INDEX_SLOT_NUM = 5
+
+
+def fill_item_index(
+        item_index: np.ndarray,
+        icon: np.ndarray,
+        x: np.ndarray,
+        y: np.ndarray,
+        alive: np.ndarray,
+        visible: np.ndarray,
+        accessible: np.ndarray,
+        L: int,
+        N: int,
+        pad: int,
+        rows: Optional[np.ndarray] = None
+) -> None:
+    # the sparse form of fill_item_obs: the feature indices of the ones of each row, in the slots
+    # (icon/not visible/move out, x, y, accessible, visible), pad (item_size) for the empty slots
+    p1, p2, p3 = L + N, L + N + N, L + N + N + 2
+    if rows is None:
+        rows = np.arange(len(item_index))
+    item_index[rows] = pad
+    item_index[rows[~alive[rows]], 0] = L - 1  # move out
+    live = rows[alive[rows]]
+    item_index[live, 1] = L + x[live] % 25
+    item_index[live, 2] = p1 + y[live] % 25
+    item_index[live, 4] = p3 + visible[live]
+    shown = live[visible[live]]
+    item_index[shown, 0] = icon[shown]
+    item_index[shown, 3] = p2 + accessible[shown]
+    item_index[live[~visible[live]], 0] = L - 2
+
+
+def make_cover_graph(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # cover[..., i, j]: item j is placed after item i and their 100x100 tiles overlap, i.e. j lies on i
+    # quadrant[..., i, j, 2 * a + b]: item j occludes the (a, b) 25x25 quadrant of the 50x50 core of item i
+    dx = x[..., None, :] - x[..., :, None]
+    dy = y[..., None, :] - y[..., :, None]
+    n = x.shape[-1]
+    cover = (np.abs(dx) < 100) & (np.abs(dy) < 100) & np.triu(np.ones((n, n), dtype=bool), k=1)
+    # occluded range of the core in 25 pixel units, the same as slicing a 2x2 flag
+    x_min, x_max = np.clip(dx - 25, 0, 50) // 25, np.clip(dx + 75, 0, 50) // 25
+    y_min, y_max = np.clip(dy - 25, 0, 50) // 25, np.clip(dy + 75, 0, 50) // 25
+    quadrant = np.stack(
+        [(x_min <= a) & (a < x_max) & (y_min <= b) & (b < y_max) for a in range(2) for b in range(2)], axis=-1
+    )
+    quadrant &= cover[..., None]
+    return cover, quadrant
+
+
+def make_cover_csr(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, ...]:
+    # the cover graph in compressed rows: item j lies on the items indices[indptr[j]:indptr[j + 1]] and occludes the
+    # quadrants quadrant[indptr[j]:indptr[j + 1]] of their cores, plus the number of items lying on each item
+    # (and on each quadrant of its core)
+    cover, quadrant = make_cover_graph(x, y)
+    j, i = np.nonzero(cover.T)
+    indptr = np.zeros(len(x) + 1, dtype=np.int64)
+    np.cumsum(cover.sum(0), out=indptr[1:])
+    return cover.sum(1), quadrant.sum(1), indptr, i, quadrant[i, j]
 
 
 class SheepEnv(gym.Env):
@@ -41,17 +159,39 @@ class SheepEnv(gym.Env):
         [0, 8],
     ]
 
-    def __init__(self, level: int, bucket_length: int = 7, agent: bool = True, max_padding: bool = False) -> None:
+    def __init__(
+            self,
+            level: int,
+            bucket_length: int = 7,
+            agent: bool = True,
+            max_padding: bool = False,
+            obs_dtype: Optional[type] = None,
+            level_pool: Optional[object] = None,
+            sparse_obs: bool = False
+    ) -> None:
         self.level = level
         assert 1 <= self.level <= self.max_level
         self.bucket_length = bucket_length
         self.agent = agent
         self.max_padding = max_padding
+        # if sparse_obs, item_obs is the (item_num, ITEM_INDEX_SLOT_NUM) uint8 indices of the ones of the one-hot
+        # item_obs (see fill_item_index), which SheepModel takes too, instead of the dense (item_num, item_size) floats
+        self.sparse_obs = sparse_obs
+        # if obs_dtype is set (e.g. np.float32 or np.uint8), the env keeps preallocated obs buffers of this dtype and
+        # only rewrites the changed items, so the returned obs are overwritten by the next step, copy them if kept
+        self.obs_dtype = obs_dtype
+        self._obs_buffer = None
+        self._own_obs_buffer = None
+        # the scenes are copied from the pregenerated ones of level_pool if it is set (see sheep_level_pool.py)
+        self.level_pool = level_pool
+        self._space_level = None
+        # each env has its own random stream, seed makes its games reproducible
+        self._rng = np.random.default_rng()
         self._make_game()
 
     def seed(self, seed: int) -> None:
         self._seed = seed
-        np.random.seed(self._seed)
+        self._rng = np.random.default_rng(self._seed)
 
     def _make_game(self) -> None:
         # TODO wash scene
@@ -69,92 +209,113 @@ class SheepEnv(gym.Env):
             self.item_non_div = 0
         self.total_item_num = len(self.icon_pool) * self.item_per_icon + self.item_non_div
 
-        self.scene = []
-        self.bucket = deque(maxlen=self.bucket_length)
+        if self.level_pool is not None:
+            # copy a pregenerated scene, whose layout and cover graph are already computed
+            scene = self.level_pool.sample(self.level, self._rng)
+            self.scene_id = int(scene['scene_id'])
+            self.icon = scene['icon'].astype(np.int64)
+            self.x = scene['x'].astype(np.int64)
+            self.y = scene['y'].astype(np.int64)
+        else:
+            self.scene_id = None
+            icon, offset, row, column = self._make_layout(self._rng).T
+            self.icon = icon
+            self.x = column * 100 + offset
+            self.y = row * 100 + offset
+        self.alive = np.ones(self.total_item_num, dtype=bool)
+        self.visible = np.ones(self.total_item_num, dtype=bool)
+        self.accessible = np.ones(self.total_item_num, dtype=bool)
+        self.bucket = np.zeros(len(self.icons), dtype=np.int64)  # item number of each icon in the bucket
+        self.bucket_ids = []  # items in the bucket, in the order of being put in
+
+        self.cur_item_num = self.total_item_num
+        self.reward_3tiles = self.R * 0.5 / (self.total_item_num // 3)
+
+        if self.level_pool is not None:
+            self._set_cover_graph(
+                scene['cover_num'], scene['quadrant_num'], scene['indptr'], scene['indices'], scene['quadrant']
+            )
+        else:
+            self._make_cover_graph()
+        self._update_visible_accessible()
+        if self._space_level != self.level:
+            self._set_space()
+            self._space_level = self.level
+        self._dirty_items = None  # items whose obs should be rewritten, None for all
 
+    def _make_layout(self, rng: np.random.Generator) -> np.ndarray:
+        # (icon, offset, row, column) of each item (total_item_num, 4), in the order of being put on the scene
         N = self.selected_range[1] - self.selected_range[0] - 1
-        for i in range(len(self.icon_pool)):
-            for j in range(self.item_per_icon):
-                row = self.selected_range[0] + np.int64(N * np.random.random())
-                column = self.selected_range[0] + np.int64(N * np.random.random())
-                offset = self.offset_pool[np.int64(np.random.random() * len(self.offset_pool))]
-                item = Item(self.icon_pool[i], offset, row, column)
-                self.scene.append(item)
+        icon = np.repeat(self.icon_pool, self.item_per_icon)
         if self.item_non_div > 0:
-            for icon in np.random.choice(self.icon_pool, size=self.item_non_div, replace=False):
-                row = self.selected_range[0] + np.int64(N * np.random.random())
-                column = self.selected_range[0] + np.int64(N * np.random.random())
-                offset = self.offset_pool[np.int64(np.random.random() * len(self.offset_pool))]
-                item = Item(int(icon), offset, row, column)
-                self.scene.append(item)
+            icon = np.concatenate([icon, rng.choice(self.icon_pool, size=self.item_non_div, replace=False)])
+        # all the positions are drawn in one block
+        u = rng.random((len(icon), 3))
+        row, column = self.selected_range[0] + (N * u[:, :2]).astype(np.int64).T
+        offset = np.array(self.offset_pool)[(u[:, 2] * len(self.offset_pool)).astype(np.int64)]
+        return np.stack([icon, offset, row, column], 1)
 
-        self.cur_item_num = len(self.scene)
-        self.reward_3tiles = self.R * 0.5 / (len(self.scene) // 3)
+    def _make_cover_graph(self) -> None:
+        self._set_cover_graph(*make_cover_csr(self.x, self.y))
 
-        self._update_visible_accessible()
-        self._set_space()
-
-    def _update_visible_accessible(self) -> None:
-        for i in range(self.total_item_num):
-            covered_items = []
-            item1 = self.scene[i]
-            if item1 is None:
-                continue
-            item1.accessible = 1
-            for j in range(i + 1, self.total_item_num):
-                item2 = self.scene[j]
-                if item2 is None:
-                    continue
-                if not (item2.x + 100 <= item1.x or item2.x >= item1.x + 100 or item2.y + 100 <= item1.y
-                        or item2.y >= item1.y + 100):
-                    item1.accessible = 0
-                    if not self.agent:
-                        break
-                    covered_items.append(item2)
-            if self.agent and len(covered_items) > 0:
-                flag = np.zeros((2, 2)).astype(np.int64)  # core offset 50x50 is visible
-                core_x, core_y = item1.x + 25, item1.y + 25
-                for item in covered_items:
-                    min_x = max(core_x, item.x)
-                    max_x = min(core_x + 50, item.x + 100)
-                    min_y = max(core_y, item.y)
-                    max_y = min(core_y + 50, item.y + 100)
-                    if min_x < max_x or min_y < max_y:
-                        # top left: (max_x, max_y)
-                        # bottom right: (min_x, min_y)
-                        flag[(min_x - core_x) // 25:(max_x - core_x) // 25,
-                             (min_y - core_y) // 25:(max_y - core_y) // 25] = 1
-                        if flag.sum() == 4:
-                            break
-                item1.visible = int(flag.sum() < 4)
-            else:
-                item1.visible = 1
+    def _set_cover_graph(
+            self, cover_num: np.ndarray, quadrant_num: np.ndarray, indptr: np.ndarray, indices: np.ndarray,
+            quadrant: np.ndarray
+    ) -> None:
+        # number of alive items lying on each item (and on each quadrant of its core), updated by each removal
+        self._cover_num = cover_num.astype(np.int64)
+        self._quadrant_num = quadrant_num.astype(np.int64)
+        # for each item, the items it lies on and which of their core quadrants it occludes (see make_cover_csr)
+        self._cover_indptr = indptr
+        self._cover_indices = indices
+        self._cover_quadrant = quadrant
+
+    def _update_visible_accessible(self, removed: Optional[int] = None) -> None:
+        if removed is None:
+            indices = np.arange(self.total_item_num)
+        else:
+            # only the items under the removed one can change their state
+            begin, end = self._cover_indptr[removed], self._cover_indptr[removed + 1]
+            indices = self._cover_indices[begin:end]
+            self._cover_num[indices] -= 1
+            self._quadrant_num[indices] -= self._cover_quadrant[begin:end]
+            indices = indices[self.alive[indices]]
+            if self._dirty_items is not None:
+                self._dirty_items = np.concatenate([self._dirty_items, indices, [removed]])
+        self.accessible[indices] = self._cover_num[indices] == 0
+        if self.agent:
+            self.visible[indices] = ~self._quadrant_num[indices].all(1)  # core offset 50x50 is visible
+        else:
+            self.visible[indices] = True
 
     def _execute_action(self, action: int) -> float:
-        action_item = copy.deepcopy(self.scene[action])
-        assert action_item is not None, action
-        self.scene[action] = None
+        assert self.alive[action], action
+        self.alive[action] = False
         self.cur_item_num -= 1
-        same_items = []
-        for i in range(len(self.bucket)):
-            item = self.bucket[i]
-            if item.icon == action_item.icon:
-                same_items.append(item)
-
-        if len(same_items) == 2:
-            for item in same_items:
-                self.bucket.remove(item)
-            return copy.deepcopy(self.reward_3tiles)  # necessary deepcopy
+        icon = self.icon[action]
+        if self.bucket[icon] == 2:
+            self.bucket[icon] = 0
+            self.bucket_ids = [i for i in self.bucket_ids if self.icon[i] != icon]
+            return self.reward_3tiles
         else:
-            self.bucket.append(action_item)
+            self.bucket[icon] += 1
+            self.bucket_ids.append(action)
             return 0.
 
+    @property
+    def scene(self) -> List[Optional[Item]]:
+        # item views for the json/UI path, None for the removed items
+        return [Item(self, i) if alive else None for i, alive in enumerate(self.alive)]
+
+    @property
+    def bucket_items(self) -> List[Item]:
+        return [Item(self, i) for i in self.bucket_ids]
+
     def reset(self, level: Optional[int] = None) -> Dict:
         if level is not None:
             self.level = level
             assert 1 <= self.level <= self.max_level
         self._make_game()
-        self._set_space()
         return self._get_obs()
 
     def close(self) -> None:
@@ -163,63 +324,155 @@ class SheepEnv(gym.Env):
     # usually overwritten methods
 
     def step(self, action: int) -> Tuple:
-        rew = self._execute_action(action)
-        self._update_visible_accessible()
-
+        rew, done = self._step(action)
         obs = self._get_obs()
-        if self.cur_item_num == 0:
-            rew += self.R
-            done = True
-        elif len(self.bucket) == self.bucket_length:
-            rew -= self.R
-            done = True
-        else:
-            done = False
         info = {}
         return obs, rew, done, info
 
+    def _step(self, action: int) -> Tuple[float, bool]:
+        # step without making the obs, e.g.: for the rollouts of a lookahead search
+        rew = self._execute_action(action)
+        self._update_visible_accessible(action)
+        return self._done(rew)
+
+    def _done(self, rew: float) -> Tuple[float, bool]:
+        # the final reward and done after an action
+        if self.cur_item_num == 0:
+            return rew + self.R, True
+        elif len(self.bucket_ids) == self.bucket_length:
+            return rew - self.R, True
+        return rew, False
+
+    def _state_views(self, state: np.ndarray) -> Dict[str, np.ndarray]:
+        # the fields of a state blob: the item flags, the cover counts, the bucket (ids padded with 255) and the
+        # PCG64 state of the env random stream (state, inc, has_uint32, uinteger)
+        M = self.total_item_num
+        sizes = [
+            ('alive', M), ('visible', M), ('accessible', M), ('cover_num', M), ('quadrant_num', 4 * M),
+            ('bucket', len(self.icons)), ('bucket_ids', self.bucket_length), ('rng', 37)
+        ]
+        views, begin = {}, 0
+        for k, size in sizes:
+            views[k] = state[begin:begin + size]
+            begin += size
+        return views
+
+    @property
+    def state_size(self) -> int:
+        return 8 * self.total_item_num + len(self.icons) + self.bucket_length + 37
+
+    def get_state(self) -> np.ndarray:
+        # the game in progress as a fixed size uint8 blob, which can be restored by set_state into this env or its
+        # clones (of the same game, the layout and cover graph are not included), e.g.: for the tree search
+        state = np.empty(self.state_size, dtype=np.uint8)
+        views = self._state_views(state)
+        views['alive'][:] = self.alive
+        views['visible'][:] = self.visible
+        views['accessible'][:] = self.accessible
+        views['cover_num'][:] = self._cover_num
+        views['quadrant_num'][:] = self._quadrant_num.reshape(-1)
+        views['bucket'][:] = self.bucket
+        views['bucket_ids'][:] = 255
+        views['bucket_ids'][:len(self.bucket_ids)] = self.bucket_ids
+        rng_state = self._rng.bit_generator.state
+        assert rng_state['bit_generator'] == 'PCG64', rng_state['bit_generator']
+        views['rng'][:] = np.frombuffer(
+            rng_state['state']['state'].to_bytes(16, 'little') + rng_state['state']['inc'].to_bytes(16, 'little') +
+            bytes([rng_state['has_uint32']]) + rng_state['uinteger'].to_bytes(4, 'little'),
+            dtype=np.uint8
+        )
+        return state
+
+    def set_state(self, state: np.ndarray) -> None:
+        assert len(state) == self.state_size, (len(state), self.state_size)
+        views = self._state_views(state)
+        self.alive[:] = views['alive']
+        self.visible[:] = views['visible']
+        self.accessible[:] = views['accessible']
+        self._cover_num[:] = views['cover_num']
+        self._quadrant_num.reshape(-1)[:] = views['quadrant_num']
+        self.bucket[:] = views['bucket']
+        self.bucket_ids = [int(i) for i in views['bucket_ids'] if i != 255]
+        self.cur_item_num = int(self.alive.sum())
+        rng = views['rng'].tobytes()
+        self._rng.bit_generator.state = {
+            'bit_generator': 'PCG64',
+            'state': {
+                'state': int.from_bytes(rng[:16], 'little'),
+                'inc': int.from_bytes(rng[16:32], 'little')
+            },
+            'has_uint32': rng[32],
+            'uinteger': int.from_bytes(rng[33:], 'little'),
+        }
+        self._dirty_items = None
+
+    def clone(self) -> 'SheepEnv':
+        # a copy of the game in progress, which shares the read only arrays (layout, cover graph and spaces) with
+        # this env, instead of a deepcopy, the clone writes its obs into its own buffers
+        env = SheepEnv.__new__(SheepEnv)
+        env.__dict__.update(self.__dict__)
+        for k in ['alive', 'visible', 'accessible', 'bucket', '_cover_num', '_quadrant_num']:
+            setattr(env, k, getattr(self, k).copy())
+        env.bucket_ids = list(self.bucket_ids)
+        env._rng = np.random.Generator(np.random.PCG64())
+        env._rng.bit_generator.state = self._rng.bit_generator.state
+        env._obs_buffer = None
+        env._own_obs_buffer = None
+        env._dirty_items = None
+        return env
+
+    def set_obs_buffer(self, obs_buffer: Optional[Dict[str, np.ndarray]]) -> None:
+        # write the following obs into caller-provided arrays (e.g. a shared memory slot of the env manager) in place,
+        # their shapes should be the same as observation_space, None for going back to the env own buffers
+        if obs_buffer is not None:
+            for k, space in self.observation_space.spaces.items():
+                assert obs_buffer[k].shape == space.shape, (k, obs_buffer[k].shape, space.shape)
+        self._obs_buffer = obs_buffer
+        self._dirty_items = None
+
+    def _get_obs_buffer(self) -> Tuple[Dict, Optional[np.ndarray]]:
+        if self._obs_buffer is not None:
+            return self._obs_buffer, self._dirty_items
+        if self.obs_dtype is None:
+            # new arrays of exactly the shapes and dtypes of observation_space
+            return {k: np.zeros(space.shape, space.dtype) for k, space in self.observation_space.spaces.items()}, None
+        buffer = self._own_obs_buffer
+        spaces = self.observation_space.spaces
+        if buffer is None or any([buffer[k].shape != space.shape for k, space in spaces.items()]):
+            buffer = {k: np.zeros(space.shape, self.obs_dtype) for k, space in spaces.items()}
+            if self.sparse_obs:
+                buffer['item_obs'] = np.zeros(spaces['item_obs'].shape, spaces['item_obs'].dtype)
+            self._own_obs_buffer = buffer
+            return buffer, None
+        return buffer, self._dirty_items
+
     def _get_obs(self) -> Dict:
-        item_obs = np.zeros((self.total_item_num, self.item_size))
-        action_mask = np.zeros(self.total_item_num).astype(np.uint8)
-
-        L, N = self.L, self.N
-        p1, p2, p3 = L + N, L + N + N, L + N + N + 2
-        for i in range(len(self.scene)):
-            item = self.scene[i]
-            if item is None:
-                item_obs[i][L - 1] = 1
-            else:
-                item_obs[i][L + item.grid_x] = 1
-                item_obs[i][p1 + item.grid_y] = 1
-                item_obs[i][p3 + item.visible] = 1
-                if item.visible:
-                    item_obs[i][item.icon] = 1
-                    item_obs[i][p2 + item.accessible] = 1
-                else:
-                    item_obs[i][L - 2] = 1
-                if item.accessible:
-                    action_mask[i] = 1
-
-        bucket_obs = np.zeros(3 * len(self.icons))
-        bucket_icon_stat = [0 for _ in range(len(self.icons))]
-        for item in self.bucket:
-            bucket_icon_stat[item.icon] += 1
-        for i in range(len(bucket_icon_stat)):
-            bucket_obs[i * 3 + bucket_icon_stat[i]] = 1
-
-        global_obs = np.zeros(self.global_size)
+        obs, rows = self._get_obs_buffer()
+        if self.sparse_obs and (rows is None or len(rows) > 0):
+            fill_item_index(
+                obs['item_obs'], self.icon, self.x, self.y, self.alive, self.visible, self.accessible, self.L, self.N,
+                self.item_size, rows
+            )
+        elif rows is None or len(rows) > 0:
+            fill_item_obs(
+                obs['item_obs'], self.icon, self.x, self.y, self.alive, self.visible, self.accessible, self.L, self.N,
+                rows
+            )
+        obs['action_mask'][:] = self.alive & self.accessible
+        self._dirty_items = np.zeros(0, dtype=np.int64)
+
+        bucket_obs = obs['bucket_obs']
+        bucket_obs[:] = 0
+        bucket_obs[np.arange(len(self.icons)) * 3 + self.bucket] = 1
+
+        global_obs = obs['global_obs']
+        global_obs[:] = 0
         if self.max_padding:
             global_obs[self.cur_item_num // self.max_item_per_icon] = 1
         else:
             global_obs[self.cur_item_num // self.item_per_icon] = 1
-        global_obs[self.global_size - self.bucket_length - 1 + len(self.bucket)] = 1
-
-        return {
-            'item_obs': item_obs,
-            'bucket_obs': bucket_obs,
-            'global_obs': global_obs,
-            'action_mask': action_mask,
-        }
+        global_obs[self.global_size - self.bucket_length - 1 + len(self.bucket_ids)] = 1
+        return obs
 
     def _set_space(self) -> None:
         if self.max_padding:
@@ -236,13 +489,189 @@ class SheepEnv(gym.Env):
             self.global_size = self.max_level_item_num // self.max_item_per_icon + 1 + self.bucket_length + 1
         else:
             self.global_size = self.total_item_num // self.item_per_icon + 1 + self.bucket_length + 1
+        if self.sparse_obs:
+            item_space = gym.spaces.Box(
+                0, self.item_size, dtype=np.uint8, shape=(self.total_item_num, ITEM_INDEX_SLOT_NUM)
+            )
+        else:
+            item_space = gym.spaces.Box(0, 1, dtype=np.float32, shape=(self.total_item_num, self.item_size))
         self.observation_space = gym.spaces.Dict(
             {
-                'item_obs': gym.spaces.Box(0, 1, dtype=np.float32, shape=(self.total_item_num, self.item_size)),
+                'item_obs': item_space,
                 'bucket_obs': gym.spaces.Box(0, 1, dtype=np.float32, shape=(3 * len(self.icons), )),
                 'global_obs': gym.spaces.Box(0, 1, dtype=np.float32, shape=(self.global_size, )),
-                'action_mask': gym.spaces.Box(0, 1, dtype=np.float32, shape=(self.total_item_num, ))  # TODO
+                'action_mask': gym.spaces.Box(0, 1, dtype=np.float32, shape=(self.total_item_num, ))
             }
         )
         self.action_space = gym.spaces.Discrete(self.total_item_num)
         self.reward_space = gym.spaces.Box(-self.R * 1.5, self.R * 1.5, dtype=np.float32)
+
+
+class BatchedSheepEnv(object):
+    # env_num games of the same level stored as (env_num, max_item_num) arrays and stepped together
+
+    def __init__(
+            self,
+            env_num: int,
+            level: int,
+            bucket_length: int = 7,
+            agent: bool = True,
+            max_padding: bool = False,
+            auto_reset: bool = True,
+            sparse_obs: bool = False,
+            level_pool: Optional[object] = None
+    ) -> None:
+        self.env_num = env_num
+        self.auto_reset = auto_reset
+        # the scenes are copied from the pregenerated ones of level_pool if it is set, as SheepEnv does
+        self.level_pool = level_pool
+        # level constants and spaces are shared with the single env
+        self._ref = SheepEnv(level, bucket_length, agent, max_padding, sparse_obs=sparse_obs)
+        self.level = level
+        self.bucket_length = bucket_length
+        self.agent = agent
+        self.max_padding = max_padding
+        self.sparse_obs = sparse_obs
+        self.total_item_num = self._ref.total_item_num
+        self.observation_space = self._ref.observation_space
+        self.action_space = self._ref.action_space
+        self.reward_space = self._ref.reward_space
+        self._rngs = [np.random.default_rng() for _ in range(env_num)]
+
+        K, M = self.env_num, self.total_item_num
+        self.icon = np.zeros((K, M), dtype=np.int64)
+        self.x = np.zeros((K, M), dtype=np.int64)
+        self.y = np.zeros((K, M), dtype=np.int64)
+        self.alive = np.zeros((K, M), dtype=bool)
+        self.visible = np.zeros((K, M), dtype=bool)
+        self.accessible = np.zeros((K, M), dtype=bool)
+        self.bucket = np.zeros((K, len(SheepEnv.icons)), dtype=np.int64)  # item number of each icon in the bucket
+        self.cur_item_num = np.zeros(K, dtype=np.int64)
+        self._cover = np.zeros((K, M, M), dtype=bool)
+        self._quadrant = np.zeros((K, M, M, 4), dtype=bool)
+        self._cover_num = np.zeros((K, M), dtype=np.int64)
+        self._quadrant_num = np.zeros((K, M, 4), dtype=np.int64)
+
+    def seed(self, seed: Union[int, List[int]], env_ids: Optional[List[int]] = None) -> None:
+        env_ids = list(range(self.env_num)) if env_ids is None else env_ids
+        if isinstance(seed, (int, np.integer)):
+            seed = [seed + i for i in range(len(env_ids))]
+        assert len(seed) == len(env_ids), "len(seed) {} != env number {}".format(len(seed), len(env_ids))
+        for i, s in zip(env_ids, seed):
+            self._rngs[i] = np.random.default_rng(s)
+
+    def _make_game(self, env_ids: np.ndarray) -> None:
+        if self.level_pool is not None:
+            for i in env_ids:
+                self._copy_scene(i, self.level_pool.sample(self.level, self._rngs[i]))
+        else:
+            for i in env_ids:
+                icon, offset, row, column = self._ref._make_layout(self._rngs[i]).T
+                self.icon[i] = icon
+                self.x[i] = column * 100 + offset
+                self.y[i] = row * 100 + offset
+            cover, quadrant = make_cover_graph(self.x[env_ids], self.y[env_ids])
+            self._cover[env_ids] = cover
+            self._quadrant[env_ids] = quadrant
+            self._cover_num[env_ids] = cover.sum(-1)
+            self._quadrant_num[env_ids] = quadrant.sum(-2)
+        self.alive[env_ids] = True
+        self.bucket[env_ids] = 0
+        self.cur_item_num[env_ids] = self.total_item_num
+        self._update_visible_accessible(env_ids)
+
+    def _copy_scene(self, i: int, scene: Dict[str, np.ndarray]) -> None:
+        # the dense cover graph of env i from the compressed rows of a pool scene (see make_cover_csr)
+        self.icon[i] = scene['icon']
+        self.x[i] = scene['x']
+        self.y[i] = scene['y']
+        above = np.repeat(np.arange(self.total_item_num), np.diff(scene['indptr']))
+        self._cover[i] = False
+        self._cover[i, scene['indices'], above] = True
+        self._quadrant[i] = False
+        self._quadrant[i, scene['indices'], above] = scene['quadrant']
+        self._cover_num[i] = scene['cover_num']
+        self._quadrant_num[i] = scene['quadrant_num']
+
+    def _update_visible_accessible(self, env_ids: np.ndarray) -> None:
+        self.accessible[env_ids] = self._cover_num[env_ids] == 0
+        if self.agent:
+            self.visible[env_ids] = ~self._quadrant_num[env_ids].all(-1)  # core offset 50x50 is visible
+        else:
+            self.visible[env_ids] = True
+
+    def reset(self, env_ids: Optional[List[int]] = None) -> Dict:
+        env_ids = np.arange(self.env_num) if env_ids is None else np.asarray(env_ids, dtype=np.int64)
+        self._make_game(env_ids)
+        return self._get_obs(env_ids)
+
+    def close(self) -> None:
+        pass
+
+    def step(self, actions: np.ndarray, env_ids: Optional[List[int]] = None) -> Tuple:
+        # the returned obs of a done env is the first obs of its next game if auto_reset, the last obs of the
+        # finished game is kept in its info as ``final_obs``
+        env_ids = np.arange(self.env_num) if env_ids is None else np.asarray(env_ids, dtype=np.int64)
+        actions = np.asarray(actions, dtype=np.int64).reshape(-1)
+        assert self.alive[env_ids, actions].all(), actions
+
+        # execute action
+        self.alive[env_ids, actions] = False
+        self.cur_item_num[env_ids] -= 1
+        icon = self.icon[env_ids, actions]
+        icon_num = self.bucket[env_ids, icon]
+        triple = icon_num == 2
+        self.bucket[env_ids, icon] = np.where(triple, 0, icon_num + 1)
+        rew = np.where(triple, self._ref.reward_3tiles, 0.)
+
+        # only the items under the removed ones can change their state
+        self._cover_num[env_ids] -= self._cover[env_ids, :, actions]
+        self._quadrant_num[env_ids] -= self._quadrant[env_ids, :, actions]
+        self._update_visible_accessible(env_ids)
+
+        obs = self._get_obs(env_ids)
+        win = self.cur_item_num[env_ids] == 0
+        lose = ~win & (self.bucket[env_ids].sum(1) == self.bucket_length)
+        rew = rew + np.where(win, self._ref.R, 0.) - np.where(lose, self._ref.R, 0.)
+        done = win | lose
+        info = [{} for _ in range(len(env_ids))]
+        if self.auto_reset and done.any():
+            done_idx = np.flatnonzero(done)
+            for i in done_idx:
+                info[i]['final_obs'] = {k: v[i].copy() for k, v in obs.items()}
+            reset_obs = self.reset(env_ids[done_idx])
+            for k, v in obs.items():
+                v[done_idx] = reset_obs[k]
+        return obs, rew, done, info
+
+    def _get_obs(self, env_ids: np.ndarray) -> Dict:
+        ref = self._ref
+        K, M = len(env_ids), self.total_item_num
+        alive, accessible = self.alive[env_ids], self.accessible[env_ids]
+        items = (
+            self.icon[env_ids].reshape(-1), self.x[env_ids].reshape(-1), self.y[env_ids].reshape(-1),
+            alive.reshape(-1), self.visible[env_ids].reshape(-1), accessible.reshape(-1), ref.L, ref.N
+        )
+        if self.sparse_obs:
+            item_obs = np.zeros((K, M, ITEM_INDEX_SLOT_NUM), dtype=np.uint8)
+            fill_item_index(item_obs.reshape(K * M, -1), *items, ref.item_size)
+        else:
+            item_obs = np.zeros((K, M, ref.item_size), dtype=np.float32)
+            fill_item_obs(item_obs.reshape(K * M, -1), *items)
+        action_mask = (alive & accessible).astype(np.float32)
+
+        bucket = self.bucket[env_ids]
+        bucket_obs = np.zeros((K, 3 * len(SheepEnv.icons)), dtype=np.float32)
+        np.put_along_axis(bucket_obs, np.arange(len(SheepEnv.icons)) * 3 + bucket, 1, axis=1)
+
+        global_obs = np.zeros((K, ref.global_size), dtype=np.float32)
+        item_per_icon = ref.max_item_per_icon if self.max_padding else ref.item_per_icon
+        global_obs[np.arange(K), self.cur_item_num[env_ids] // item_per_icon] = 1
+        global_obs[np.arange(K), ref.global_size - self.bucket_length - 1 + bucket.sum(1)] = 1
+
+        return {
+            'item_obs': item_obs,
+            'bucket_obs': bucket_obs,
+            'global_obs': global_obs,
+            'action_mask': action_mask,
+        }
@@ -0,0 +1,153 @@
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from ding.envs import BaseEnvManager, BaseEnvTimestep, SyncSubprocessEnvManager
+from ding.envs.env_manager.base_env_manager import EnvState
+from ding.utils import ENV_MANAGER_REGISTRY
+
+from sheep_env import SheepEnv, BatchedSheepEnv
+
+
+@ENV_MANAGER_REGISTRY.register('sheep_batched')
+class BatchedSheepEnvManager(BaseEnvManager):
+    # single-process env manager stepping all the sub-environments at once with a BatchedSheepEnv,
+    # env_fn should create plain SheepEnv, whose level, options and spaces are shared by all the games
+
+    def _create_state(self) -> None:
+        ref = self._env_ref
+        self._env = BatchedSheepEnv(
+            self.env_num, ref.level, ref.bucket_length, ref.agent, ref.max_padding, auto_reset=False,
+            sparse_obs=ref.sparse_obs,
+            level_pool=ref.level_pool
+        )
+        self._envs = []
+        self._env_episode_count = {i: 0 for i in range(self.env_num)}
+        self._env_reset_count = {i: 0 for i in range(self.env_num)}
+        self._eval_episode_return = np.zeros(self.env_num, dtype=np.float32)
+        self._ready_obs = {i: None for i in range(self.env_num)}
+        self._env_states = {i: EnvState.INIT for i in range(self.env_num)}
+        self._closed = False
+
+    def reset(self, reset_param: Optional[Dict] = None) -> None:
+        self._check_closed()
+        env_ids = list(range(self.env_num)) if reset_param is None else list(reset_param.keys())
+        # all the games share the level of the batched env, so reset params are not supported
+        assert reset_param is None or all([not p for p in reset_param.values()]), reset_param
+        self._reset_batch(env_ids)
+
+    def _reset_batch(self, env_ids: List[int]) -> None:
+        # each game is seeded like the DingEnvWrapper envs: with the seed of its env without dynamic_seed, so the same
+        # game is played again and again (e.g.: the evaluator), with a new seed for each game otherwise
+        seed_ids = [i for i in env_ids if self._env_seed[i] is not None]
+        if len(seed_ids) > 0:
+            if self._env_dynamic_seed is False:
+                seeds = [self._env_seed[i] for i in seed_ids]
+            else:
+                # distinct over the envs for the consecutive env seeds (e.g.: seed(0) gives the seeds 0 to env_num - 1)
+                seeds = [self._env_seed[i] + self.env_num * self._env_reset_count[i] for i in seed_ids]
+            self._env.seed(seeds, seed_ids)
+        for i in env_ids:
+            self._env_reset_count[i] += 1
+        obs = self._env.reset(env_ids)
+        for j, env_id in enumerate(env_ids):
+            self._ready_obs[env_id] = {k: v[j] for k, v in obs.items()}
+            self._eval_episode_return[env_id] = 0.
+            self._env_states[env_id] = EnvState.RUN
+
+    def step(self, actions: Dict[int, Any]) -> Dict[int, BaseEnvTimestep]:
+        self._check_closed()
+        env_ids = list(actions.keys())
+        obs, rew, done, info = self._env.step([actions[i] for i in env_ids], env_ids)
+        rew = rew.astype(np.float32)
+
+        timesteps, reset_ids = {}, []
+        for j, env_id in enumerate(env_ids):
+            o = {k: v[j] for k, v in obs.items()}
+            self._eval_episode_return[env_id] += rew[j]
+            if done[j]:
+                info[j]['eval_episode_return'] = self._eval_episode_return[env_id:env_id + 1].copy()
+                self._env_episode_count[env_id] += 1
+                if self._env_episode_count[env_id] < self._episode_num:
+                    if self._auto_reset:
+                        reset_ids.append(env_id)
+                    else:
+                        self._env_states[env_id] = EnvState.NEED_RESET
+                else:
+                    self._env_states[env_id] = EnvState.DONE
+            else:
+                self._ready_obs[env_id] = o
+            timesteps[env_id] = BaseEnvTimestep(o, rew[j:j + 1], bool(done[j]), info[j])
+        if len(reset_ids) > 0:
+            self._reset_batch(reset_ids)
+        return timesteps
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._env.close()
+        for i in range(self.env_num):
+            self._env_states[i] = EnvState.VOID
+        self._closed = True
+
+
+def _unwrap(env: Any) -> SheepEnv:
+    # the SheepEnv inside the DingEnvWrapper (_env) and gym wrappers (env)
+    while not isinstance(env, SheepEnv):
+        env = env._env if hasattr(env, '_env') else env.env
+    return env
+
+
+def _shm_views(obs_buffer) -> Dict[str, np.ndarray]:
+    # numpy views of the shared memory of a ShmBufferContainer of dict obs
+    views = {}
+    for k, container in obs_buffer._data.items():
+        buffer = container._data
+        views[k] = np.frombuffer(buffer.buffer.get_obj(), dtype=buffer.dtype).reshape(buffer.shape)
+    return views
+
+
+class _InPlaceObsBuffer(object):
+    # the obs buffer of a worker whose env already writes its obs into the shared memory, so fill only copies the
+    # arrays which are not the shared ones (e.g.: if a wrapper made new obs)
+
+    def __init__(self, obs_buffer) -> None:
+        self._obs_buffer = obs_buffer
+        self._views = _shm_views(obs_buffer)
+
+    def fill(self, obs: Dict[str, np.ndarray]) -> None:
+        for k, view in self._views.items():
+            if obs[k] is not view:
+                np.copyto(view, obs[k])
+
+
+class _InPlaceEnvFn(object):
+    # stands for the CloudPickleWrapper of env_fn in the worker process
+
+    def __init__(self, env_fn: Callable, views: Dict[str, np.ndarray]) -> None:
+        self._env_fn = env_fn
+        self._views = views
+
+    @property
+    def data(self) -> Callable:
+        return self._make_env
+
+    def _make_env(self) -> Any:
+        env = self._env_fn()
+        _unwrap(env).set_obs_buffer(self._views)
+        return env
+
+
+@ENV_MANAGER_REGISTRY.register('sheep_subprocess')
+class SheepSubprocessEnvManager(SyncSubprocessEnvManager):
+    # DI-engine subprocess env manager with shared memory obs (shared_memory=True), where the SheepEnv of each worker
+    # writes its obs directly into the shared buffers (see SheepEnv.set_obs_buffer) instead of returning new arrays
+    # which are then copied into them, env_fn should create a SheepEnv (optionally wrapped, e.g.: DingEnvWrapper)
+
+    @staticmethod
+    def worker_fn_robust(parent, child, env_fn_wrapper, obs_buffer, method_name_list, *args, **kwargs) -> None:
+        if obs_buffer is not None:
+            in_place_buffer = _InPlaceObsBuffer(obs_buffer)
+            env_fn_wrapper = _InPlaceEnvFn(env_fn_wrapper.data, in_place_buffer._views)
+            obs_buffer = in_place_buffer
+        SyncSubprocessEnvManager.worker_fn_robust(
+            parent, child, env_fn_wrapper, obs_buffer, method_name_list, *args, **kwargs
+        )
@@ -0,0 +1,185 @@
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import math
+import multiprocessing as mp
+import time
+import numpy as np
+from sheep_env import SheepEnv, BatchedSheepEnv
+from sheep_utils import parse_levels, parse_ckpt_spec
+
+# evaluation of an agent checkpoint on seeded episodes of each level: the episodes are split into chunks of
+# batch_size games, each chunk is played by a worker process as one BatchedSheepEnv, whose live games are stepped
+# with one batched forward of the model, episode i of a level is the game of SheepEnv(level).seed(seed + i), so the
+# results do not depend on the worker and batch sizes
+# usage (in the service directory): python sheep_eval.py --ckpt ckpt_best.pth.tar --levels 1-10 --episode-num 1000
+# or with the level 10 MLP model: --ckpt '1-9:ckpt_best.pth.tar;10:ckpt_level10.pth.tar:MLP'
+
+# the actor of each level
+_actors = {}
+
+
+def _init_worker(ckpt_spec: Optional[str], backend: str) -> None:
+    # the models are loaded once by each worker, the workers are the parallelism, so torch uses one thread each
+    # ckpt_spec: the checkpoint of each level with its item encoder type and dead item mode (see parse_ckpt_spec),
+    # e.g.: ckpt_best.pth.tar or 1-9:ckpt_best.pth.tar::pack;10:ckpt_level10.pth.tar:MLP
+    global _actors
+    _actors = {}
+    if ckpt_spec is None:
+        return
+    import torch
+    from sheep_export import load_actor
+    torch.set_num_threads(1)
+    for levels, path, encoder_type, dead_item in parse_ckpt_spec(ckpt_spec):
+        actor = load_actor(path, backend, item_encoder_type=encoder_type, dead_item=dead_item)
+        _actors.update({level: actor for level in levels})
+
+
+def _actions(obs: Dict[str, np.ndarray], rngs: List[np.random.Generator], level: int) -> np.ndarray:
+    # greedy actions of the agent model of the level for a batch of games, random legal ones (a generator per game)
+    # without model
+    if len(_actors) == 0:
+        actions = [rng.choice(np.flatnonzero(mask)) for rng, mask in zip(rngs, obs['action_mask'])]
+        return np.array(actions, dtype=np.int64)
+    import torch
+    from ding.torch_utils import to_tensor
+    with torch.no_grad():
+        logit = _actors[level].compute_actor(to_tensor(obs))['logit']
+    return logit.argmax(dim=-1).numpy()
+
+
+def play(task: Tuple[int, int, int]) -> Dict[str, np.ndarray]:
+    # the (seed, win, return, length) of the episodes of a task (level, seed_begin, seed_end)
+    level, seed_begin, seed_end = task
+    env = BatchedSheepEnv(seed_end - seed_begin, level, agent=True, max_padding=True, auto_reset=False)
+    env.seed(list(range(seed_begin, seed_end)))
+    rngs = [np.random.default_rng([level, s]) for s in range(seed_begin, seed_end)]
+    obs = env.reset()
+    ret = np.zeros(env.env_num, dtype=np.float64)
+    length = np.zeros(env.env_num, dtype=np.int64)
+    live = np.arange(env.env_num)
+    while len(live) > 0:
+        obs, rew, done, _ = env.step(_actions(obs, [rngs[i] for i in live], level), live)
+        ret[live] += rew
+        length[live] += 1
+        live = live[~done]
+        obs = {k: v[~done] for k, v in obs.items()}
+    return {
+        'level': level,
+        'seed': np.arange(seed_begin, seed_end),
+        'win': env.cur_item_num == 0,
+        'return': ret,
+        'length': length,
+    }
+
+
+def wilson_interval(win_num: int, n: int, z: float = 1.96) -> Tuple[float, float]:
+    # confidence interval of a win rate, which stays in [0, 1] and is not empty for the rates near 0 or 1
+    if n == 0:
+        return 0., 1.
+    p = win_num / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(0., center - half), min(1., center + half)
+
+
+def mean_interval(x: np.ndarray, z: float = 1.96) -> Tuple[float, float, float]:
+    # mean and its normal approximation confidence interval
+    mean = float(np.mean(x))
+    half = z * float(np.std(x, ddof=1)) / math.sqrt(len(x)) if len(x) > 1 else 0.
+    return mean, mean - half, mean + half
+
+
+def summarize(episodes: Dict[str, np.ndarray]) -> Dict[str, float]:
+    n, win_num = len(episodes['win']), int(episodes['win'].sum())
+    win_low, win_high = wilson_interval(win_num, n)
+    ret, ret_low, ret_high = mean_interval(episodes['return'])
+    length, length_low, length_high = mean_interval(episodes['length'])
+    return {
+        'episode_num': n,
+        'win_rate': win_num / n,
+        'win_rate_low': win_low,
+        'win_rate_high': win_high,
+        'return': ret,
+        'return_low': ret_low,
+        'return_high': ret_high,
+        'length': length,
+        'length_low': length_low,
+        'length_high': length_high,
+    }
+
+
+def evaluate(
+        ckpt_spec: Optional[str],
+        levels: List[int],
+        episode_num: int,
+        worker_num: int = 4,
+        batch_size: int = 64,
+        seed: int = 0,
+        backend: str = 'eager'
+) -> Dict[int, Dict[str, float]]:
+    # the summary of the episodes of each level, played in this process if worker_num is 0
+    if ckpt_spec is not None:
+        covered = set([level for entry in parse_ckpt_spec(ckpt_spec) for level in entry[0]])
+        assert covered.issuperset(levels), 'no checkpoint for the levels {}'.format(sorted(set(levels) - covered))
+    tasks = [
+        (level, seed + begin, seed + min(begin + batch_size, episode_num)) for level in levels
+        for begin in range(0, episode_num, batch_size)
+    ]
+    if worker_num == 0:
+        _init_worker(ckpt_spec, backend)
+        results = [play(task) for task in tasks]
+    else:
+        with mp.get_context('spawn').Pool(worker_num, _init_worker, (ckpt_spec, backend)) as pool:
+            results = list(pool.imap_unordered(play, tasks))
+    summary = {}
+    for level in levels:
+        level_results = sorted([r for r in results if r['level'] == level], key=lambda r: r['seed'][0])
+        episodes = {k: np.concatenate([r[k] for r in level_results]) for k in ['seed', 'win', 'return', 'length']}
+        summary[level] = summarize(episodes)
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='DI-sheep multi-level evaluation')
+    parser.add_argument(
+        '--ckpt',
+        default=None,
+        help='the agent checkpoint (or the checkpoint of each level, see sheep_utils.parse_ckpt_spec), random legal '
+        'actions if not set'
+    )
+    parser.add_argument('--backend', default='eager', help='see sheep_export.py')
+    parser.add_argument('--levels', default='1-{}'.format(SheepEnv.max_level))
+    parser.add_argument('--episode-num', type=int, default=1000, help='of each level')
+    parser.add_argument('--worker-num', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=64, help='the games played together by a worker')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='save the summary as json')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    summary = evaluate(
+        args.ckpt, parse_levels(args.levels), args.episode_num, args.worker_num, args.batch_size, args.seed,
+        args.backend
+    )
+    print(
+        '{:>5} {:>8} {:>22} {:>24} {:>20}'.format(
+            'level', 'episodes', 'win rate (95% CI)', 'return (95% CI)', 'length (95% CI)'
+        )
+    )
+    for level, s in summary.items():
+        print(
+            '{:>5} {:>8} {:>6.3f} [{:.3f}, {:.3f}] {:>7.2f} [{:>6.2f}, {:>6.2f}] {:>5.1f} [{:>5.1f}, {:>5.1f}]'.format(
+                level, s['episode_num'], s['win_rate'], s['win_rate_low'], s['win_rate_high'], s['return'],
+                s['return_low'], s['return_high'], s['length'], s['length_low'], s['length_high']
+            )
+        )
+    episode_num = sum([s['episode_num'] for s in summary.values()])
+    print('{} episodes in {:.1f}s'.format(episode_num, time.time() - start_time))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'summary': summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+from typing import Dict, Optional
+import argparse
+import copy
+import os
+import tempfile
+import numpy as np
+import torch
+import torch.nn as nn
+from ding.torch_utils import to_tensor, unsqueeze
+from sheep_env import SheepEnv
+from sheep_model import IndexLinear
+from sheep_service import load_agent_model
+
+ACTOR_INPUT_KEYS = ('item_obs', 'bucket_obs', 'global_obs', 'action_mask')
+# torchscript/onnx, the *_int8 ones quantize the weights of the Linear layers to int8 (dynamic quantization)
+BACKENDS = ['eager', 'torchscript', 'torchscript_int8', 'onnx', 'onnx_int8']
+ONNX_DTYPES = {
+    'tensor(float)': np.float32,
+    'tensor(double)': np.float64,
+    'tensor(uint8)': np.uint8,
+    'tensor(int32)': np.int32,
+    'tensor(int64)': np.int64,
+    'tensor(bool)': np.bool_,
+}
+
+
+class SheepActor(nn.Module):
+    # compute_actor of SheepModel with positional tensor inputs and the logit as output, for tracing and exporting
+
+    def __init__(self, model: nn.Module) -> None:
+        super(SheepActor, self).__init__()
+        self.model = model
+
+    def forward(self, item_obs, bucket_obs, global_obs, action_mask):
+        x = {'item_obs': item_obs, 'bucket_obs': bucket_obs, 'global_obs': global_obs, 'action_mask': action_mask}
+        return self.model.compute_actor(x)['logit']
+
+
+class ExportedActor(object):
+    # inference engine with the same compute_actor/compute_action interface as SheepModel
+
+    def __init__(self, path: str, backend: str) -> None:
+        assert backend in BACKENDS[1:], backend
+        self.backend = backend
+        if backend.startswith('torchscript'):
+            self._module = torch.jit.load(path, map_location='cpu')
+        else:
+            import onnxruntime as ort
+            self._session = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+            # the inputs are cast to the dtypes of the example inputs of the export
+            self._input_dtypes = {i.name: ONNX_DTYPES[i.type] for i in self._session.get_inputs()}
+
+    def compute_actor(self, x: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        if self.backend.startswith('torchscript'):
+            with torch.no_grad():
+                return {'logit': self._module(*[x[k] for k in ACTOR_INPUT_KEYS])}
+        inputs = {k: x[k].numpy().astype(self._input_dtypes[k], copy=False) for k in ACTOR_INPUT_KEYS}
+        return {'logit': torch.from_numpy(self._session.run(None, inputs)[0])}
+
+    def compute_action(self, x: Dict[str, np.ndarray]) -> int:
+        x = unsqueeze(to_tensor(x))
+        logit = self.compute_actor(x)['logit']
+        return logit.argmax(dim=-1)[0].item()
+
+
+def example_inputs(level: int = 1) -> tuple:
+    env = SheepEnv(level, agent=True, max_padding=True)
+    env.seed(0)
+    x = unsqueeze(to_tensor(env.reset()))
+    return tuple(x[k] for k in ACTOR_INPUT_KEYS)
+
+
+def _tmp_path(path: str) -> str:
+    # a new file in the directory of path
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=os.path.basename(path) + '.', suffix='.tmp', dir=os.path.dirname(os.path.abspath(path))
+    )
+    os.close(fd)
+    return tmp_path
+
+
+def plain_linear(model: nn.Module) -> nn.Module:
+    # a copy of the model whose IndexLinear layers (the first layers of the item encoders) are nn.Linear with the same
+    # parameters: the traced graphs only take the dense item_obs anyway, and the dynamic quantization only matches the
+    # exact nn.Linear type, so it would keep these layers in fp32 otherwise
+    model = copy.deepcopy(model)
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, IndexLinear):
+                linear = nn.Linear(child.in_features, child.out_features)
+                linear.weight, linear.bias = child.weight, child.bias
+                setattr(parent, name, linear)
+    return model
+
+
+def export_actor(model: nn.Module, path: str, backend: str = 'torchscript', example_level: int = 1) -> ExportedActor:
+    # export compute_actor of the model (a SheepModel) to path, the item number (dim 1) and batch size are dynamic,
+    # except for the two_stage_MLP item encoder, whose item number is fixed (example_level should match it), the
+    # graph takes the dense item_obs only, and the *_int8 backends quantize all its Linear layers (see plain_linear)
+    assert backend in BACKENDS[1:], backend
+    # the packed item number depends on the data, which the traced graph can't follow
+    assert model.item_encoder.dead_item != 'pack', 'export the model with the same weights and dead_item=mask instead'
+    actor = SheepActor(plain_linear(model)).eval()
+    inputs = example_inputs(example_level)
+    if backend == 'torchscript_int8':
+        actor = torch.ao.quantization.quantize_dynamic(actor, {nn.Linear}, dtype=torch.qint8)
+    # the file is written next to path and moved in place, so the processes exporting the same checkpoint at the same
+    # time (e.g.: the shard or evaluation workers) never load a partially written one
+    tmp_path = _tmp_path(path)
+    if backend.startswith('torchscript'):
+        with torch.no_grad():
+            module = torch.jit.freeze(torch.jit.trace(actor, inputs))
+        torch.jit.save(module, tmp_path)
+    else:
+        onnx_path = tmp_path if backend == 'onnx' else _tmp_path(path + '.fp32')
+        torch.onnx.export(
+            actor,
+            inputs,
+            onnx_path,
+            input_names=list(ACTOR_INPUT_KEYS),
+            output_names=['logit'],
+            dynamic_axes={
+                'item_obs': {0: 'batch', 1: 'item'},
+                'bucket_obs': {0: 'batch'},
+                'global_obs': {0: 'batch'},
+                'action_mask': {0: 'batch', 1: 'item'},
+                'logit': {0: 'batch', 1: 'item'},
+            },
+        )
+        if backend == 'onnx_int8':
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(onnx_path, tmp_path, weight_type=QuantType.QInt8)
+            os.remove(onnx_path)
+    os.replace(tmp_path, path)
+    return ExportedActor(path, backend)
+
+
+def load_actor(
+        ckpt_path: str,
+        backend: str = 'eager',
+        export_path: Optional[str] = None,
+        item_encoder_type: Optional[str] = None,
+        dead_item: Optional[str] = None
+):
+    # load the agent model of the checkpoint (see load_agent_model), then export it (default to ckpt_path.backend) if
+    # backend is not eager
+    assert backend in BACKENDS, backend
+    model = load_agent_model(ckpt_path, item_encoder_type, dead_item)
+    if backend == 'eager':
+        return model
+    if model.item_encoder.dead_item == 'pack':
+        # the same function as pack, which can be traced
+        model.item_encoder.dead_item = 'mask'
+    if export_path is None:
+        export_path = '{}.{}'.format(ckpt_path, backend)
+    return export_actor(model, export_path, backend)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='export the actor of a DI-sheep checkpoint')
+    parser.add_argument('--ckpt', default='ckpt_best.pth.tar')
+    parser.add_argument('--backend', default='torchscript', choices=BACKENDS[1:])
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+    load_actor(args.ckpt, args.backend, args.output)
@@ -0,0 +1,146 @@
+from typing import Dict, Optional
+from threading import Thread, Lock
+import os
+import tempfile
+import numpy as np
+from sheep_env import SheepEnv, make_cover_csr
+
+# the arrays of a block of scenes of one level (S scenes of M items, E cover edges in total):
+# scene_id (S, ), icon/x/y/cover_num (S, M), quadrant_num (S, M, 4), indptr (S, M + 1), edge_ptr (S + 1, ),
+# indices (E, ), quadrant (E, 4), the cover edges of scene s are edge_ptr[s]:edge_ptr[s + 1] (see make_cover_csr)
+BLOCK_KEYS = ('scene_id', 'icon', 'x', 'y', 'cover_num', 'quadrant_num', 'indptr', 'edge_ptr', 'indices', 'quadrant')
+
+_level_envs = {}
+
+
+def _level_env(level: int) -> SheepEnv:
+    # env of the level constants to generate the layouts with
+    if level not in _level_envs:
+        _level_envs[level] = SheepEnv(level)
+    return _level_envs[level]
+
+
+def make_scene_block(level: int, scene_ids: np.ndarray, seed: int = 0) -> Dict[str, np.ndarray]:
+    # each scene only depends on (seed, level, scene id), so any scene can be generated again from its id
+    env = _level_env(level)
+    M = env.total_item_num
+    block = {
+        'scene_id': np.asarray(scene_ids, dtype=np.int64),
+        'icon': np.zeros((len(scene_ids), M), dtype=np.uint8),
+        'x': np.zeros((len(scene_ids), M), dtype=np.int16),
+        'y': np.zeros((len(scene_ids), M), dtype=np.int16),
+        'cover_num': np.zeros((len(scene_ids), M), dtype=np.uint8),
+        'quadrant_num': np.zeros((len(scene_ids), M, 4), dtype=np.uint8),
+        'indptr': np.zeros((len(scene_ids), M + 1), dtype=np.int32),
+        'edge_ptr': np.zeros(len(scene_ids) + 1, dtype=np.int64),
+    }
+    indices, quadrant = [], []
+    for s, scene_id in enumerate(scene_ids):
+        rng = np.random.default_rng([seed, level, int(scene_id)])
+        icon, offset, row, column = env._make_layout(rng).T
+        block['icon'][s] = icon
+        block['x'][s] = column * 100 + offset
+        block['y'][s] = row * 100 + offset
+        cover_num, quadrant_num, indptr, scene_indices, scene_quadrant = make_cover_csr(block['x'][s], block['y'][s])
+        block['cover_num'][s] = cover_num
+        block['quadrant_num'][s] = quadrant_num
+        block['indptr'][s] = indptr
+        block['edge_ptr'][s + 1] = block['edge_ptr'][s] + len(scene_indices)
+        indices.append(scene_indices.astype(np.uint8))
+        quadrant.append(scene_quadrant)
+    block['indices'] = np.concatenate(indices)
+    block['quadrant'] = np.concatenate(quadrant)
+    return block
+
+
+def _block_scene(block: Dict[str, np.ndarray], s: int) -> Dict[str, np.ndarray]:
+    begin, end = block['edge_ptr'][s], block['edge_ptr'][s + 1]
+    return {
+        'scene_id': block['scene_id'][s],
+        'icon': block['icon'][s],
+        'x': block['x'][s],
+        'y': block['y'][s],
+        'cover_num': block['cover_num'][s],
+        'quadrant_num': block['quadrant_num'][s],
+        'indptr': block['indptr'][s],
+        'indices': block['indices'][begin:end],
+        'quadrant': block['quadrant'][begin:end],
+    }
+
+
+class LevelPool(object):
+    # pregenerated scenes of each level for SheepEnv(level_pool=...), whose reset copies a random scene of the pool
+    # instead of generating a new one, the scenes of a level are generated at its first use (or loaded from path)
+    # reproducibility: without refill, the scenes only depend on (seed, size), so the episodes of a seeded env too,
+    # with refill, a new block of scenes is generated in the background after every refill_interval samples and
+    # swapped in when ready, the scene of an episode can then be found (and generated again) by env.scene_id
+    # path: save the scenes there and load them with memory mapping, so the processes on a host share them
+
+    def __init__(self, size: int = 256, seed: int = 0, path: Optional[str] = None, refill_interval: int = 0) -> None:
+        assert path is None or refill_interval == 0, 'the memory mapped pools are read only'
+        self.size = size
+        self.seed = seed
+        self.path = path
+        self.refill_interval = refill_interval
+        self._blocks = {}  # level -> (block number, block)
+        self._sample_num = {}
+        self._refilling = set()
+        self._lock = Lock()
+
+    def __getstate__(self) -> Dict:
+        # only the config is pickled (e.g.: to the subprocess envs), the scenes are generated or loaded again
+        return {'size': self.size, 'seed': self.seed, 'path': self.path, 'refill_interval': self.refill_interval}
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__init__(**state)
+
+    def _block_path(self, level: int) -> str:
+        return os.path.join(self.path, 'level{}_seed{}_size{}'.format(level, self.seed, self.size))
+
+    def _load_block(self, level: int) -> Dict[str, np.ndarray]:
+        if self.path is None:
+            return make_scene_block(level, np.arange(self.size), self.seed)
+        block_path = self._block_path(level)
+        if not os.path.exists(os.path.join(block_path, 'quadrant.npy')):
+            block = make_scene_block(level, np.arange(self.size), self.seed)
+            os.makedirs(block_path, exist_ok=True)
+            # quadrant is written last and marks the complete blocks
+            # each writer (e.g.: the env processes of a cold cache) has its own temporary files
+            for k in BLOCK_KEYS:
+                fd, tmp_path = tempfile.mkstemp(prefix=k + '.', suffix='.npy', dir=block_path)
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, block[k])
+                os.replace(tmp_path, os.path.join(block_path, k + '.npy'))
+        return {k: np.load(os.path.join(block_path, k + '.npy'), mmap_mode='r') for k in BLOCK_KEYS}
+
+    def block(self, level: int) -> Dict[str, np.ndarray]:
+        if level not in self._blocks:
+            with self._lock:
+                if level not in self._blocks:
+                    self._blocks[level] = (0, self._load_block(level))
+                    self._sample_num[level] = 0
+        return self._blocks[level][1]
+
+    def _refill(self, level: int) -> None:
+        number = self._blocks[level][0] + 1
+        block = make_scene_block(level, np.arange(number * self.size, (number + 1) * self.size), self.seed)
+        with self._lock:
+            self._blocks[level] = (number, block)
+            self._refilling.discard(level)
+
+    def sample(self, level: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        # the arrays of a random scene of the level, read only
+        block = self.block(level)
+        s = rng.integers(len(block['scene_id']))
+        if self.refill_interval > 0:
+            with self._lock:
+                self._sample_num[level] += 1
+                if self._sample_num[level] % self.refill_interval == 0 and level not in self._refilling:
+                    self._refilling.add(level)
+                    Thread(target=self._refill, args=(level, ), daemon=True).start()
+        return _block_scene(block, s)
+
+    def scene(self, level: int, scene_id: int) -> Dict[str, np.ndarray]:
+        # generate any scene of the pool again, e.g.: to replay an episode
+        return _block_scene(make_scene_block(level, np.array([scene_id]), self.seed), 0)
+
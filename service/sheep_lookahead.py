@@ -0,0 +1,66 @@
+from typing import Dict, Optional
+import time
+import numpy as np
+from sheep_env import SheepEnv
+
+
+class LookaheadPolicy(object):
+    # Monte-Carlo evaluation of the legal actions of a game: up to rollout_num rollouts after each action (round robin
+    # over the actions, until the time budget of the request is used up), the action of the best mean return is chosen
+    # the rollouts run on a clone of the game restored by set_state, without making any obs, and play the items
+    # matching the bucket first, the others at random
+    # SheepService passes the env of the session to the policies with use_env
+    use_env = True
+
+    def __init__(self, rollout_num: int = 16, time_budget_ms: Optional[float] = 50., seed: Optional[int] = None) -> None:
+        self.rollout_num = rollout_num
+        self.time_budget_ms = time_budget_ms
+        self._rng = np.random.default_rng(seed)
+        self.rollout_count = 0
+
+    def _rollout_action(self, env: SheepEnv) -> int:
+        legal = np.flatnonzero(env.alive & env.accessible)
+        count = env.bucket[env.icon[legal]]
+        best = legal[count == count.max()]
+        return int(best[self._rng.integers(len(best))])
+
+    def _rollout(self, env: SheepEnv, state: np.ndarray) -> float:
+        env.set_state(state)
+        ret, done = 0., False
+        while not done:
+            rew, done = env._step(self._rollout_action(env))
+            ret += rew
+        self.rollout_count += 1
+        return ret
+
+    def evaluate(self, env: SheepEnv) -> Dict[int, float]:
+        # the mean return of each legal action of env (its game is not changed)
+        # no time budget (None) for the full rollout_num rollouts
+        deadline = np.inf if self.time_budget_ms is None else time.time() + self.time_budget_ms / 1000
+        sim_env = env.clone()
+        root = sim_env.get_state()
+        values, children = {}, {}
+        for action in np.flatnonzero(env.alive & env.accessible).tolist():
+            sim_env.set_state(root)
+            rew, done = sim_env._step(action)
+            if done:
+                # the game ends with this action, nothing to roll out
+                values[action] = [rew]
+            else:
+                values[action] = []
+                children[action] = (rew, sim_env.get_state())
+        for _ in range(self.rollout_num):
+            if time.time() > deadline:
+                break
+            for action, (rew, state) in children.items():
+                if time.time() > deadline:
+                    break
+                values[action].append(rew + self._rollout(sim_env, state))
+        return {action: np.mean(v) if len(v) > 0 else -np.inf for action, v in values.items()}
+
+    def __call__(self, obs: Dict, env: SheepEnv) -> int:
+        if env.cur_item_num == 0 or len(env.bucket_ids) >= env.bucket_length:
+            # the game is over
+            return 0
+        values = self.evaluate(env)
+        return max(values, key=values.get)
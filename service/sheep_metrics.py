@@ -0,0 +1,184 @@
+from typing import Dict, List, Optional, Tuple
+from threading import Lock
+import time
+
+# seconds, from 100us (a step of a small level) to seconds (a batched forward of a busy agent server)
+DEFAULT_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# the metrics are collected as families: {'name', 'kind', 'doc', 'labelnames', 'samples'}, the samples map the label
+# values to the value (counter/gauge) or to [bucket counts, sum, count] (histogram), plain data which can be sent
+# from the shard workers, merged and rendered in the Prometheus text format
+
+
+class Counter(object):
+    kind = 'counter'
+
+    def __init__(self, name: str, doc: str, labelnames: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.doc = doc
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, *labelvalues, value: float = 1.) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.) + value
+
+    def collect(self) -> Dict:
+        with self._lock:
+            samples = dict(self._values)
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'doc': self.doc,
+            'labelnames': self.labelnames,
+            'samples': samples,
+        }
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, *labelvalues, value: float) -> None:
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class _Timer(object):
+    __slots__ = ('histogram', 'labelvalues', 'start')
+
+    def __init__(self, histogram: 'Histogram', labelvalues: Tuple) -> None:
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self) -> '_Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.histogram.observe(*self.labelvalues, value=time.perf_counter() - self.start)
+
+
+class Histogram(object):
+    kind = 'histogram'
+
+    def __init__(
+            self, name: str, doc: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        self.name = name
+        self.doc = doc
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts (the last one for +Inf), sum, count]
+        self._lock = Lock()
+
+    def observe(self, *labelvalues, value: float) -> None:
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        with self._lock:
+            if labelvalues not in self._values:
+                self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0., 0]
+            v = self._values[labelvalues]
+            v[0][i] += 1
+            v[1] += value
+            v[2] += 1
+
+    def time(self, *labelvalues) -> _Timer:
+        # with histogram.time(label values): ... observes the time of the block
+        return _Timer(self, labelvalues)
+
+    def collect(self) -> Dict:
+        with self._lock:
+            samples = {k: [list(v[0]), v[1], v[2]] for k, v in self._values.items()}
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'doc': self.doc,
+            'labelnames': self.labelnames,
+            'buckets': self.buckets,
+            'samples': samples,
+        }
+
+
+class MetricsRegistry(object):
+
+    def __init__(self) -> None:
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, doc: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, doc, labelnames))
+
+    def gauge(self, name: str, doc: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, doc, labelnames))
+
+    def histogram(
+            self, name: str, doc: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, doc, labelnames, buckets))
+
+    def collect(self) -> List[Dict]:
+        return [m.collect() for m in self._metrics]
+
+
+def value_family(name: str, kind: str, doc: str, value: float) -> Dict:
+    # a family of one value without labels, e.g.: for the counts kept elsewhere (SessionStore.stats)
+    return {'name': name, 'kind': kind, 'doc': doc, 'labelnames': (), 'samples': {(): value}}
+
+
+def merge(collected: List[List[Dict]]) -> List[Dict]:
+    # sum the families of several processes (the gauges too, e.g.: the live envs of all the shards)
+    families = {}
+    for family_list in collected:
+        for family in family_list:
+            if family['name'] not in families:
+                families[family['name']] = dict(family, samples={})
+            samples = families[family['name']]['samples']
+            for k, v in family['samples'].items():
+                if k not in samples:
+                    samples[k] = v if family['kind'] != 'histogram' else [list(v[0]), v[1], v[2]]
+                elif family['kind'] != 'histogram':
+                    samples[k] += v
+                else:
+                    s = samples[k]
+                    s[0] = [a + b for a, b in zip(s[0], v[0])]
+                    s[1] += v[1]
+                    s[2] += v[2]
+    return list(families.values())
+
+
+def _labels(labelnames: Tuple[str, ...], labelvalues: Tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(labelnames, labelvalues))
+    if extra is not None:
+        pairs.append(extra)
+    if len(pairs) == 0:
+        return ''
+    return '{' + ','.join(['{}="{}"'.format(k, str(v).replace('"', '\\"')) for k, v in pairs]) + '}'
+
+
+def render(families: List[Dict]) -> str:
+    # the Prometheus text exposition format
+    lines = []
+    for family in families:
+        name, labelnames = family['name'], family['labelnames']
+        lines.append('# HELP {} {}'.format(name, family['doc']))
+        lines.append('# TYPE {} {}'.format(name, family['kind']))
+        for labelvalues, value in sorted(family['samples'].items()):
+            if family['kind'] != 'histogram':
+                lines.append('{}{} {}'.format(name, _labels(labelnames, labelvalues), float(value)))
+                continue
+            bucket_counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(family['buckets'] + ('+Inf', ), bucket_counts):
+                cumulative += bucket_count
+                lines.append(
+                    '{}_bucket{} {}'.format(name, _labels(labelnames, labelvalues, ('le', str(bound))), cumulative)
+                )
+            lines.append('{}_sum{} {}'.format(name, _labels(labelnames, labelvalues), total))
+            lines.append('{}_count{} {}'.format(name, _labels(labelnames, labelvalues), count))
+    return '\n'.join(lines) + '\n'
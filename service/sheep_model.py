@@ -1,16 +1,51 @@
+import numpy as np
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import treetensor.torch as ttorch
 from ding.torch_utils import Transformer, MLP, unsqueeze, to_tensor
 
 
+def is_sparse_obs(item_obs, item_obs_size):
+    # the sparse item_obs are told from the dense ones by their row size, as the dense ones can be integers too (e.g.:
+    # SheepEnv(obs_dtype=np.uint8))
+    return item_obs.shape[-1] != item_obs_size
+
+
+class IndexLinear(nn.Linear):
+    # the first layer of the item encoders, which also takes the sparse item_obs of SheepEnv(sparse_obs=True) (the
+    # indices of the ones of each row, in_features for none): the sum of the embeddings (the columns of weight) of the
+    # indices is the same as the Linear of the dense one-hot rows, with the same parameters
+
+    def forward(self, x):
+        if not is_sparse_obs(x, self.in_features):
+            return super().forward(x.to(self.weight.dtype))
+        # the pad index gets the zero embedding
+        weight = torch.cat([self.weight.t(), self.weight.new_zeros(1, self.out_features)])
+        embedding = F.embedding_bag(x.reshape(-1, x.shape[-1]).int(), weight, mode='sum')
+        return embedding.reshape(*x.shape[:-1], self.out_features) + self.bias
+
+
+def _index_linear(linear):
+    index_linear = IndexLinear(linear.in_features, linear.out_features)
+    index_linear.weight, index_linear.bias = linear.weight, linear.bias
+    return index_linear
+
+
 class ItemEncoder(nn.Module):
     encoder_type = ['TF', 'MLP', 'two_stage_MLP']
+    # how the TF encoder treats the removed items: keep them in the attention (as the released models do),
+    # mask them out of the attention keys, or pack the live items together so the attention only runs over them,
+    # the removed items get zero embeddings with mask and pack
+    dead_item_mode = ['keep', 'mask', 'pack']
 
-    def __init__(self, item_obs_size=60, item_num=30, item_encoder_type='TF', hidden_size=64, activation=nn.ReLU()):
+    def __init__(self, item_obs_size=60, item_num=30, item_encoder_type='TF', hidden_size=64, activation=nn.ReLU(), dead_item='keep'):
         super(ItemEncoder, self).__init__()
         assert item_encoder_type in self.encoder_type, "not support item encoder type: {}/{}".format(item_encoder_type, self.encoder_type)
+        assert dead_item in self.dead_item_mode, "not support dead item mode: {}/{}".format(dead_item, self.dead_item_mode)
         self.item_encoder_type = item_encoder_type
+        self.dead_item = dead_item
+        self.item_obs_size = item_obs_size
         self.item_num = item_num
         self.hidden_size = hidden_size
 
@@ -45,24 +80,62 @@ class ItemEncoder(nn.Module):
                 layer_num=2,
                 activation=activation
             )
+        # the dense (float or uint8) and sparse (index) item_obs are both taken by the first layer, the parameters and
+        # their names are the same as the ones of nn.Linear
+        if self.item_encoder_type == 'TF':
+            self.encoder.embedding[0] = _index_linear(self.encoder.embedding[0])
+        elif self.item_encoder_type == 'MLP':
+            self.encoder[0] = _index_linear(self.encoder[0])
+        else:
+            self.encoder_1[0] = _index_linear(self.encoder_1[0])
 
     def forward(self, item_obs):
+        if self.item_encoder_type == 'TF':
+            if self.dead_item == 'keep':
+                return self.encoder(item_obs)
+            # a removed item only has the move out feature, the others have at least position and visibility
+            if not is_sparse_obs(item_obs, self.item_obs_size):
+                alive = item_obs.sum(-1) > 1  # (B, M)
+            else:
+                alive = (item_obs < self.item_obs_size).sum(-1) > 1
+            if self.dead_item == 'mask':
+                return self.encoder(item_obs, alive) * alive.unsqueeze(-1)
+            return self.forward_packed(item_obs, alive)
+        return self.forward_merge(self.forward_item(item_obs))
+
+    def forward_packed(self, item_obs, alive):
+        B, M, C = item_obs.shape
+        item_num = alive.sum(1)
+        max_num = max(int(item_num.max()), 1)
+        # the indices of the live items first (in order), then the removed ones, cut to the max live item number
+        index = torch.argsort((~alive).to(torch.uint8), dim=1, stable=True)[:, :max_num]
+        packed_obs = torch.gather(item_obs, 1, index.unsqueeze(-1).expand(B, max_num, C))
+        mask = torch.arange(max_num, device=item_obs.device).unsqueeze(0) < item_num.unsqueeze(1)  # (B, max_num)
+        packed_embedding = self.encoder(packed_obs, mask) * mask.unsqueeze(-1)
+        item_embedding = packed_embedding.new_zeros(B, M, self.hidden_size)
+        return item_embedding.scatter(1, index.unsqueeze(-1).expand(B, max_num, self.hidden_size), packed_embedding)
+
+    # the MLP encoders are split into the part applied to each item independently and the merge of all the items,
+    # so that the embeddings of the unchanged items can be reused between steps (see IncrementalActor)
+    def forward_item(self, item_obs):
+        if self.item_encoder_type == 'two_stage_MLP':
+            return self.encoder_1(item_obs)   # (B, M, L)
+        return self.encoder(item_obs)
+
+    def forward_merge(self, item_embedding):
         if self.item_encoder_type == 'two_stage_MLP':
-            item_embedding_1 = self.encoder_1(item_obs)   # (B, M, L)
-            item_embedding_2 = torch.reshape(item_embedding_1, [-1, self.trans_len*self.item_num])
+            item_embedding_2 = torch.reshape(item_embedding, [-1, self.trans_len*self.item_num])
             item_embedding = self.encoder_2(item_embedding_2)
             item_embedding = torch.reshape(item_embedding, [-1, self.item_num, self.hidden_size])
-        else:
-            item_embedding = self.encoder(item_obs)
         return item_embedding
 
 
 class SheepModel(nn.Module):
     mode = ['compute_actor', 'compute_critic', 'compute_actor_critic']
 
-    def __init__(self, item_obs_size=60, item_num=30, item_encoder_type='TF', bucket_obs_size=30, global_obs_size=17, hidden_size=64, activation=nn.ReLU(), ttorch_return=False):
+    def __init__(self, item_obs_size=60, item_num=30, item_encoder_type='TF', bucket_obs_size=30, global_obs_size=17, hidden_size=64, activation=nn.ReLU(), ttorch_return=False, dead_item='keep'):
         super(SheepModel, self).__init__()
-        self.item_encoder = ItemEncoder(item_obs_size, item_num, item_encoder_type, hidden_size, activation=activation)
+        self.item_encoder = ItemEncoder(item_obs_size, item_num, item_encoder_type, hidden_size, activation=activation, dead_item=dead_item)
         self.bucket_encoder = MLP(bucket_obs_size, hidden_size, hidden_size, layer_num=3, activation=activation)
         self.global_encoder = MLP(global_obs_size, hidden_size, hidden_size, layer_num=2, activation=activation)
         self.value_head = nn.Sequential(
@@ -72,8 +145,8 @@ class SheepModel(nn.Module):
 
     def compute_actor(self, x):
         item_embedding = self.item_encoder(x['item_obs'])
-        bucket_embedding = self.bucket_encoder(x['bucket_obs'])
-        global_embedding = self.global_encoder(x['global_obs'])
+        bucket_embedding = self.bucket_encoder(x['bucket_obs'].float())
+        global_embedding = self.global_encoder(x['global_obs'].float())
 
         key = item_embedding
         query = bucket_embedding + global_embedding
@@ -87,8 +160,8 @@ class SheepModel(nn.Module):
 
     def compute_critic(self, x):
         item_embedding = self.item_encoder(x['item_obs'])
-        bucket_embedding = self.bucket_encoder(x['bucket_obs'])
-        global_embedding = self.global_encoder(x['global_obs'])
+        bucket_embedding = self.bucket_encoder(x['bucket_obs'].float())
+        global_embedding = self.global_encoder(x['global_obs'].float())
 
         embedding = item_embedding.mean(1) + bucket_embedding + global_embedding
         value = self.value_head(embedding)
@@ -99,8 +172,8 @@ class SheepModel(nn.Module):
 
     def compute_actor_critic(self, x):
         item_embedding = self.item_encoder(x['item_obs'])
-        bucket_embedding = self.bucket_encoder(x['bucket_obs'])
-        global_embedding = self.global_encoder(x['global_obs'])
+        bucket_embedding = self.bucket_encoder(x['bucket_obs'].float())
+        global_embedding = self.global_encoder(x['global_obs'].float())
 
         key = item_embedding
         query = bucket_embedding + global_embedding
@@ -124,3 +197,70 @@ class SheepModel(nn.Module):
         with torch.no_grad():
             logit = self.compute_actor(x)['logit']
             return logit.argmax(dim=-1)[0].item()
+
+
+class IncrementalActor(object):
+    # stateful compute_action of one game for the MLP item encoders, the per-item embeddings of the last call are
+    # cached and only the rows of item_obs which changed since then are encoded again (the removed item and the items
+    # it uncovered), so a new game (or level) only needs a new instance or reset
+    encoder_type = ['MLP', 'two_stage_MLP']
+
+    def __init__(self, model: SheepModel) -> None:
+        assert model.item_encoder.item_encoder_type in self.encoder_type, model.item_encoder.item_encoder_type
+        self.model = model
+        # two_stage_MLP merges a fixed number of items
+        self.item_num = model.item_encoder.item_num if model.item_encoder.item_encoder_type == 'two_stage_MLP' else None
+        self.reset()
+
+    def reset(self) -> None:
+        self._item_obs = None
+        self._item_embedding = None
+        self.encoded_item_num = 0
+
+    def compute_actor(self, x):
+        item_obs = np.array(x['item_obs'])
+        assert self.item_num is None or len(item_obs) == self.item_num, (len(item_obs), self.item_num)
+        if item_obs.dtype.kind == 'f':
+            item_obs = item_obs.astype(np.float32)
+        with torch.no_grad():
+            if self._item_obs is None or self._item_obs.shape != item_obs.shape:
+                self._item_embedding = self.model.item_encoder.forward_item(torch.from_numpy(item_obs))
+                self.encoded_item_num += len(item_obs)
+            else:
+                rows = np.flatnonzero((item_obs != self._item_obs).any(1))
+                if len(rows) > 0:
+                    self._item_embedding[rows] = self.model.item_encoder.forward_item(torch.from_numpy(item_obs[rows]))
+                    self.encoded_item_num += len(rows)
+            self._item_obs = item_obs
+            x = unsqueeze(to_tensor({k: v for k, v in x.items() if k != 'item_obs'}))
+            item_embedding = self.model.item_encoder.forward_merge(self._item_embedding.unsqueeze(0))
+            bucket_embedding = self.model.bucket_encoder(x['bucket_obs'].float())
+            global_embedding = self.model.global_encoder(x['global_obs'].float())
+
+            query = (bucket_embedding + global_embedding).unsqueeze(1)
+            logit = (item_embedding * query).sum(2)
+            logit.masked_fill_(~x['action_mask'].bool(), value=-1e9)
+        return {'logit': logit}
+
+    def compute_action(self, x):
+        return self.compute_actor(x)['logit'].argmax(dim=-1)[0].item()
+
+
+def compatible_state_dict(state_dict):
+    # compatibility for v1 and v2 model, whose item encoder was the Transformer/MLP itself: item_encoder.xxx instead of
+    # item_encoder.encoder.xxx, the keys of the submodules of the current ItemEncoder are kept
+    current_prefix = ('item_encoder.encoder.', 'item_encoder.encoder_1.', 'item_encoder.encoder_2.')
+    return {
+        'item_encoder.encoder.' + k[len('item_encoder.'):]
+        if k.startswith('item_encoder.') and not k.startswith(current_prefix) else k: v
+        for k, v in state_dict.items()
+    }
+
+
+def state_dict_item_num(state_dict, trans_len=16):
+    # the item number of the two_stage_MLP item encoder of a state dict (from the input size of encoder_2), None for
+    # the other item encoders, which take any item number
+    for k, v in state_dict.items():
+        if k.startswith('item_encoder.encoder_2.') and k.endswith('weight'):
+            return v.shape[1] // trans_len
+    return None
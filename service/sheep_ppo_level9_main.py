@@ -8,6 +8,7 @@ from ding.worker import BaseLearner, create_serial_collector, InteractionSerialE
 from ding.utils import set_pkg_seed
 
 from sheep_env import SheepEnv
+from sheep_level_pool import LevelPool
 from sheep_model import SheepModel
 
 sheep_ppo_config = dict(
@@ -20,12 +21,17 @@ sheep_ppo_config = dict(
         n_evaluator_episode=10,
         # stop_value=15,
         stop_value=1e6,     # to run fixed env step
+        # > 0 for the envs to reset from the pregenerated scenes of sheep_level_pool.py, which are saved in the exp dir
+        # and memory mapped by all the env processes
+        level_pool_size=0,
     ),
     policy=dict(
         cuda=True,
         recompute_adv=True,
         action_space='discrete',
-        model=dict(),
+        # pack (or mask) for the attention of the TF item encoder to only run over the live items (see ItemEncoder),
+        # it is saved in the checkpoints, which are served with the same one (see load_agent_model)
+        model=dict(dead_item='pack'),
         learn=dict(
             epoch_per_collect=10,
             batch_size=320,
@@ -52,16 +58,19 @@ sheep_ppo_create_config = dict(
         type='mujoco',
         import_names=['dizoo.mujoco.envs.mujoco_env'],
     ),
-    env_manager=dict(type='subprocess'),
+    # single-process BatchedSheepEnv, use dict(type='subprocess') for one process per env, or
+    # dict(type='sheep_subprocess', import_names=['sheep_env_manager']) for one process per env which writes its obs
+    # directly into the shared memory of the manager (shared_memory=True)
+    env_manager=dict(type='sheep_batched', import_names=['sheep_env_manager']),
     policy=dict(type='ppo', ),
 )
 sheep_ppo_create_config = EasyDict(sheep_ppo_create_config)
 create_config = sheep_ppo_create_config
 
 
-def sheep_env_fn(level):
+def sheep_env_fn(level, level_pool=None):
     return DingEnvWrapper(
-        SheepEnv(level), cfg={'env_wrapper': [
+        SheepEnv(level, level_pool=level_pool), cfg={'env_wrapper': [
             lambda env: EvalEpisodeReturnEnv(env),
         ]}
     )
@@ -70,12 +79,17 @@ def sheep_env_fn(level):
 def main(input_cfg, seed, max_env_step=int(1e6), max_train_iter=int(1e6)):
     cfg, create_cfg = input_cfg
     cfg = compile_config(cfg, seed=seed, auto=True, create_cfg=create_cfg)
-    collector_env = create_env_manager(
-        cfg.env.manager, [lambda: sheep_env_fn(cfg.env.level) for _ in range(cfg.env.collector_env_num)]
-    )
-    evaluator_env = create_env_manager(
-        cfg.env.manager, [lambda: sheep_env_fn(cfg.env.level) for _ in range(cfg.env.evaluator_env_num)]
-    )
+    level_pool = None
+    if cfg.env.level_pool_size > 0:
+        level_pool = LevelPool(cfg.env.level_pool_size, cfg.seed, os.path.join(cfg.exp_name, 'level_pool'))
+        level_pool.block(cfg.env.level)  # generate the scenes before the env processes map them
+    if cfg.env.manager.type == 'sheep_batched':
+        # the batched env manager steps all the games in one BatchedSheepEnv built from a plain SheepEnv
+        env_fn = lambda: SheepEnv(cfg.env.level, level_pool=level_pool)
+    else:
+        env_fn = lambda: sheep_env_fn(cfg.env.level, level_pool)
+    collector_env = create_env_manager(cfg.env.manager, [env_fn for _ in range(cfg.env.collector_env_num)])
+    evaluator_env = create_env_manager(cfg.env.manager, [env_fn for _ in range(cfg.env.evaluator_env_num)])
     collector_env.seed(cfg.seed, dynamic_seed=False)
     evaluator_env.seed(cfg.seed, dynamic_seed=False)
     set_pkg_seed(cfg.seed, use_cuda=cfg.policy.cuda)
@@ -86,12 +100,18 @@ def main(input_cfg, seed, max_env_step=int(1e6), max_train_iter=int(1e6)):
         obs_space['item_obs'].shape[0],
         'TF',
         obs_space['bucket_obs'].shape[0],
-        obs_space['global_obs'].shape[0]
+        obs_space['global_obs'].shape[0],
+        dead_item=cfg.policy.model.dead_item
     )
     policy = PPOPolicy(cfg.policy, model=model, enable_field=['learn', 'collect', 'eval'])
 
+    # the checkpoints of the learner also record the item encoder options of the model
+    model_options = {'item_encoder_type': 'TF', 'dead_item': cfg.policy.model.dead_item}
+    learn_state_dict = policy.learn_mode.state_dict
+    learn_mode = policy.learn_mode._replace(state_dict=lambda: dict(learn_state_dict(), **model_options))
+
     tb_logger = SummaryWriter(os.path.join('./{}/log/'.format(cfg.exp_name), 'serial'))
-    learner = BaseLearner(cfg.policy.learn.learner, policy.learn_mode, tb_logger, exp_name=cfg.exp_name)
+    learner = BaseLearner(cfg.policy.learn.learner, learn_mode, tb_logger, exp_name=cfg.exp_name)
     collector = create_serial_collector(
         cfg.policy.collect.collector,
         env=collector_env,
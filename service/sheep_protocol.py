@@ -0,0 +1,133 @@
+from typing import Dict, List, Tuple
+import struct
+import numpy as np
+from sheep_env import SheepEnv
+
+# 1: the whole remaining scene and bucket in each response, each item is a json string
+# 2: the scene is only sent by reset, step sends the removed/changed items and bucket changes as plain objects
+PROTOCOL_VERSIONS = [1, 2]
+ITEM_KEYS = ('uid', 'icon', 'x', 'y', 'accessible', 'visible')
+FLAG_KEYS = ('uid', 'accessible', 'visible')
+
+# binary encoding of the version 2 results, negotiated by the Accept header
+BINARY_MIMETYPE = 'application/x-di-sheep'
+BINARY_RESET, BINARY_STEP = 0, 1
+# command, version, done, agent action (-1 for none), max item num (0 for step), then the length of each section:
+# items (the scene for reset, the changed items for step), removed, bucket added, bucket removed
+BINARY_HEADER = struct.Struct('<BB?hHHHHH')
+# fixed-width item record, flags: 1 for accessible, 2 for visible
+BINARY_ITEM = np.dtype([('uid', '<u2'), ('icon', 'u1'), ('flags', 'u1'), ('x', '<u2'), ('y', '<u2')])
+
+
+def _item_dicts(env: SheepEnv, ids: np.ndarray, keys: Tuple[str]) -> List[Dict]:
+    columns = {
+        'uid': ids,
+        'icon': env.icon[ids],
+        'x': env.x[ids],
+        'y': env.y[ids],
+        'accessible': env.accessible[ids].astype(np.int64),
+        'visible': env.visible[ids].astype(np.int64),
+    }
+    return [dict(zip(keys, v)) for v in zip(*[columns[k].tolist() for k in keys])]
+
+
+def _item_records(env: SheepEnv, ids: np.ndarray) -> np.ndarray:
+    records = np.empty(len(ids), dtype=BINARY_ITEM)
+    records['uid'] = ids
+    records['icon'] = env.icon[ids]
+    records['flags'] = env.accessible[ids] | (env.visible[ids].astype(np.uint8) << 1)
+    records['x'] = env.x[ids]
+    records['y'] = env.y[ids]
+    return records
+
+
+def _step_delta(env: SheepEnv, action: int, last_snapshot: Tuple) -> Tuple[np.ndarray, List[int], List[int]]:
+    last_accessible, last_visible, last_bucket_ids = last_snapshot
+    changed = env.alive & ((env.accessible != last_accessible) | (env.visible != last_visible))
+    bucket_added = [int(action)] if action in env.bucket_ids else []
+    bucket_removed = [int(i) for i in last_bucket_ids if i not in env.bucket_ids]
+    return np.flatnonzero(changed), bucket_added, bucket_removed
+
+
+def snapshot(env: SheepEnv) -> Tuple:
+    # the item flags and bucket before a step, which the step delta is computed against
+    return env.accessible.copy(), env.visible.copy(), list(env.bucket_ids)
+
+
+def reset_result(env: SheepEnv, version: int = 1) -> Dict:
+    assert version in PROTOCOL_VERSIONS, version
+    if version == 1:
+        scene = [item.to_json() for item in env.scene if item is not None]
+    else:
+        scene = _item_dicts(env, np.flatnonzero(env.alive), ITEM_KEYS)
+    return {
+        "scene": scene,
+        "max_item_num": env.total_item_num,
+    }
+
+
+def step_result(env: SheepEnv, action: int, done: bool, last_snapshot: Tuple, version: int = 1) -> Dict:
+    assert version in PROTOCOL_VERSIONS, version
+    if version == 1:
+        return {
+            "scene": [item.to_json() for item in env.scene if item is not None],
+            "bucket": [item.to_json() for item in env.bucket_items],
+            "done": done,
+        }
+    changed, bucket_added, bucket_removed = _step_delta(env, action, last_snapshot)
+    return {
+        "removed": [int(action)],
+        "changed": _item_dicts(env, changed, FLAG_KEYS),
+        "bucket_added": bucket_added,
+        "bucket_removed": bucket_removed,
+        "done": done,
+    }
+
+
+def reset_binary(env: SheepEnv, agent_action: int = -1) -> bytes:
+    records = _item_records(env, np.flatnonzero(env.alive))
+    header = BINARY_HEADER.pack(BINARY_RESET, 2, False, agent_action, env.total_item_num, len(records), 0, 0, 0)
+    return header + records.tobytes()
+
+
+def step_binary(env: SheepEnv, action: int, done: bool, last_snapshot: Tuple, agent_action: int = -1) -> bytes:
+    changed, bucket_added, bucket_removed = _step_delta(env, action, last_snapshot)
+    records = _item_records(env, changed)
+    header = BINARY_HEADER.pack(
+        BINARY_STEP, 2, done, agent_action, 0, len(records), 1, len(bucket_added), len(bucket_removed)
+    )
+    ids = np.array([action] + bucket_added + bucket_removed, dtype='<u2')
+    return header + records.tobytes() + ids.tobytes()
+
+
+def decode_binary(data: bytes) -> Dict:
+    # the inverse of reset_binary/step_binary, returns the same structure as the version 2 json results
+    command, _, done, agent_action, max_item_num, item_num, removed_num, added_num, bucket_removed_num = \
+        BINARY_HEADER.unpack_from(data)
+    offset = BINARY_HEADER.size
+    records = np.frombuffer(data, dtype=BINARY_ITEM, count=item_num, offset=offset)
+    offset += records.nbytes
+    ids = np.frombuffer(data, dtype='<u2', offset=offset).tolist()
+    items = [
+        {
+            'uid': int(r['uid']),
+            'icon': int(r['icon']),
+            'x': int(r['x']),
+            'y': int(r['y']),
+            'accessible': int(r['flags'] & 1),
+            'visible': int(r['flags'] >> 1 & 1),
+        } for r in records
+    ]
+    if command == BINARY_RESET:
+        result = {'scene': items, 'max_item_num': max_item_num}
+    else:
+        result = {
+            'removed': ids[:removed_num],
+            'changed': [{k: item[k] for k in FLAG_KEYS} for item in items],
+            'bucket_added': ids[removed_num:removed_num + added_num],
+            'bucket_removed': ids[removed_num + added_num:removed_num + added_num + bucket_removed_num],
+            'done': done,
+        }
+    if agent_action >= 0:
+        result['action'] = agent_action
+    return result
@@ -0,0 +1,177 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from queue import Queue, Full, Empty
+from threading import Thread
+import json
+import os
+import time
+import numpy as np
+from sheep_env import SheepEnv
+
+# an episode is replayed exactly by SheepEnv(level).seed(seed), reset(level) and its actions, so only those are kept
+MAX_STEP_NUM = 128  # more than the item number of any level
+RESULT_UNFINISHED, RESULT_WIN, RESULT_LOSE = 0, 1, 2
+EPISODE_RECORD = np.dtype(
+    [
+        ('seed', '<u8'),
+        ('time', '<f8'),  # the start time of the episode
+        ('level', 'u1'),
+        ('agent', 'u1'),  # played in the agent server
+        ('result', 'u1'),
+        ('step_num', '<u2'),
+        ('actions', 'u1', (MAX_STEP_NUM, )),
+        ('rewards', '<f4', (MAX_STEP_NUM, )),
+    ]
+)
+INDEX_FILE = 'index.json'
+
+
+class Episode(object):
+    # the episode in progress of a session, reused by the following episodes of the session, recording from start
+    # until it is recorded
+    __slots__ = ('seed', 'level', 'agent', 'start_time', 'actions', 'rewards', 'recording')
+
+    def __init__(self, agent: bool = False) -> None:
+        self.agent = agent
+        self.start(0, 1)
+        self.recording = False
+
+    def start(self, seed: int, level: int) -> None:
+        self.seed = seed
+        self.level = level
+        self.start_time = time.time()
+        self.actions = []
+        self.rewards = []
+        self.recording = True
+
+    def to_record(self, result: int) -> np.ndarray:
+        record = np.zeros((), dtype=EPISODE_RECORD)
+        record['seed'] = self.seed
+        record['time'] = self.start_time
+        record['level'] = self.level
+        record['agent'] = self.agent
+        record['result'] = result
+        record['step_num'] = len(self.actions)
+        record['actions'][:len(self.actions)] = self.actions
+        record['rewards'][:len(self.rewards)] = self.rewards
+        return record
+
+
+class TrajectoryRecorder(object):
+    # appends the finished episodes to path/shard_{i}.bin files of shard_size fixed size EPISODE_RECORD records, from a
+    # background thread, the requests only put the records into a bounded queue (dropped if it is full, counted by
+    # dropped_num), so they never wait for the disk
+    # path/index.json lists the record number of each shard, it is rewritten after the records are written, so the
+    # readers (see TrajectoryDataset) only see complete records
+
+    def __init__(
+            self, path: str, shard_size: int = 100000, flush_interval: float = 1., max_queue_size: int = 100000
+    ) -> None:
+        self.path = path
+        self.shard_size = shard_size
+        self.flush_interval = flush_interval
+        os.makedirs(path, exist_ok=True)
+        self._shards = self._load_index()
+        self._queue = Queue(max_queue_size)
+        self.dropped_num = 0
+        self.written_num = 0
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _load_index(self) -> List[int]:
+        index_path = os.path.join(self.path, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return []
+        with open(index_path, 'r') as f:
+            return json.load(f)['shards']
+
+    def _write_index(self) -> None:
+        index_path = os.path.join(self.path, INDEX_FILE)
+        with open(index_path + '.tmp', 'w') as f:
+            index = {'record_size': EPISODE_RECORD.itemsize, 'shard_size': self.shard_size, 'shards': self._shards}
+            json.dump(index, f)
+        os.replace(index_path + '.tmp', index_path)
+
+    def record(self, episode: Episode, result: int) -> None:
+        # the empty episodes (reset and left) are not recorded
+        episode.recording = False
+        if len(episode.actions) == 0:
+            return
+        try:
+            self._queue.put_nowait(episode.to_record(result))
+        except Full:
+            self.dropped_num += 1
+
+    def _write(self, records: List[np.ndarray]) -> None:
+        records = np.stack(records)
+        while len(records) > 0:
+            if len(self._shards) == 0 or self._shards[-1] >= self.shard_size:
+                self._shards.append(0)
+            shard_id = len(self._shards) - 1
+            n = min(self.shard_size - self._shards[-1], len(records))
+            shard_path = os.path.join(self.path, 'shard_{:05d}.bin'.format(shard_id))
+            with open(shard_path, 'r+b' if self._shards[-1] > 0 else 'wb') as f:
+                # overwrite the incomplete records a crash may have left after the indexed ones
+                f.seek(self._shards[-1] * EPISODE_RECORD.itemsize)
+                f.write(records[:n].tobytes())
+                f.truncate()
+            self._shards[-1] += n
+            self.written_num += n
+            records = records[n:]
+        self._write_index()
+
+    def _run(self) -> None:
+        records, last_flush, closed = [], time.time(), False
+        while not closed:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+                if record is None:
+                    closed = True
+                else:
+                    records.append(record)
+            except Empty:
+                pass
+            if len(records) > 0 and (closed or time.time() - last_flush >= self.flush_interval):
+                self._write(records)
+                records, last_flush = [], time.time()
+
+    def close(self) -> None:
+        # write the queued records and stop the writer thread
+        self._queue.put(None)
+        self._thread.join()
+
+
+class TrajectoryDataset(object):
+    # read only memory mapped view of the shards of a TrajectoryRecorder path
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), 'r') as f:
+            index = json.load(f)
+        assert index['record_size'] == EPISODE_RECORD.itemsize, index['record_size']
+        self.shard_sizes = index['shards']
+
+    def __len__(self) -> int:
+        return sum(self.shard_sizes)
+
+    def shard(self, shard_id: int) -> np.ndarray:
+        return np.memmap(
+            os.path.join(self.path, 'shard_{:05d}.bin'.format(shard_id)),
+            dtype=EPISODE_RECORD,
+            mode='r',
+            shape=(self.shard_sizes[shard_id], )
+        )
+
+    def episodes(self) -> Iterator[np.ndarray]:
+        for shard_id in range(len(self.shard_sizes)):
+            yield from self.shard(shard_id)
+
+
+def replay(record: np.ndarray, agent: bool = True, max_padding: bool = True) -> Iterator[Tuple]:
+    # regenerate the (obs, action, reward, done) of each step of a recorded episode
+    env = SheepEnv(int(record['level']), agent=agent, max_padding=max_padding)
+    env.seed(int(record['seed']))
+    obs = env.reset()
+    for action in record['actions'][:record['step_num']].tolist():
+        next_obs, rew, done, _ = env.step(action)
+        yield obs, action, rew, done
+        obs = next_obs
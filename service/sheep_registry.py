@@ -0,0 +1,172 @@
+from typing import Dict, List, Optional, Tuple
+from threading import Event, Lock, Thread
+import os
+import time
+from sheep_env import SheepEnv
+from sheep_metrics import MetricsRegistry
+from sheep_service import AGENT_CKPT_PATH, agent_policy
+from sheep_utils import parse_ckpt_spec
+
+
+class ModelEntry(object):
+    # a loaded checkpoint with its policy arguments (see agent_policy), active counts the requests using it
+
+    def __init__(self, path: str, version: Tuple[int, int], model, policy_kwargs: Dict) -> None:
+        self.path = path
+        self.version = version
+        self.model = model
+        self.policy = policy_kwargs.get('policy')
+        self.policy_fn = policy_kwargs.get('policy_fn')
+        self.active = 0
+
+    def close(self) -> None:
+        if hasattr(self.policy, 'close'):
+            self.policy.close()
+
+
+class SessionPolicy(object):
+    # the policy of a session (SheepService policy_fn=registry.session_policy), which acts with the current model of
+    # the level of its env, the per session policies (e.g.: IncrementalActor) are created again after a swap
+
+    use_env = True
+
+    def __init__(self, registry: 'ModelRegistry') -> None:
+        self.registry = registry
+        self._entry = None
+        self._policy = None
+
+    def __call__(self, obs: Dict, env: SheepEnv) -> int:
+        entry = self.registry.acquire(env.level)
+        try:
+            if entry.policy_fn is None:
+                return entry.policy(obs)
+            if entry is not self._entry:
+                self._entry, self._policy = entry, entry.policy_fn()
+            return self._policy(obs)
+        finally:
+            self.registry.release(entry)
+
+
+class ModelRegistry(object):
+    # the agent models of the levels, each loaded once from its checkpoint (see parse_ckpt_spec and load_agent_model)
+    # the checkpoints are polled every poll_interval seconds by a background thread (or by poll() if it is 0), a
+    # changed one is loaded on the side and swapped in for its levels at once: the requests which already hold the old
+    # model finish with it, and it is closed (e.g.: the thread of BatchedPolicy) when the last of them is released
+    # the new checkpoint files should be moved in place (e.g.: os.replace), a partially written one fails to load and
+    # is tried again at the next poll
+
+    def __init__(
+            self,
+            spec: str = AGENT_CKPT_PATH,
+            backend: str = 'eager',
+            batch_size: int = 1,
+            batch_wait_ms: float = 2.,
+            poll_interval: float = 0.
+    ) -> None:
+        self.backend = backend
+        self.batch_size = batch_size
+        self.batch_wait_ms = batch_wait_ms
+        self.spec = parse_ckpt_spec(spec)
+        self._lock = Lock()
+        self._retired = []
+        self._failed_version = {}
+        self.metrics = MetricsRegistry()
+        self.load_time = self.metrics.gauge(
+            'sheep_model_load_seconds', 'Time of the last load of each checkpoint.', ('ckpt', )
+        )
+        self.swap_num = self.metrics.counter('sheep_model_swaps_total', 'Checkpoints swapped in after startup.')
+        self.load_error_num = self.metrics.counter(
+            'sheep_model_load_errors_total', 'Failed loads of the changed checkpoints.'
+        )
+        # the entry of each level, replaced as a whole dict by the swaps
+        self._levels = {}
+        for levels, path, encoder_type, dead_item in self.spec:
+            entry = self._load(path, encoder_type, dead_item, self._version(path))
+            self._levels.update({level: entry for level in levels})
+
+        self._stop = Event()
+        self._thread = None
+        if poll_interval > 0:
+            self._thread = Thread(target=self._run, args=(poll_interval, ), daemon=True, name='sheep_model_registry')
+            self._thread.start()
+
+    @staticmethod
+    def _version(path: str) -> Tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(
+            self, path: str, encoder_type: Optional[str], dead_item: Optional[str], version: Tuple[int, int]
+    ) -> ModelEntry:
+        from sheep_export import load_actor
+        t_start = time.perf_counter()
+        model = load_actor(path, self.backend, item_encoder_type=encoder_type, dead_item=dead_item)
+        entry = ModelEntry(path, version, model, agent_policy(model, self.batch_size, self.batch_wait_ms))
+        self.load_time.set(path, value=time.perf_counter() - t_start)
+        return entry
+
+    def get(self, level: int) -> ModelEntry:
+        return self._levels[level]
+
+    def acquire(self, level: int) -> ModelEntry:
+        with self._lock:
+            entry = self._levels[level]
+            entry.active += 1
+        return entry
+
+    def release(self, entry: ModelEntry) -> None:
+        with self._lock:
+            entry.active -= 1
+            closed = [e for e in self._retired if e.active == 0]
+            self._retired = [e for e in self._retired if e.active > 0]
+        for e in closed:
+            e.close()
+
+    def session_policy(self) -> SessionPolicy:
+        return SessionPolicy(self)
+
+    def poll(self) -> int:
+        # load and swap in the changed checkpoints, return the number of swapped ones
+        swap_num = 0
+        for levels, path, encoder_type, dead_item in self.spec:
+            entry = self._levels[levels[0]]
+            try:
+                version = self._version(path)
+                if version == entry.version or version == self._failed_version.get(path):
+                    continue
+                new_entry = self._load(path, encoder_type, dead_item, version)
+            except Exception as e:
+                # tried again once the file changes
+                print('failed to load {}: {}'.format(path, repr(e)))
+                self._failed_version[path] = version
+                self.load_error_num.inc()
+                continue
+            level_entries = dict(self._levels)
+            level_entries.update({level: new_entry for level in levels})
+            with self._lock:
+                self._levels = level_entries
+                closed = entry.active == 0
+                if not closed:
+                    self._retired.append(entry)
+            if closed:
+                entry.close()
+            self.swap_num.inc()
+            swap_num += 1
+        return swap_num
+
+    def _run(self, poll_interval: float) -> None:
+        while not self._stop.wait(poll_interval):
+            self.poll()
+
+    def collect_metrics(self) -> List[Dict]:
+        return self.metrics.collect()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            entries = {id(e): e for e in list(self._levels.values()) + self._retired}
+            self._retired = []
+        for entry in entries.values():
+            entry.close()
@@ -0,0 +1,211 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import secrets
+import time
+from sheep_env import SheepEnv
+from sheep_metrics import MetricsRegistry, value_family, render
+from sheep_recorder import Episode, TrajectoryRecorder, RESULT_UNFINISHED, RESULT_WIN, RESULT_LOSE
+from sheep_protocol import PROTOCOL_VERSIONS, snapshot, reset_result, step_result, reset_binary, step_binary
+from sheep_session import SessionStore
+
+MAX_ENV_NUM = 50
+ENV_TIMEOUT_SECOND = 60
+AGENT_CKPT_PATH = 'ckpt_best.pth.tar'
+
+
+def load_agent_model(
+        ckpt_path: str = AGENT_CKPT_PATH, item_encoder_type: Optional[str] = None, dead_item: Optional[str] = None
+):
+    # the item encoder type and dead item mode (see ItemEncoder) are read from the checkpoint if they are not set, TF
+    # and keep for the checkpoints without them (e.g.: the released ones)
+    # torch is only imported by the agent servers
+    import torch
+    from sheep_model import SheepModel, compatible_state_dict, state_dict_item_num
+    try:
+        # the tensors are memory-mapped from the file instead of read and copied (torch>=2.1, zip format checkpoints)
+        ckpt = torch.load(ckpt_path, map_location='cpu', mmap=True)
+    except (TypeError, RuntimeError):
+        ckpt = torch.load(ckpt_path, map_location='cpu')
+    state_dict = compatible_state_dict(ckpt['model'])
+    model = SheepModel(
+        item_obs_size=80,
+        item_num=state_dict_item_num(state_dict) or 30,
+        item_encoder_type=item_encoder_type or ckpt.get('item_encoder_type', 'TF'),
+        global_obs_size=19,
+        dead_item=dead_item or ckpt.get('dead_item', 'keep')
+    )
+    model.load_state_dict(state_dict)
+    return model
+
+
+def agent_policy(model, batch_size: int = 1, batch_wait_ms: float = 2.) -> Dict:
+    # the policy arguments of SheepService for the agent model (SheepModel or ExportedActor):
+    # the MLP item encoders reuse the item embeddings of the last step of each game, the others can batch the
+    # concurrent requests (batch_size > 1)
+    from sheep_model import SheepModel, IncrementalActor
+    if isinstance(model, SheepModel) and model.item_encoder.item_encoder_type in IncrementalActor.encoder_type:
+        return {'policy_fn': lambda: IncrementalActor(model).compute_action}
+    if batch_size > 1:
+        from sheep_batcher import BatchedPolicy
+        return {'policy': BatchedPolicy(model, batch_size, batch_wait_ms)}
+    return {'policy': model.compute_action}
+
+
+class SheepService(object):
+    # game logic behind the server front ends: sessions, env stepping, agent actions and response encoding
+
+    def __init__(
+            self,
+            agent: bool = False,
+            policy: Optional[Callable] = None,
+            policy_fn: Optional[Callable] = None,
+            max_env_num: int = MAX_ENV_NUM,
+            env_timeout: float = ENV_TIMEOUT_SECOND,
+            recorder: Optional[TrajectoryRecorder] = None
+    ) -> None:
+        self.agent = agent
+        self.policy = policy
+        # policy_fn creates a policy for each session, for the stateful ones (e.g.: IncrementalActor)
+        self.policy_fn = policy_fn
+        # the policies with use_env (e.g.: LookaheadPolicy) are called with the env of the session too
+        # with recorder, each game is seeded and its (seed, level, actions, rewards, result) is recorded when it is
+        # over, reset again or its session is closed
+        self.recorder = recorder
+        # the least recently used env is evicted when max_env_num is reached
+        self.envs = SessionStore(max_env_num, env_timeout, on_remove=self._on_remove)
+        self.metrics = MetricsRegistry()
+        self.request_time = self.metrics.histogram(
+            'sheep_request_seconds', 'Time of the requests in the service.', ('command', )
+        )
+        self.phase_time = self.metrics.histogram(
+            'sheep_phase_seconds',
+            'Time of each phase of the requests: session, env_reset, env_step, visibility, obs, policy, serialize.',
+            ('phase', )
+        )
+        self.request_num = self.metrics.counter(
+            'sheep_requests_total', 'Requests by command and status code.', ('command', 'status_code')
+        )
+        self.rejected_num = self.metrics.counter(
+            'sheep_sessions_rejected_total', 'Steps of the missing or expired sessions.'
+        )
+
+    def __len__(self) -> int:
+        return len(self.envs)
+
+    def stats(self) -> Dict:
+        return self.envs.stats()
+
+    def collect_metrics(self) -> List[Dict]:
+        # the metric families (see sheep_metrics.py), the session ones from the counts of the session store
+        stats = self.envs.stats()
+        return self.metrics.collect() + [
+            value_family('sheep_live_envs', 'gauge', 'Live game sessions.', stats['session_num']),
+            value_family('sheep_sessions_created_total', 'counter', 'Created game sessions.', stats['created_num']),
+            value_family('sheep_sessions_expired_total', 'counter', 'Timed out game sessions.', stats['expired_num']),
+            value_family(
+                'sheep_sessions_evicted_total', 'counter', 'Game sessions evicted by the full store.',
+                stats['evicted_num']
+            ),
+        ]
+
+    def metrics_text(self) -> str:
+        return render(self.collect_metrics())
+
+    def _on_remove(self, key: str, session: Tuple) -> None:
+        episode = session[2]
+        if episode is not None and episode.recording:
+            self.recorder.record(episode, RESULT_UNFINISHED)
+
+    def remove(self, key: str) -> None:
+        session = self.envs.pop(key)
+        if session is not None:
+            self._on_remove(key, session)
+
+    def _make_env(self) -> SheepEnv:
+        if self.agent:
+            env = SheepEnv(1, agent=True, max_padding=True)
+        else:
+            env = SheepEnv(1, agent=False)
+        return env
+
+    def _action(self, policy: Optional[Callable], obs: Dict, env: SheepEnv) -> Optional[int]:
+        if policy is None:
+            return None
+        with self.phase_time.time('policy'):
+            if getattr(policy, 'use_env', False):
+                return policy(obs, env)
+            return policy(obs)
+
+    def _step(self, env: SheepEnv, action: int) -> Tuple[Dict, float, bool]:
+        # env.step with its phases timed
+        with self.phase_time.time('env_step'):
+            rew = env._execute_action(action)
+        with self.phase_time.time('visibility'):
+            env._update_visible_accessible(action)
+        rew, done = env._done(rew)
+        with self.phase_time.time('obs'):
+            obs = env._get_obs()
+        return obs, rew, done
+
+    def execute(self, key: str, cmd: str, arg: int, version: int = 1, binary: bool = False) -> Tuple[int, str, Any]:
+        # return (status code, status, result), result is None for errors, bytes for binary responses
+        command = cmd if cmd in ('reset', 'step') else 'invalid'
+        t_start = time.perf_counter()
+        try:
+            output = self._execute(key, cmd, arg, version, binary)
+        except Exception:
+            self.request_num.inc(command, '500')
+            raise
+        self.request_time.observe(command, value=time.perf_counter() - t_start)
+        self.request_num.inc(command, str(output[0]))
+        return output
+
+    def _execute(self, key: str, cmd: str, arg: int, version: int, binary: bool) -> Tuple[int, str, Any]:
+        if version not in PROTOCOL_VERSIONS:
+            return 500, "Invalid protocol version: {}".format(version), None
+        with self.phase_time.time('session'):
+            session = self.envs.get(key)
+            if session is None and cmd == 'reset':
+                policy = self.policy_fn() if self.policy_fn is not None else self.policy
+                episode = Episode(self.agent) if self.recorder is not None else None
+                session = self.envs.put(key, (self._make_env(), policy, episode))
+        if session is None:
+            self.rejected_num.inc()
+            return 501, "No response for too long time, please reset the game", None
+        env, policy, episode = session
+
+        if cmd == 'reset':
+            with self.phase_time.time('env_reset'):
+                if episode is not None:
+                    if episode.recording:
+                        self.recorder.record(episode, RESULT_UNFINISHED)
+                    # the seed and the actions replay the game exactly
+                    seed = secrets.randbits(63)
+                    env.seed(seed)
+                obs = env.reset(arg)
+                if episode is not None:
+                    episode.start(seed, env.level)
+            action = self._action(policy, obs, env)
+            with self.phase_time.time('serialize'):
+                if binary:
+                    result = reset_binary(env, -1 if action is None else action)
+                else:
+                    result = reset_result(env, version)
+        elif cmd == 'step':
+            last_snapshot = snapshot(env)
+            obs, rew, done = self._step(env, arg)
+            if episode is not None and episode.recording:
+                episode.actions.append(arg)
+                episode.rewards.append(rew)
+                if done:
+                    self.recorder.record(episode, RESULT_WIN if env.cur_item_num == 0 else RESULT_LOSE)
+            action = self._action(policy, obs, env)
+            with self.phase_time.time('serialize'):
+                if binary:
+                    result = step_binary(env, arg, done, last_snapshot, -1 if action is None else action)
+                else:
+                    result = step_result(env, arg, done, last_snapshot, version)
+        else:
+            return 500, "Invalid command: {}".format(cmd), None
+        if action is not None and not binary:
+            result['action'] = action
+        return 200, "Execution action", result
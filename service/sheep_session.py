@@ -0,0 +1,88 @@
+from typing import Any, Callable, Optional
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+class SessionStore(object):
+    # thread-safe session dict with timeout expiration and LRU eviction
+    # sessions are kept in the order of last access, so both expiration and eviction pop from the front in O(1)
+
+    def __init__(
+            self,
+            max_size: int,
+            timeout: float,
+            clock: Callable[[], float] = time.monotonic,
+            on_remove: Optional[Callable[[str, Any], None]] = None
+    ) -> None:
+        self.max_size = max_size
+        self.timeout = timeout
+        self._clock = clock
+        # called with (key, value) of the expired and evicted sessions, under the lock of the store
+        self._on_remove = on_remove
+        self._sessions = OrderedDict()  # key -> (last access time, value)
+        self._lock = Lock()
+        self.created_num = 0
+        self.evicted_num = 0
+        self.expired_num = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            self._expire(self._clock())
+            return key in self._sessions
+
+    def _expire(self, cur_time: float) -> None:
+        while len(self._sessions) > 0:
+            update_time = next(iter(self._sessions.values()))[0]
+            if cur_time - update_time < self.timeout:
+                break
+            key, (_, value) = self._sessions.popitem(last=False)
+            self.expired_num += 1
+            if self._on_remove is not None:
+                self._on_remove(key, value)
+
+    def get(self, key: str) -> Optional[Any]:
+        # return None if the session doesn't exist or has expired, otherwise refresh its access time
+        with self._lock:
+            cur_time = self._clock()
+            self._expire(cur_time)
+            if key not in self._sessions:
+                return None
+            value = self._sessions[key][1]
+            self._sessions[key] = (cur_time, value)
+            self._sessions.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any) -> Any:
+        # add (or replace) a session, the least recently used one is evicted if the store is full
+        with self._lock:
+            cur_time = self._clock()
+            self._expire(cur_time)
+            if key in self._sessions:
+                self._sessions.pop(key)
+            elif len(self._sessions) >= self.max_size:
+                evicted_key, (_, evicted_value) = self._sessions.popitem(last=False)
+                self.evicted_num += 1
+                if self._on_remove is not None:
+                    self._on_remove(evicted_key, evicted_value)
+            self._sessions[key] = (cur_time, value)
+            self.created_num += 1
+            return value
+
+    def pop(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._sessions.pop(key, None)
+            return None if item is None else item[1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(self._clock())
+            return {
+                'session_num': len(self._sessions),
+                'created_num': self.created_num,
+                'evicted_num': self.evicted_num,
+                'expired_num': self.expired_num,
+            }
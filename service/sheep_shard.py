@@ -0,0 +1,125 @@
+from typing import Any, Dict, List, Optional, Tuple
+from threading import Lock
+import multiprocessing as mp
+import os
+import zlib
+from sheep_metrics import merge, render
+from sheep_recorder import TrajectoryRecorder
+from sheep_service import SheepService, AGENT_CKPT_PATH, MAX_ENV_NUM
+
+
+def _shard_worker(
+        conn, agent: bool, ckpt_path: Optional[str], backend: str, record_path: Optional[str],
+        ckpt_poll_interval: float, service_kwargs: Dict
+) -> None:
+    registry = None
+    if agent:
+        from sheep_registry import ModelRegistry
+        # the requests of a worker are handled one by one, so there is nothing to batch
+        registry = ModelRegistry(ckpt_path, backend, poll_interval=ckpt_poll_interval)
+        service_kwargs['policy_fn'] = registry.session_policy
+    recorder = TrajectoryRecorder(record_path) if record_path is not None else None
+    service = SheepService(agent=agent, recorder=recorder, **service_kwargs)
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            if recorder is not None:
+                recorder.close()
+            if registry is not None:
+                registry.close()
+            break
+        if msg == 'stats':
+            conn.send(service.stats())
+            continue
+        if msg == 'metrics':
+            conn.send(service.collect_metrics() + (registry.collect_metrics() if registry is not None else []))
+            continue
+        try:
+            output = service.execute(*msg)
+        except Exception as e:
+            import traceback
+            print(repr(e))
+            print(traceback.format_exc())
+            output = (500, "Could not execute action", None)
+        # the session number is sent back with each response for the front end to report without extra calls
+        conn.send((output, len(service)))
+    conn.close()
+
+
+class ShardedSheepService(object):
+    # the same interface as SheepService, the sessions are sharded over worker processes by the crc32 of their key,
+    # so each session always goes to the same worker, commands are forwarded through one pipe per worker
+    # with record_path, each worker records its games to record_path/shard_{i} (see TrajectoryRecorder)
+    # max_env_num is the session limit of each worker, so shard_num * max_env_num sessions in total
+
+    def __init__(
+            self,
+            shard_num: int,
+            agent: bool = False,
+            ckpt_path: str = AGENT_CKPT_PATH,
+            backend: str = 'eager',
+            record_path: Optional[str] = None,
+            ckpt_poll_interval: float = 0.,
+            max_env_num: int = MAX_ENV_NUM,
+            **service_kwargs
+    ) -> None:
+        self.shard_num = shard_num
+        service_kwargs['max_env_num'] = max_env_num
+        ctx = mp.get_context('spawn')
+        self._conns, self._locks, self._workers = [], [], []
+        for i in range(shard_num):
+            parent_conn, child_conn = ctx.Pipe()
+            shard_record_path = os.path.join(record_path, 'shard_{}'.format(i)) if record_path is not None else None
+            worker = ctx.Process(
+                target=_shard_worker,
+                args=(child_conn, agent, ckpt_path, backend, shard_record_path, ckpt_poll_interval, service_kwargs),
+                daemon=True
+            )
+            worker.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._locks.append(Lock())
+            self._workers.append(worker)
+        self._session_num = [0 for _ in range(shard_num)]
+
+    def __len__(self) -> int:
+        return sum(self._session_num)
+
+    def shard_id(self, key: str) -> int:
+        return zlib.crc32(key.encode()) % self.shard_num
+
+    def execute(self, key: str, cmd: str, arg: int, version: int = 1, binary: bool = False) -> Tuple[int, str, Any]:
+        i = self.shard_id(key)
+        with self._locks[i]:
+            self._conns[i].send((key, cmd, arg, version, binary))
+            output, self._session_num[i] = self._conns[i].recv()
+        return output
+
+    def _gather(self, msg: str) -> List:
+        outputs = []
+        for conn, lock in zip(self._conns, self._locks):
+            with lock:
+                conn.send(msg)
+                outputs.append(conn.recv())
+        return outputs
+
+    def stats(self) -> Dict:
+        total = {}
+        for stats in self._gather('stats'):
+            for k, v in stats.items():
+                total[k] = total.get(k, 0) + v
+        return total
+
+    def collect_metrics(self) -> List[Dict]:
+        # the sum over the workers
+        return merge(self._gather('metrics'))
+
+    def metrics_text(self) -> str:
+        return render(self.collect_metrics())
+
+    def close(self) -> None:
+        for conn, lock in zip(self._conns, self._locks):
+            with lock:
+                conn.send(None)
+        for worker in self._workers:
+            worker.join()
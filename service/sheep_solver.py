@@ -0,0 +1,140 @@
+from typing import Dict, List, Optional
+import sys
+import time
+import numpy as np
+from sheep_env import SheepEnv
+
+SOLVED, UNSOLVABLE, BUDGET_EXCEEDED = 'solved', 'unsolvable', 'budget_exceeded'
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+class SheepSolver(object):
+    # depth first search of a clearing sequence from the current state of a SheepEnv, with all the icons known
+    # state: the alive items as a bitmask, the bucket is implied by it (each removal adds 1 mod 3 to its icon count),
+    # so the failed states are kept as a set of alive masks and never expanded twice
+    # moves are tried in the order of: completing a triple, matching the bucket, icons with more accessible items,
+    # items covering more items, and only one of the same icon accessible items that cover nothing alive is tried
+
+    def __init__(self, env: SheepEnv, max_node_num: int = 10 ** 6, max_seconds: float = 10.) -> None:
+        self.max_node_num = max_node_num
+        self.max_seconds = max_seconds
+        self.bucket_length = env.bucket_length
+        self.item_num = env.total_item_num
+        self.icon = env.icon.tolist()
+        # cover DAG: the items each item lies on, and the mask of the items lying on each item
+        indptr, indices = env._cover_indptr, env._cover_indices
+        self.under = [indices[indptr[j]:indptr[j + 1]].tolist() for j in range(self.item_num)]
+        self.over = [0 for _ in range(self.item_num)]
+        for j, items in enumerate(self.under):
+            for i in items:
+                self.over[i] |= 1 << j
+        self.alive = sum([1 << i for i in np.flatnonzero(env.alive).tolist()])
+        self.bucket = env.bucket.tolist()
+        self.node_num = 0
+
+    def _accessible(self, alive: int) -> int:
+        accessible = 0
+        for i in range(self.item_num):
+            if (alive >> i) & 1 and alive & self.over[i] == 0:
+                accessible |= 1 << i
+        return accessible
+
+    def _moves(self, alive: int, accessible: int) -> List[int]:
+        items = []
+        icon_num = {}
+        while accessible:
+            low = accessible & -accessible
+            i = low.bit_length() - 1
+            accessible ^= low
+            items.append(i)
+            icon_num[self.icon[i]] = icon_num.get(self.icon[i], 0) + 1
+        moves, leaf_icons = [], set()
+        for i in items:
+            icon = self.icon[i]
+            cover_num = sum([(alive >> j) & 1 for j in self.under[i]])
+            if cover_num == 0:
+                if icon in leaf_icons:
+                    continue
+                leaf_icons.add(icon)
+            moves.append((-self.bucket[icon], -icon_num[icon], -cover_num, i))
+        moves.sort()
+        return [m[-1] for m in moves]
+
+    def _search(self, alive: int, accessible: int, bucket_num: int, actions: List[int]) -> bool:
+        if alive == 0:
+            return True
+        if alive in self._failed:
+            return False
+        self.node_num += 1
+        if self.node_num > self.max_node_num or (self.node_num % 1024 == 0 and time.time() > self._deadline):
+            raise _BudgetExceeded
+        for i in self._moves(alive, accessible):
+            icon, count = self.icon[i], self.bucket[self.icon[i]]
+            next_alive = alive ^ (1 << i)
+            next_accessible = accessible ^ (1 << i)
+            for j in self.under[i]:
+                if (next_alive >> j) & 1 and next_alive & self.over[j] == 0:
+                    next_accessible |= 1 << j
+            if count == 2:
+                next_bucket_num = bucket_num - 2
+            else:
+                next_bucket_num = bucket_num + 1
+                # the game is lost when the bucket is full, unless the scene is cleared at the same time
+                if next_bucket_num >= self.bucket_length and next_alive != 0:
+                    continue
+            self.bucket[icon] = (count + 1) % 3
+            actions.append(i)
+            if self._search(next_alive, next_accessible, next_bucket_num, actions):
+                return True
+            actions.pop()
+            self.bucket[icon] = count
+        self._failed.add(alive)
+        return False
+
+    def solve(self) -> Dict:
+        # return the status (solved, unsolvable or budget_exceeded), the actions (item ids) of the clearing sequence
+        # if solved, the number of expanded states and the time
+        self._failed = set()
+        self._deadline = time.time() + self.max_seconds
+        self.node_num = 0
+        actions = []
+        t_start = time.time()
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(recursion_limit, 4 * self.item_num + 100))
+        bucket = list(self.bucket)
+        try:
+            solved = self._search(self.alive, self._accessible(self.alive), sum(self.bucket), actions)
+            status = SOLVED if solved else UNSOLVABLE
+        except _BudgetExceeded:
+            status = BUDGET_EXCEEDED
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+            self.bucket = bucket
+        return {
+            'status': status,
+            'actions': actions if status == SOLVED else [],
+            'node_num': self.node_num,
+            'time': time.time() - t_start,
+        }
+
+
+def solve(env: SheepEnv, max_node_num: int = 10 ** 6, max_seconds: float = 10.) -> Dict:
+    return SheepSolver(env, max_node_num, max_seconds).solve()
+
+
+def make_demonstration(env: SheepEnv, max_node_num: int = 10 ** 6, max_seconds: float = 10.) -> Optional[List[Dict]]:
+    # solve the current game of env and replay the solution in it, return the (obs, action) of each step for
+    # pretraining, None if it is not solved within the budget
+    obs = env._get_obs()
+    result = solve(env, max_node_num, max_seconds)
+    if result['status'] != SOLVED:
+        return None
+    data = []
+    for action in result['actions']:
+        data.append({'obs': {k: v.copy() for k, v in obs.items()}, 'action': action})
+        obs, _, done, _ = env.step(action)
+    assert done and env.cur_item_num == 0
+    return data
@@ -0,0 +1,32 @@
+from typing import List, Optional, Tuple
+import re
+from sheep_env import SheepEnv
+
+# the command line and environment variable formats shared by the servers and the tools
+
+
+def parse_levels(levels: str) -> List[int]:
+    # e.g.: 1-10 or 1,5,10
+    result = []
+    for part in levels.split(','):
+        begin, _, end = part.partition('-')
+        result.extend(range(int(begin), int(end or begin) + 1))
+    assert all([1 <= level <= SheepEnv.max_level for level in result]), result
+    return result
+
+
+def parse_ckpt_spec(spec: str) -> List[Tuple[List[int], str, Optional[str], Optional[str]]]:
+    # the (levels, checkpoint path, item encoder type, dead item mode) of each entry of a spec, e.g.: ckpt_best.pth.tar
+    # (all the levels) or 1-9:ckpt_best.pth.tar::pack;10:ckpt_level10.pth.tar:MLP, the item encoder type and dead
+    # item mode which are not set are read from the checkpoint (see load_agent_model)
+    entries, covered = [], set()
+    for part in spec.split(';'):
+        fields = part.strip().split(':')
+        if not re.fullmatch(r'[\d,\-]+', fields[0]):
+            fields = ['1-{}'.format(SheepEnv.max_level)] + fields
+        fields += [''] * (4 - len(fields))
+        levels, path, encoder_type, dead_item = parse_levels(fields[0]), fields[1], fields[2], fields[3]
+        assert covered.isdisjoint(levels), 'levels {} are mapped to more than one checkpoint'.format(levels)
+        covered.update(levels)
+        entries.append((levels, path, encoder_type or None, dead_item or None))
+    return entries
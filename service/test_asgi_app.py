@@ -0,0 +1,71 @@
+import pytest
+import asyncio
+import json
+from sheep_protocol import decode_binary
+import asgi_app
+
+
+async def play(query_string=b'', step_num=5):
+    # a fake WebSocket client of the ASGI app
+    receive_queue, send_queue = asyncio.Queue(), asyncio.Queue()
+    scope = {'type': 'websocket', 'query_string': query_string, 'client': ('127.0.0.1', 1234)}
+    task = asyncio.create_task(asgi_app.app(scope, receive_queue.get, send_queue.put))
+    await receive_queue.put({'type': 'websocket.connect'})
+    assert (await send_queue.get())['type'] == 'websocket.accept'
+
+    async def request(cmd, arg):
+        text = json.dumps({'command': cmd, 'argument': arg, 'version': 2})
+        await receive_queue.put({'type': 'websocket.receive', 'text': text})
+        message = await send_queue.get()
+        if 'bytes' in message:
+            return decode_binary(message['bytes'])
+        response = json.loads(message['text'])
+        assert response['statusCode'] == 200, response
+        return response['result']
+
+    results = [await request('reset', 2)]
+    scene = results[0]['scene']
+    for _ in range(step_num):
+        action = [item['uid'] for item in scene if item['accessible']][0]
+        results.append(await request('step', action))
+        changed = {item['uid']: item for item in results[-1]['changed']}
+        scene = [dict(item, **changed.get(item['uid'], {})) for item in scene if item['uid'] != action]
+    assert len(asgi_app.service) > 0
+    await receive_queue.put({'type': 'websocket.disconnect'})
+    await task
+    return results
+
+
+async def play_all():
+    return await asyncio.gather(play(), play(b'binary=1'), play())
+
+
+@pytest.mark.unittest
+def test_websocket():
+    results = asyncio.run(play_all())
+    assert all([len(r) == 6 for r in results])
+    # the binary results decode to the same structure as the json ones
+    assert set(results[0][1].keys()) == set(results[1][1].keys())
+    # the sessions are closed with the connections
+    assert len(asgi_app.service) == 0
+
+
+@pytest.mark.unittest
+def test_metrics():
+    asyncio.run(play())
+
+    async def get(path):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await asgi_app.app({'type': 'http', 'path': path}, None, send)
+        return messages
+
+    start, body = asyncio.run(get('/metrics'))
+    assert start['status'] == 200
+    text = body['body'].decode()
+    assert 'sheep_requests_total{command="step",status_code="200"}' in text
+    assert 'sheep_phase_seconds_bucket{phase="env_step",le="+Inf"}' in text
+    assert asyncio.run(get('/'))[0]['status'] == 404
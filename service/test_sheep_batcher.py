@@ -0,0 +1,24 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from sheep_env import SheepEnv
+from sheep_model import SheepModel
+from sheep_batcher import BatchedPolicy
+
+
+@pytest.mark.unittest
+def test_batched_policy():
+    model = SheepModel(item_obs_size=80, item_num=30, global_obs_size=19)
+    env = SheepEnv(1, agent=True, max_padding=True)
+    env.seed(0)
+    # two levels, i.e.: two item numbers, in the same batches
+    obs_list = [env.reset(i % 2 + 1) for i in range(32)]
+    expected = [model.compute_action(obs) for obs in obs_list]
+    policy = BatchedPolicy(model, max_batch_size=8, max_wait_ms=20)
+    try:
+        with ThreadPoolExecutor(16) as executor:
+            actions = list(executor.map(policy, obs_list))
+        assert actions == expected
+        assert policy.obs_num == 32
+        assert policy.batch_num < 32
+    finally:
+        policy.close()
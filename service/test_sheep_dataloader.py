@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from sheep_dataloader import StreamingDataLoader, record_tasks, solve_tasks, task_steps
+from sheep_env import SheepEnv
+from sheep_recorder import Episode, TrajectoryRecorder, TrajectoryDataset, RESULT_WIN, RESULT_LOSE
+
+
+def record_games(path, game_num):
+    recorder = TrajectoryRecorder(path, flush_interval=0.05)
+    episode = Episode(agent=True)
+    for i in range(game_num):
+        level = i % 3 + 1
+        env = SheepEnv(level, agent=True, max_padding=True)
+        env.seed(i)
+        obs, done = env.reset(), False
+        episode.start(i, level)
+        while not done:
+            action = int(np.flatnonzero(obs['action_mask'])[0])
+            obs, rew, done, _ = env.step(action)
+            episode.actions.append(action)
+            episode.rewards.append(rew)
+        recorder.record(episode, RESULT_WIN if env.cur_item_num == 0 else RESULT_LOSE)
+    recorder.close()
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('worker_num', [0, 2])
+def test_record(tmp_path, worker_num):
+    record_games(str(tmp_path), 12)
+    tasks = record_tasks(str(tmp_path), chunk_size=5)
+    assert len(tasks) == 3
+    # the steps of the games, regenerated from the records
+    steps = [s for task in tasks for s in task_steps(task)]
+    env = SheepEnv(1, agent=True, max_padding=True)
+    env.seed(0)
+    np.testing.assert_array_equal(steps[0][1]['item_obs'], env.reset()['item_obs'])
+
+    loader = StreamingDataLoader(tasks, batch_size=16, worker_num=worker_num, prefetch_num=2, shuffle_size=32)
+    for _ in range(2):
+        batches = list(loader)
+        assert all([len(b['action']) <= 16 for b in batches])
+        assert sum([len(b['action']) for b in batches]) == len(steps)
+        for b in batches:
+            # the steps of a batch are of the same level
+            assert b['item_obs'].shape[:2] == b['action_mask'].shape
+            assert (b['action_mask'][np.arange(len(b['action'])), b['action']] == 1).all()
+        # the same (obs, action) pairs, in another order
+        expected = sorted([(obs['global_obs'].tobytes(), action) for _, obs, action in steps])
+        actual = sorted([(g.tobytes(), a) for b in batches for g, a in zip(b['global_obs'], b['action'].tolist())])
+        assert actual == expected
+
+    # only the won games
+    win_tasks = record_tasks(str(tmp_path), 1, results=[RESULT_WIN])
+    win_num = sum([r['result'] == RESULT_WIN for r in TrajectoryDataset(str(tmp_path)).episodes()])
+    assert sum([len(list(task_steps(task))) > 0 for task in win_tasks]) == win_num
+
+
+@pytest.mark.unittest
+def test_solve():
+    tasks = solve_tasks([1, 2], 4, chunk_size=3)
+    assert len(tasks) == 4
+    loader = StreamingDataLoader(tasks, batch_size=32, worker_num=2)
+    batches = list(loader)
+    level_item_num = {SheepEnv(level).total_item_num for level in [1, 2]}
+    assert {b['item_obs'].shape[1] for b in batches} == level_item_num
+    # all the games of these levels are solved, each step clears an item
+    assert sum([len(b['action']) for b in batches]) == 4 * sum(level_item_num)
+
+
+@pytest.mark.unittest
+def test_worker_error(tmp_path):
+    loader = StreamingDataLoader([('record', str(tmp_path), 0, 0, 1, None)], worker_num=1)
+    with pytest.raises(RuntimeError):
+        list(loader)
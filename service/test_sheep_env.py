@@ -1,6 +1,6 @@
 import pytest
 import numpy as np
-from sheep_env import SheepEnv
+from sheep_env import SheepEnv, BatchedSheepEnv, ITEM_INDEX_SLOT_NUM
 
 
 @pytest.mark.unittest
@@ -21,3 +21,199 @@ def test_naive():
         assert isinstance(info, dict)
         if done:
             break
+
+
+def naive_visible_accessible(scene, agent):
+    # full rescan of every pair of items, the reference of the incremental cover graph
+    result = []
+    for i, item1 in enumerate(scene):
+        if item1 is None:
+            result.append(None)
+            continue
+        accessible, flag = 1, np.zeros((2, 2), dtype=np.int64)
+        for item2 in scene[i + 1:]:
+            if item2 is None:
+                continue
+            if not (item2.x + 100 <= item1.x or item2.x >= item1.x + 100 or item2.y + 100 <= item1.y
+                    or item2.y >= item1.y + 100):
+                accessible = 0
+                core_x, core_y = item1.x + 25, item1.y + 25
+                min_x, max_x = max(core_x, item2.x), min(core_x + 50, item2.x + 100)
+                min_y, max_y = max(core_y, item2.y), min(core_y + 50, item2.y + 100)
+                if min_x < max_x or min_y < max_y:
+                    qx = slice((min_x - core_x) // 25, (max_x - core_x) // 25)
+                    qy = slice((min_y - core_y) // 25, (max_y - core_y) // 25)
+                    flag[qx, qy] = 1
+        visible = int(flag.sum() < 4) if agent else 1
+        result.append((accessible, visible))
+    return result
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('agent', [True, False])
+def test_visible_accessible(agent):
+    for level in [1, 5, 9, 10]:
+        env = SheepEnv(level=level, agent=agent)
+        env.seed(level)
+        obs = env.reset()
+        done = False
+        while not done:
+            state = [None if item is None else (item.accessible, item.visible) for item in env.scene]
+            assert state == naive_visible_accessible(env.scene, agent)
+            action_mask = obs['action_mask']
+            action = np.random.choice(len(action_mask), p=action_mask / action_mask.sum())
+            obs, rew, done, info = env.step(action)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('level', [1, 9, 10])
+def test_batched(level):
+    env_num, seed = 4, 0
+    batched_env = BatchedSheepEnv(env_num, level, max_padding=True)
+    batched_env.seed(seed)
+    batched_obs = batched_env.reset()
+    envs = [SheepEnv(level, max_padding=True) for _ in range(env_num)]
+    obs = []
+    for i, env in enumerate(envs):
+        env.seed(seed + i)  # both draw the games from the same seeded random streams
+        obs.append(env.reset())
+
+    done = np.zeros(env_num, dtype=bool)
+    while not done.all():
+        for i in np.flatnonzero(~done):
+            for k, v in obs[i].items():
+                assert v.shape == envs[i].observation_space[k].shape
+                assert (batched_obs[k][i] == v).all(), k
+        actions = []
+        for o in obs:
+            action_mask = o['action_mask']
+            actions.append(np.random.choice(len(action_mask), p=action_mask / action_mask.sum()))
+        batched_obs, batched_rew, batched_done, batched_info = batched_env.step(actions)
+        for i in np.flatnonzero(~done):
+            obs[i], rew, done_i, _ = envs[i].step(actions[i])
+            assert rew == batched_rew[i]
+            assert done_i == batched_done[i]
+            if done_i:
+                for k, v in obs[i].items():
+                    assert (batched_info[i]['final_obs'][k] == v).all(), k
+                done[i] = True
+        # finished games are restarted by the batched env and keep being stepped there
+        for i in np.flatnonzero(done):
+            obs[i] = {k: v[i] for k, v in batched_obs.items()}
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('obs_dtype', [np.float32, np.uint8])
+def test_obs_buffer(obs_dtype):
+    env = SheepEnv(level=10, max_padding=True)
+    buffer_env = SheepEnv(level=10, max_padding=True, obs_dtype=obs_dtype)
+    env.seed(0)
+    obs = env.reset()
+    buffer_env.seed(0)
+    buffer_obs = buffer_env.reset()
+    # switch to a caller-provided buffer in the middle of the game
+    shared_buffer = {k: np.ones(space.shape, obs_dtype) for k, space in env.observation_space.spaces.items()}
+    step = 0
+    while True:
+        for k, v in obs.items():
+            assert buffer_obs[k].dtype == obs_dtype
+            assert (buffer_obs[k] == v).all(), k
+        if step == 5:
+            buffer_env.set_obs_buffer(shared_buffer)
+        elif step > 5:
+            assert all([buffer_obs[k] is shared_buffer[k] for k in shared_buffer])
+        action_mask = obs['action_mask']
+        action = np.random.choice(len(action_mask), p=action_mask / action_mask.sum())
+        obs, rew, done, info = env.step(action)
+        buffer_obs, _, _, _ = buffer_env.step(action)
+        step += 1
+        if done:
+            break
+
+
+def densify(item_index, item_size):
+    # the one-hot item_obs of the sparse one, the pad index is dropped
+    item_obs = np.zeros(item_index.shape[:-1] + (item_size + 1, ), dtype=np.float32)
+    np.put_along_axis(item_obs, item_index.astype(np.int64), 1, axis=-1)
+    return item_obs[..., :item_size]
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('obs_dtype', [None, np.float32])
+def test_sparse_obs(obs_dtype):
+    env = SheepEnv(level=10, max_padding=True)
+    sparse_env = SheepEnv(level=10, max_padding=True, obs_dtype=obs_dtype, sparse_obs=True)
+    batched_env = BatchedSheepEnv(1, level=10, max_padding=True, sparse_obs=True)
+    assert sparse_env.observation_space['item_obs'].shape == (env.total_item_num, ITEM_INDEX_SLOT_NUM)
+    for e in [env, sparse_env, batched_env]:
+        e.seed(0)
+    obs, sparse_obs, batched_obs = env.reset(), sparse_env.reset(), batched_env.reset()
+    done = False
+    while not done:
+        assert sparse_obs['item_obs'].dtype == np.uint8
+        np.testing.assert_array_equal(densify(sparse_obs['item_obs'], env.item_size), obs['item_obs'])
+        np.testing.assert_array_equal(batched_obs['item_obs'][0], sparse_obs['item_obs'])
+        for k in ['bucket_obs', 'global_obs', 'action_mask']:
+            assert (sparse_obs[k] == obs[k]).all(), k
+        action = int(np.random.choice(np.flatnonzero(obs['action_mask'])))
+        obs, _, done, _ = env.step(action)
+        sparse_obs, _, _, _ = sparse_env.step(action)
+        batched_obs, _, _, _ = batched_env.step([action])
+
+
+@pytest.mark.unittest
+def test_seed():
+    # the games of an env only depend on its own seed, not on the other envs or the global random state
+    def play(env, other_env=None):
+        env.seed(3)
+        history = []
+        for level in [1, 5, 10, 10]:
+            obs = env.reset(level)
+            if other_env is not None:
+                other_env.reset()
+                np.random.seed(len(history))
+            history.append((env.icon.copy(), env.x.copy(), env.y.copy(), obs['item_obs'].copy()))
+        return history
+
+    history = play(SheepEnv(1))
+    other_history = play(SheepEnv(1), SheepEnv(10))
+    for a, b in zip(history, other_history):
+        assert all([(u == v).all() for u, v in zip(a, b)])
+    assert not (history[2][1] == history[3][1]).all()
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('level', [1, 10])
+def test_state(level):
+    env = SheepEnv(level, max_padding=True, obs_dtype=np.float32)
+    env.seed(0)
+    obs = env.reset()
+    history = []
+    done = False
+    while not done:
+        history.append((env.get_state(), {k: v.copy() for k, v in obs.items()}))
+        assert len(history[-1][0]) == env.state_size
+        obs, _, done, _ = env.step(int(np.flatnonzero(obs['action_mask'])[-1]))
+    # the game of the env is replaced by reset, keep it in a clone
+    env, next_obs = env.clone(), env.reset()['item_obs'].copy()
+
+    # restore each step of the game into the env itself and into a clone
+    clone = None
+    for state, obs in history[::-1]:
+        env.set_state(state)
+        env_obs = env._get_obs()
+        if clone is None:
+            clone = env.clone()
+        else:
+            clone.set_state(state)
+        for k, v in obs.items():
+            assert (env_obs[k] == v).all(), k
+            assert (clone._get_obs()[k] == v).all(), k
+        assert (env.get_state() == state).all()
+    # the random stream is restored too
+    assert (clone.reset()['item_obs'] == next_obs).all()
+    # the clone is independent of its env
+    env.set_state(history[0][0])
+    clone.set_state(history[0][0])
+    clone.step(int(np.flatnonzero(clone.alive & clone.accessible)[0]))
+    assert env.alive.all() and env.bucket.sum() == 0
@@ -0,0 +1,95 @@
+import pytest
+import numpy as np
+from easydict import EasyDict
+from ding.envs import create_env_manager, DingEnvWrapper
+from ding.envs.env_manager.base_env_manager import EnvState
+from sheep_env import SheepEnv
+from sheep_env_manager import BatchedSheepEnvManager, SheepSubprocessEnvManager
+
+
+@pytest.mark.unittest
+def test_naive():
+    env_num, episode_num = 4, 2
+    cfg = EasyDict(BatchedSheepEnvManager.default_config())
+    cfg.update(type='sheep_batched', episode_num=episode_num)
+    env_manager = create_env_manager(cfg, [lambda: SheepEnv(level=3) for _ in range(env_num)])
+    env_manager.seed(0)
+    env_manager.launch()
+
+    done_count = 0
+    while not env_manager.done:
+        obs = env_manager.ready_obs
+        actions = {i: np.random.choice(np.flatnonzero(o['action_mask'])) for i, o in obs.items()}
+        timesteps = env_manager.step(actions)
+        for env_id, timestep in timesteps.items():
+            assert set(timestep.obs.keys()) == set(['item_obs', 'bucket_obs', 'global_obs', 'action_mask'])
+            assert timestep.reward.shape == (1, )
+            if timestep.done:
+                assert 'eval_episode_return' in timestep.info
+                done_count += 1
+    assert done_count == env_num * episode_num
+    env_manager.close()
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('dynamic_seed', [False, True])
+def test_dynamic_seed(dynamic_seed):
+    env_num = 2
+    cfg = EasyDict(BatchedSheepEnvManager.default_config())
+    cfg.update(type='sheep_batched', episode_num=3)
+    env_manager = create_env_manager(cfg, [lambda: SheepEnv(level=3) for _ in range(env_num)])
+    env_manager.seed(0, dynamic_seed=dynamic_seed)
+    env_manager.launch()
+    # the first obs of each game of each env
+    first_obs = {i: [o['item_obs'].copy()] for i, o in env_manager.ready_obs.items()}
+    while not env_manager.done:
+        actions = {i: int(np.flatnonzero(o['action_mask'])[0]) for i, o in env_manager.ready_obs.items()}
+        for env_id, timestep in env_manager.step(actions).items():
+            if timestep.done and env_manager._env_states[env_id] != EnvState.DONE:
+                first_obs[env_id].append(env_manager.ready_obs[env_id]['item_obs'].copy())
+    env_manager.close()
+    for i in range(env_num):
+        assert len(first_obs[i]) == 3
+        # the same game again and again without dynamic_seed (e.g.: the evaluator), new games with it
+        same = [(first_obs[i][0] == o).all() for o in first_obs[i][1:]]
+        assert all(same) if not dynamic_seed else not any(same)
+    assert not (first_obs[0][0] == first_obs[1][0]).all()
+
+
+def play(env_manager, step_num=30):
+    env_manager.seed(0, dynamic_seed=False)
+    env_manager.launch()
+    # the obs of each env in order, which don't depend on the order the async manager gets them
+    history = {}
+    for _ in range(step_num):
+        obs = env_manager.ready_obs
+        actions = {i: int(np.flatnonzero(o['action_mask'])[0]) for i, o in obs.items()}
+        for i, o in obs.items():
+            history.setdefault(i, []).append({k: v.copy() for k, v in o.items()})
+        timesteps = env_manager.step(actions)
+        for timestep in timesteps.values():
+            for k, v in timestep.obs.items():
+                # the obs match observation_space exactly
+                assert v.dtype == np.float32 and v.shape == env_manager._env_ref.observation_space[k].shape, k
+    env_manager.close()
+    return history
+
+
+@pytest.mark.unittest
+def test_shared_memory():
+    env_num = 2
+    env_fn = [lambda: DingEnvWrapper(SheepEnv(level=10, max_padding=True)) for _ in range(env_num)]
+    histories = []
+    for manager_type in ['subprocess', 'sheep_subprocess']:
+        cfg = EasyDict(SheepSubprocessEnvManager.default_config())
+        cfg.update(type=manager_type)
+        histories.append(play(create_env_manager(cfg, env_fn)))
+    # the obs written in place by the envs are the same as the ones copied into the shared memory
+    history, in_place_history = histories
+    assert history.keys() == in_place_history.keys()
+    for i in history:
+        step_num = min(len(history[i]), len(in_place_history[i]))
+        assert step_num > 5
+        for obs, in_place_obs in zip(history[i][:step_num], in_place_history[i][:step_num]):
+            for k, v in obs.items():
+                assert (in_place_obs[k] == v).all(), k
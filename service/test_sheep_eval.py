@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from sheep_env import SheepEnv
+from sheep_eval import evaluate, play, wilson_interval
+from sheep_utils import parse_levels
+
+
+@pytest.mark.unittest
+def test_play():
+    result = play((2, 5, 9))
+    np.testing.assert_array_equal(result['seed'], np.arange(5, 9))
+    assert result['win'].shape == result['return'].shape == result['length'].shape == (4, )
+    assert (result['length'] > 0).all()
+    # the game of each episode is the one of the seeded SheepEnv
+    env = SheepEnv(2, agent=True, max_padding=True)
+    env.seed(5)
+    env.reset()
+    assert result['length'][0] <= env.total_item_num
+
+
+@pytest.mark.unittest
+def test_evaluate():
+    summary = evaluate(None, [1, 2], episode_num=10, worker_num=0, batch_size=4)
+    assert list(summary.keys()) == [1, 2]
+    for s in summary.values():
+        assert s['episode_num'] == 10
+        assert s['win_rate_low'] <= s['win_rate'] <= s['win_rate_high']
+        assert s['return_low'] <= s['return'] <= s['return_high']
+    # the results do not depend on the worker and batch sizes
+    assert evaluate(None, [1, 2], episode_num=10, worker_num=2, batch_size=3) == summary
+
+
+@pytest.mark.unittest
+def test_utils():
+    assert parse_levels('1-3,5') == [1, 2, 3, 5]
+    assert wilson_interval(0, 100)[0] == 0.
+    low, high = wilson_interval(50, 100)
+    assert low < 0.5 < high
+
+
+@pytest.mark.unittest
+def test_evaluate_ckpt_spec(tmp_path):
+    import torch
+    from sheep_model import SheepModel
+    # a checkpoint for each level, the second one with the options saved in it
+    for name, item_encoder_type in [('a', 'TF'), ('b', 'MLP')]:
+        model = SheepModel(item_obs_size=80, item_num=30, item_encoder_type=item_encoder_type, global_obs_size=19)
+        ckpt = {'model': model.state_dict()}
+        if name == 'b':
+            ckpt.update(item_encoder_type=item_encoder_type, dead_item='keep')
+        torch.save(ckpt, str(tmp_path / name))
+    spec = '1:{}::pack;2:{}'.format(tmp_path / 'a', tmp_path / 'b')
+    summary = evaluate(spec, [1, 2], episode_num=4, worker_num=0, batch_size=2)
+    assert all([s['episode_num'] == 4 for s in summary.values()])
+    with pytest.raises(AssertionError):
+        evaluate(spec, [1, 3], episode_num=4, worker_num=0)
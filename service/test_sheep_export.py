@@ -0,0 +1,73 @@
+import pytest
+import numpy as np
+import torch
+from sheep_env import SheepEnv
+from sheep_model import SheepModel
+from sheep_export import SheepActor, export_actor, plain_linear, example_inputs
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('item_encoder_type', ['TF', 'MLP', 'two_stage_MLP'])
+def test_export(tmp_path, item_encoder_type):
+    item_num = 60 if item_encoder_type == 'two_stage_MLP' else 30
+    model = SheepModel(item_obs_size=80, item_num=item_num, item_encoder_type=item_encoder_type, global_obs_size=19)
+    example_level = 9 if item_encoder_type == 'two_stage_MLP' else 1
+    actor = export_actor(model, str(tmp_path / 'actor.pt'), 'torchscript', example_level)
+    quantized_actor = export_actor(model, str(tmp_path / 'actor_int8.pt'), 'torchscript_int8', example_level)
+    env = SheepEnv(1, agent=True, max_padding=True)
+    env.seed(0)
+    # the item number of the traced graph is dynamic (except for two_stage_MLP, whose item number is fixed)
+    levels = [9, 9] if item_encoder_type == 'two_stage_MLP' else [1, 3, 9]
+    same_num, total_num = 0, 0
+    for level in levels:
+        obs, done = env.reset(level), False
+        while not done:
+            action = model.compute_action(obs)
+            assert actor.compute_action(obs) == action
+            same_num += quantized_actor.compute_action(obs) == action
+            total_num += 1
+            obs, _, done, _ = env.step(int(np.random.choice(np.flatnonzero(obs['action_mask']))))
+    assert same_num / total_num > 0.8
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('backend', ['onnx', 'onnx_int8'])
+def test_export_onnx(tmp_path, backend):
+    pytest.importorskip('onnxruntime')
+    model = SheepModel(item_obs_size=80, item_num=30, global_obs_size=19)
+    actor = export_actor(model, str(tmp_path / 'actor.onnx'), backend)
+    env = SheepEnv(1, agent=True, max_padding=True)
+    env.seed(0)
+    same_num, total_num = 0, 0
+    for level in [1, 3]:
+        obs, done = env.reset(level), False
+        while not done:
+            action = model.compute_action(obs)
+            same_num += actor.compute_action(obs) == action
+            total_num += 1
+            obs, _, done, _ = env.step(int(np.random.choice(np.flatnonzero(obs['action_mask']))))
+    assert same_num / total_num > (0.99 if backend == 'onnx' else 0.8)
+
+
+@pytest.mark.unittest
+def test_export_atomic(tmp_path):
+    # the exported file is moved in place, no temporary file is left
+    model = SheepModel(item_obs_size=80, item_num=30, global_obs_size=19)
+    for _ in range(2):
+        export_actor(model, str(tmp_path / 'actor.pt'), 'torchscript')
+    assert [p.name for p in tmp_path.iterdir()] == ['actor.pt']
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('item_encoder_type', ['TF', 'MLP'])
+def test_plain_linear(item_encoder_type):
+    model = SheepModel(item_obs_size=80, item_num=30, item_encoder_type=item_encoder_type, global_obs_size=19)
+    actor = SheepActor(plain_linear(model)).eval()
+    inputs = example_inputs()
+    with torch.no_grad():
+        assert torch.allclose(actor(*inputs), SheepActor(model)(*inputs))
+    # the first layers of the item encoders are quantized too
+    quantized = torch.ao.quantization.quantize_dynamic(actor, {torch.nn.Linear}, dtype=torch.qint8)
+    encoder = quantized.model.item_encoder.encoder
+    first_layer = encoder.embedding[0] if item_encoder_type == 'TF' else encoder[0]
+    assert not isinstance(first_layer, torch.nn.Linear), type(first_layer)
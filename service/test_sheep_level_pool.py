@@ -0,0 +1,105 @@
+import pytest
+from threading import Thread
+import numpy as np
+from sheep_env import SheepEnv, BatchedSheepEnv
+from sheep_level_pool import LevelPool
+
+
+def play(env, level, seed, step_num=20):
+    env.seed(seed)
+    obs_list = [env.reset(level)]
+    for _ in range(step_num):
+        obs, _, done, _ = env.step(int(np.flatnonzero(obs_list[-1]['action_mask'])[0]))
+        obs_list.append(obs)
+        if done:
+            break
+    return env.scene_id, obs_list
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('agent', [True, False])
+def test_level_pool(tmp_path, agent):
+    pool = LevelPool(size=8, seed=1)
+    env = SheepEnv(1, agent=agent, level_pool=pool)
+    plain_env = SheepEnv(1, agent=agent)
+    for level in [1, 5, 10]:
+        env.reset(level)
+        # the same game as generating the pooled layout from scratch
+        plain_env.reset(level)
+        plain_env.icon, plain_env.x, plain_env.y = env.icon.copy(), env.x.copy(), env.y.copy()
+        plain_env._make_cover_graph()
+        plain_env._update_visible_accessible()
+        for _ in range(20):
+            obs, plain_obs = env._get_obs(), plain_env._get_obs()
+            for k in obs:
+                assert (obs[k] == plain_obs[k]).all(), k
+            action = int(np.flatnonzero(obs['action_mask'])[0])
+            done = env.step(action)[2]
+            assert plain_env.step(action)[2] == done
+            if done:
+                break
+        scene = pool.scene(level, env.scene_id)
+        assert (scene['x'] == env.x).all() and (scene['icon'] == env.icon).all()
+
+    # reproducible with the env seed, and the same with the memory mapped pool
+    scene_id, obs_list = play(env, 5, 0)
+    disk_pool = LevelPool(8, 1, str(tmp_path))
+    for other_env in [SheepEnv(1, agent=agent, level_pool=pool), SheepEnv(1, agent=agent, level_pool=disk_pool)]:
+        other_scene_id, other_obs_list = play(other_env, 5, 0)
+        assert scene_id == other_scene_id and len(obs_list) == len(other_obs_list)
+        for obs, other_obs in zip(obs_list, other_obs_list):
+            assert all([(obs[k] == other_obs[k]).all() for k in obs])
+    assert isinstance(disk_pool.block(5)['x'], np.memmap)
+
+
+@pytest.mark.unittest
+def test_refill():
+    pool = LevelPool(size=4, refill_interval=4)
+    env = SheepEnv(3, level_pool=pool)
+    scene_ids = set()
+    for _ in range(200):
+        env.reset()
+        scene_ids.add(env.scene_id)
+    assert max(scene_ids) >= 4
+
+
+@pytest.mark.unittest
+def test_batched_level_pool():
+    # the batched env copies the same pool scenes as the single envs with the same seeds
+    pool = LevelPool(8, seed=0)
+    batched_env = BatchedSheepEnv(3, 2, max_padding=True, auto_reset=False, level_pool=pool)
+    batched_env.seed(5)
+    batched_obs = batched_env.reset()
+    for i in range(3):
+        scene_id, obs_list = play(SheepEnv(2, max_padding=True, level_pool=pool), 2, 5 + i, step_num=0)
+        for k, v in obs_list[0].items():
+            assert (batched_obs[k][i] == v).all(), k
+    # the steps use the copied cover graph
+    env = SheepEnv(2, max_padding=True, level_pool=pool)
+    env.seed(5)
+    obs = env.reset()
+    for _ in range(20):
+        action = int(np.flatnonzero(obs['action_mask'])[0])
+        obs, rew, done, _ = env.step(action)
+        batched_obs, batched_rew, batched_done, _ = batched_env.step(np.array([action]), [0])
+        for k, v in obs.items():
+            assert (batched_obs[k][0] == v).all(), k
+        assert rew == batched_rew[0] and done == batched_done[0]
+        if done:
+            break
+
+
+@pytest.mark.unittest
+def test_concurrent_writers(tmp_path):
+    # the pools of several processes (here threads) writing the same cold block at once
+    pools = [LevelPool(8, 1, str(tmp_path)) for _ in range(4)]
+    threads = [Thread(target=pool.block, args=(3, )) for pool in pools]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    block = LevelPool(8, 1, str(tmp_path)).block(3)
+    expected = LevelPool(8, 1).block(3)
+    for k, v in expected.items():
+        assert (block[k] == v).all(), k
+    assert sorted(p.name for p in (tmp_path / 'level3_seed1_size8').iterdir()) == sorted(k + '.npy' for k in expected)
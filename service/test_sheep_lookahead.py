@@ -0,0 +1,42 @@
+import pytest
+import numpy as np
+from sheep_env import SheepEnv
+from sheep_lookahead import LookaheadPolicy
+from sheep_service import SheepService
+
+
+@pytest.mark.unittest
+def test_lookahead_policy():
+    policy = LookaheadPolicy(rollout_num=4, time_budget_ms=None, seed=0)
+    env = SheepEnv(5, agent=True, max_padding=True)
+    env.seed(0)
+    obs = env.reset()
+    state = env.get_state()
+    values = policy.evaluate(env)
+    # the game of env is not changed by the rollouts
+    assert (env.get_state() == state).all()
+    assert set(values.keys()) == set(np.flatnonzero(obs['action_mask']).tolist())
+    assert policy.rollout_count == 4 * len(values)
+
+    done = False
+    while not done:
+        action = policy(obs, env)
+        assert obs['action_mask'][action] == 1
+        obs, _, done, _ = env.step(action)
+    assert env.cur_item_num == 0
+
+    # the time budget bounds the rollouts
+    policy = LookaheadPolicy(rollout_num=1000, time_budget_ms=0, seed=0)
+    env.reset()
+    policy(env._get_obs(), env)
+    assert policy.rollout_count <= 1
+
+
+@pytest.mark.unittest
+def test_lookahead_service():
+    service = SheepService(agent=True, policy=LookaheadPolicy(rollout_num=2, time_budget_ms=10))
+    status_code, _, result = service.execute('a', 'reset', 3)
+    assert status_code == 200
+    for _ in range(3):
+        status_code, _, result = service.execute('a', 'step', result['action'])
+        assert status_code == 200
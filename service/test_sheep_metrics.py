@@ -0,0 +1,37 @@
+import pytest
+from sheep_metrics import MetricsRegistry, merge, render, value_family
+
+
+@pytest.mark.unittest
+def test_metrics():
+    registry = MetricsRegistry()
+    counter = registry.counter('requests_total', 'Requests.', ('command', ))
+    gauge = registry.gauge('live', 'Live.')
+    histogram = registry.histogram('latency_seconds', 'Latency.', ('phase', ), buckets=(0.1, 1.))
+    counter.inc('reset')
+    counter.inc('reset', value=2)
+    gauge.set(value=5)
+    for value in [0.05, 0.1, 0.5, 2.]:
+        histogram.observe('step', value=value)
+    with histogram.time('obs'):
+        pass
+
+    text = render(registry.collect() + [value_family('created_total', 'counter', 'Created.', 3)])
+    lines = text.splitlines()
+    assert '# TYPE latency_seconds histogram' in lines
+    assert 'requests_total{command="reset"} 3.0' in lines
+    assert 'live 5.0' in lines
+    assert 'created_total 3.0' in lines
+    # cumulative buckets, the bounds are inclusive
+    assert 'latency_seconds_bucket{phase="step",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{phase="step",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{phase="step",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{phase="step"} 2.65' in lines
+    assert 'latency_seconds_count{phase="obs"} 1' in lines
+
+    # e.g.: the shards of a server
+    merged = render(merge([registry.collect(), registry.collect()]))
+    assert 'requests_total{command="reset"} 6.0' in merged.splitlines()
+    assert 'latency_seconds_bucket{phase="step",le="+Inf"} 8' in merged.splitlines()
+    # the collected samples are not changed by merge
+    assert 'requests_total{command="reset"} 3.0' in render(registry.collect()).splitlines()
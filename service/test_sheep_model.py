@@ -1,6 +1,9 @@
 import pytest
+import numpy as np
 import torch
-from sheep_model import SheepModel
+from ding.torch_utils import to_tensor, unsqueeze
+from sheep_env import SheepEnv
+from sheep_model import SheepModel, IncrementalActor, compatible_state_dict, state_dict_item_num
 
 
 @pytest.mark.unittest
@@ -17,3 +20,110 @@ def test_naive():
     output = model.forward(data, mode='compute_actor_critic')
     assert output['logit'].shape == (B, M)
     assert output['value'].shape == (B, )
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('item_encoder_type', ['MLP', 'two_stage_MLP'])
+def test_incremental_actor(item_encoder_type):
+    env = SheepEnv(9, agent=True, max_padding=True, obs_dtype=np.float32)
+    env.seed(0)
+    obs = env.reset()
+    item_num = obs['item_obs'].shape[0]
+    model = SheepModel(item_obs_size=80, item_num=item_num, item_encoder_type=item_encoder_type, global_obs_size=19)
+    actor = IncrementalActor(model)
+    step_num = 0
+    for _ in range(2):
+        obs, done = env.reset(), False
+        while not done:
+            with torch.no_grad():
+                expected = model.compute_actor(unsqueeze(to_tensor(obs)))['logit']
+            logit = actor.compute_actor(obs)['logit']
+            assert torch.allclose(logit, expected, atol=1e-4)
+            step_num += 1
+            obs, _, done, _ = env.step(actor.compute_action(obs))
+    # only a few items are encoded again after each step
+    assert actor.encoded_item_num < step_num * item_num / 4
+
+
+@pytest.mark.unittest
+def test_dead_item():
+    env = SheepEnv(5, agent=True, max_padding=True)
+    env.seed(0)
+    obs_list = []
+    for _ in range(2):
+        obs, done = env.reset(), False
+        while not done:
+            obs_list.append(obs)
+            obs, _, done, _ = env.step(int(np.random.choice(np.flatnonzero(obs['action_mask']))))
+    # a batch of different live item numbers
+    x = to_tensor({k: np.stack([obs[k] for obs in obs_list]) for k in obs_list[0]})
+    alive = torch.as_tensor(np.stack([obs['item_obs'][:, env.L - 1] == 0 for obs in obs_list]))
+    mask_model = SheepModel(item_obs_size=80, item_num=x['item_obs'].shape[1], global_obs_size=19, dead_item='mask')
+    pack_model = SheepModel(item_obs_size=80, item_num=x['item_obs'].shape[1], global_obs_size=19, dead_item='pack')
+    pack_model.load_state_dict(mask_model.state_dict())
+    with torch.no_grad():
+        mask_embedding = mask_model.item_encoder(x['item_obs'])
+        pack_embedding = pack_model.item_encoder(x['item_obs'])
+        assert torch.allclose(mask_embedding, pack_embedding, atol=1e-5)
+        assert (pack_embedding[~alive] == 0).all()
+        mask_output = mask_model(x, 'compute_actor_critic')
+        pack_output = pack_model(x, 'compute_actor_critic')
+    for k in ['logit', 'value']:
+        assert torch.allclose(mask_output[k], pack_output[k], atol=1e-4)
+    assert (pack_output['logit'][~alive] == -1e9).all()
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    'item_encoder_type,dead_item', [('TF', 'keep'), ('TF', 'mask'), ('TF', 'pack'), ('MLP', 'keep'),
+                                    ('two_stage_MLP', 'keep')]
+)
+def test_sparse_obs(item_encoder_type, dead_item):
+    # the dense float, dense uint8 and sparse item_obs of the same games give the same outputs
+    envs = {
+        'float': SheepEnv(5, agent=True, max_padding=True),
+        'uint8': SheepEnv(5, agent=True, max_padding=True, obs_dtype=np.uint8),
+        'sparse': SheepEnv(5, agent=True, max_padding=True, sparse_obs=True),
+    }
+    obs_lists = {k: [] for k in envs}
+    for env in envs.values():
+        env.seed(0)
+    obs, done = {k: env.reset() for k, env in envs.items()}, False
+    while not done:
+        for k, o in obs.items():
+            # the obs buffers of obs_dtype are reused by the next steps
+            obs_lists[k].append({n: v.copy() for n, v in o.items()})
+        action = int(np.random.choice(np.flatnonzero(obs['float']['action_mask'])))
+        for k, env in envs.items():
+            obs[k], _, done, _ = env.step(action)
+    model = SheepModel(
+        item_obs_size=80,
+        item_num=envs['float'].total_item_num,
+        item_encoder_type=item_encoder_type,
+        global_obs_size=19,
+        dead_item=dead_item
+    )
+    outputs = {}
+    for k, obs_list in obs_lists.items():
+        x = to_tensor({n: np.stack([o[n] for o in obs_list]) for n in obs_list[0]})
+        with torch.no_grad():
+            outputs[k] = model(x, 'compute_actor_critic')
+    assert obs_lists['uint8'][0]['item_obs'].dtype == np.uint8
+    assert obs_lists['sparse'][0]['item_obs'].dtype == np.uint8
+    for k in ['uint8', 'sparse']:
+        for n in ['logit', 'value']:
+            assert torch.allclose(outputs['float'][n], outputs[k][n], atol=1e-4), (k, n)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('item_encoder_type', ['TF', 'MLP', 'two_stage_MLP'])
+def test_compatible_state_dict(item_encoder_type):
+    model = SheepModel(item_obs_size=80, item_num=60, item_encoder_type=item_encoder_type, global_obs_size=19)
+    state_dict = model.state_dict()
+    # the current keys are kept
+    assert compatible_state_dict(state_dict).keys() == state_dict.keys()
+    assert state_dict_item_num(state_dict) == (60 if item_encoder_type == 'two_stage_MLP' else None)
+    if item_encoder_type != 'two_stage_MLP':
+        # the v1/v2 keys, without the encoder level
+        legacy = {k.replace('item_encoder.encoder.', 'item_encoder.'): v for k, v in state_dict.items()}
+        assert compatible_state_dict(legacy).keys() == state_dict.keys()
@@ -0,0 +1,50 @@
+import pytest
+import json
+import numpy as np
+from sheep_env import SheepEnv
+from sheep_protocol import snapshot, reset_result, step_result, reset_binary, step_binary, decode_binary
+
+
+@pytest.mark.unittest
+def test_delta():
+    env = SheepEnv(level=5, agent=False)
+    env.reset()
+    # the client keeps the scene sent by reset and applies the following deltas to it
+    scene = {item['uid']: item for item in reset_result(env, version=2)['scene']}
+    bucket = []
+    assert len(json.dumps(reset_result(env, version=2))) < len(json.dumps(reset_result(env, version=1)))
+    while True:
+        action = int(np.random.choice(np.flatnonzero(env.alive & env.accessible)))
+        last_snapshot = snapshot(env)
+        _, _, done, _ = env.step(action)
+        delta = step_result(env, action, done, last_snapshot, version=2)
+        full = step_result(env, action, done, last_snapshot, version=1)
+        json.dumps(delta)
+        for uid in delta['removed']:
+            scene.pop(uid)
+        for item in delta['changed']:
+            scene[item['uid']].update(item)
+        bucket = [uid for uid in bucket if uid not in delta['bucket_removed']] + delta['bucket_added']
+        full_scene = [json.loads(item) for item in full['scene']]
+        assert sorted(scene.keys()) == sorted([item['uid'] for item in full_scene])
+        for item in full_scene:
+            assert all([item[k] == v for k, v in scene[item['uid']].items()])
+        assert bucket == [json.loads(item)['uid'] for item in full['bucket']]
+        if done:
+            break
+
+
+@pytest.mark.unittest
+def test_binary():
+    env = SheepEnv(level=10)
+    env.reset()
+    assert decode_binary(reset_binary(env)) == reset_result(env, version=2)
+    assert decode_binary(reset_binary(env, agent_action=3)) == dict(reset_result(env, version=2), action=3)
+    while True:
+        action = int(np.random.choice(np.flatnonzero(env.alive & env.accessible)))
+        last_snapshot = snapshot(env)
+        _, _, done, _ = env.step(action)
+        data = step_binary(env, action, done, last_snapshot)
+        assert decode_binary(data) == step_result(env, action, done, last_snapshot, version=2)
+        if done:
+            break
@@ -0,0 +1,86 @@
+from queue import Queue
+import numpy as np
+import pytest
+from sheep_recorder import Episode, TrajectoryRecorder, TrajectoryDataset, replay, RESULT_UNFINISHED, RESULT_WIN, \
+    RESULT_LOSE
+from sheep_service import SheepService
+
+
+def play(service, key, level, step_num):
+    service.execute(key, 'reset', level)
+    env = service.envs.get(key)[0]
+    for _ in range(step_num):
+        action = int(np.flatnonzero(env.alive & env.accessible)[0])
+        assert service.execute(key, 'step', action)[0] == 200
+        if env.cur_item_num == 0 or len(env.bucket_ids) >= env.bucket_length:
+            break
+
+
+@pytest.mark.unittest
+def test_recorder(tmp_path):
+    recorder = TrajectoryRecorder(str(tmp_path), flush_interval=0.05)
+    service = SheepService(max_env_num=2, recorder=recorder)
+    play(service, 'a', 1, 100)  # played until the end
+    play(service, 'b', 2, 3)
+    play(service, 'b', 3, 2)  # the unfinished level 2 game is recorded by this reset
+    service.execute('c', 'reset', 1)  # evicts a, which has no game in progress
+    play(service, 'b', 1, 0)  # the unfinished level 3 game is recorded, the reset and left game is not
+    service.remove('b')
+    recorder.close()
+    assert recorder.written_num == 3 and recorder.dropped_num == 0
+
+    dataset = TrajectoryDataset(str(tmp_path))
+    assert len(dataset) == 3
+    records = list(dataset.episodes())
+    assert [int(r['level']) for r in records] == [1, 2, 3]
+    assert records[0]['result'] in (RESULT_WIN, RESULT_LOSE)
+    assert [int(r['result']) for r in records[1:]] == [RESULT_UNFINISHED] * 2
+    assert [int(r['step_num']) for r in records[1:]] == [3, 2]
+    for record in records:
+        # actions and seed are enough to replay the game exactly
+        steps = list(replay(record, agent=False))
+        assert len(steps) == record['step_num']
+        assert [s[1] for s in steps] == record['actions'][:record['step_num']].tolist()
+        np.testing.assert_allclose([s[2] for s in steps], record['rewards'][:record['step_num']])
+        assert steps[-1][3] == (record['result'] != RESULT_UNFINISHED)
+
+
+@pytest.mark.unittest
+def test_shard(tmp_path):
+    episode = Episode()
+    recorder = TrajectoryRecorder(str(tmp_path), shard_size=4, flush_interval=0.05)
+    for i in range(10):
+        episode.start(i, 1)
+        episode.actions.append(i)
+        episode.rewards.append(0.)
+        recorder.record(episode, RESULT_UNFINISHED)
+        assert not episode.recording
+    recorder.close()
+    # appended to the last shard after a restart
+    recorder = TrajectoryRecorder(str(tmp_path), shard_size=4, flush_interval=0.05)
+    episode.start(10, 1)
+    episode.actions.append(10)
+    recorder.record(episode, RESULT_UNFINISHED)
+    episode.start(11, 1)  # empty, not recorded
+    recorder.record(episode, RESULT_UNFINISHED)
+    recorder.close()
+
+    dataset = TrajectoryDataset(str(tmp_path))
+    assert dataset.shard_sizes == [4, 4, 3]
+    assert [int(r['seed']) for r in dataset.episodes()] == list(range(11))
+    assert (tmp_path / 'shard_00002.bin').stat().st_size == 3 * dataset.shard(2).itemsize
+
+
+@pytest.mark.unittest
+def test_drop(tmp_path):
+    episode = Episode()
+    recorder = TrajectoryRecorder(str(tmp_path), max_queue_size=2, flush_interval=0.2)
+    # a full queue, as if the writer was stuck on the disk: the writer thread is waiting on the old queue
+    recorder._queue = Queue(2)
+    episode.start(0, 1)
+    episode.actions.append(0)
+    for _ in range(5):
+        recorder.record(episode, RESULT_UNFINISHED)
+    assert recorder.dropped_num == 3
+    recorder.close()
+    assert recorder.written_num == 2
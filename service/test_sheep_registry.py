@@ -0,0 +1,85 @@
+import os
+import pytest
+import torch
+from sheep_model import SheepModel, IncrementalActor
+from sheep_registry import ModelRegistry
+from sheep_utils import parse_ckpt_spec
+from sheep_service import SheepService, load_agent_model
+
+
+def save_ckpt(path, item_encoder_type='TF', version=1, options=None):
+    model = SheepModel(item_obs_size=80, item_num=30, item_encoder_type=item_encoder_type, global_obs_size=19)
+    tmp_path = path + '.tmp'
+    torch.save(dict(model=model.state_dict(), **(options or {})), tmp_path)
+    os.replace(tmp_path, path)
+    # a distinct modification time for each version, whatever the resolution of the file system
+    os.utime(path, ns=(version * 10 ** 9, version * 10 ** 9))
+
+
+@pytest.mark.unittest
+def test_parse_ckpt_spec():
+    assert parse_ckpt_spec('a.pth.tar') == [(list(range(1, 11)), 'a.pth.tar', None, None)]
+    assert parse_ckpt_spec('a.pth.tar::pack') == [(list(range(1, 11)), 'a.pth.tar', None, 'pack')]
+    assert parse_ckpt_spec('1-9:a.pth.tar;10:b.pth.tar:MLP') == [
+        (list(range(1, 10)), 'a.pth.tar', None, None), ([10], 'b.pth.tar', 'MLP', None)
+    ]
+    with pytest.raises(AssertionError):
+        parse_ckpt_spec('1-9:a.pth.tar;9-10:b.pth.tar')
+
+
+@pytest.mark.unittest
+def test_ckpt_options(tmp_path):
+    # the item encoder options saved in the checkpoint (e.g.: by sheep_bc_main.py), unless they are set
+    path = str(tmp_path / 'bc.pth.tar')
+    save_ckpt(path, 'MLP', options={'item_encoder_type': 'MLP', 'dead_item': 'mask'})
+    model = load_agent_model(path)
+    assert model.item_encoder.item_encoder_type == 'MLP' and model.item_encoder.dead_item == 'mask'
+    assert load_agent_model(path, dead_item='keep').item_encoder.dead_item == 'keep'
+    save_ckpt(path)
+    model = load_agent_model(path)
+    assert model.item_encoder.item_encoder_type == 'TF' and model.item_encoder.dead_item == 'keep'
+
+
+@pytest.mark.unittest
+def test_registry(tmp_path):
+    path_a, path_b = str(tmp_path / 'a.pth.tar'), str(tmp_path / 'b.pth.tar')
+    save_ckpt(path_a)
+    save_ckpt(path_b, 'MLP')
+    registry = ModelRegistry('1-9:{}::pack;10:{}:MLP'.format(path_a, path_b), batch_size=2)
+    assert registry.get(1) is registry.get(9)
+    assert registry.get(1).model.item_encoder.dead_item == 'pack'
+    assert registry.get(10).model.item_encoder.dead_item == 'keep'
+    assert registry.get(10).model.item_encoder.item_encoder_type == 'MLP'
+    assert isinstance(registry.get(10).policy_fn().__self__, IncrementalActor)
+
+    service = SheepService(agent=True, policy_fn=registry.session_policy)
+    for level in [1, 10]:
+        status_code, _, result = service.execute('a', 'reset', level)
+        assert status_code == 200
+        for _ in range(3):
+            status_code, _, result = service.execute('a', 'step', result['action'])
+            assert status_code == 200
+
+    # a swap while a request holds the old model, which is closed when it is released
+    old_entry = registry.acquire(1)
+    assert registry.poll() == 0
+    save_ckpt(path_a, version=2)
+    assert registry.poll() == 1
+    assert registry.get(1) is not old_entry and registry.get(9) is registry.get(1)
+    assert registry.get(10).version == (10 ** 9, os.stat(path_b).st_size)
+    assert old_entry.policy._thread.is_alive()
+    registry.release(old_entry)
+    assert not old_entry.policy._thread.is_alive()
+    status_code, _, result = service.execute('a', 'reset', 1)
+    assert status_code == 200 and 'action' in result
+
+    # a broken file is only tried once, the old model stays
+    with open(path_b, 'wb') as f:
+        f.write(b'broken')
+    entry = registry.get(10)
+    assert registry.poll() == 0 and registry.poll() == 0
+    assert registry.get(10) is entry
+    families = {f['name']: f for f in registry.collect_metrics()}
+    assert families['sheep_model_load_errors_total']['samples'][()] == 1
+    assert families['sheep_model_swaps_total']['samples'][()] == 1
+    registry.close()
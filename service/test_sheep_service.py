@@ -0,0 +1,89 @@
+import pytest
+from sheep_service import SheepService
+from sheep_shard import ShardedSheepService
+from sheep_protocol import decode_binary
+
+
+def play(service, key, step_num=5):
+    outputs = [service.execute(key, 'reset', 3, 2)]
+    scene = outputs[0][2]['scene']
+    for _ in range(step_num):
+        # always pick the first accessible item of the last known scene
+        action = [item['uid'] for item in scene if item['accessible']][0]
+        outputs.append(service.execute(key, 'step', action, 2))
+        changed = {item['uid']: item for item in outputs[-1][2]['changed']}
+        scene = [dict(item, **changed.get(item['uid'], {})) for item in scene if item['uid'] != action]
+    return outputs
+
+
+@pytest.mark.unittest
+def test_service():
+    service = SheepService(max_env_num=2)
+    assert service.execute('a', 'step', 0)[0] == 501
+    assert service.execute('a', 'reset', 1, version=3)[0] == 500
+    assert service.execute('a', 'jump', 1)[0] == 501
+    outputs = play(service, 'a')
+    assert all([o[0] == 200 for o in outputs])
+    assert service.execute('a', 'jump', 1) == (500, "Invalid command: jump", None)
+    result = service.execute('b', 'reset', 1, 2, binary=True)[2]
+    assert isinstance(result, bytes)
+    assert len(decode_binary(result)['scene']) > 0
+    assert len(service) == 2
+    service.execute('c', 'reset', 1)
+    assert len(service) == 2 and service.stats()['evicted_num'] == 1
+    lines = service.metrics_text().splitlines()
+    assert 'sheep_requests_total{command="step",status_code="200"} 5.0' in lines
+    assert 'sheep_requests_total{command="invalid",status_code="501"} 1.0' in lines
+    assert 'sheep_sessions_rejected_total 2.0' in lines
+    assert 'sheep_sessions_evicted_total 1.0' in lines
+    assert 'sheep_live_envs 2.0' in lines
+    for phase in ['session', 'env_reset', 'env_step', 'visibility', 'obs', 'serialize']:
+        assert 'sheep_phase_seconds_count{{phase="{}"}}'.format(phase) in ' '.join(lines)
+
+
+@pytest.mark.unittest
+def test_session_policy():
+    # each session gets its own policy from policy_fn
+    policies = []
+
+    def policy_fn():
+        history = []
+        policies.append(history)
+        return lambda obs: history.append(obs) or int(obs['action_mask'].argmax())
+
+    service = SheepService(agent=True, policy_fn=policy_fn)
+    for key in ['a', 'b', 'a']:
+        status_code, _, result = service.execute(key, 'reset', 1)
+        assert status_code == 200 and 'action' in result
+    service.execute('b', 'step', service.execute('b', 'reset', 1)[2]['action'])
+    assert [len(p) for p in policies] == [2, 3]
+
+
+@pytest.mark.unittest
+def test_sharded_service():
+    keys = ['a', 'b', 'c', 'd']
+    service = ShardedSheepService(2)
+    try:
+        assert len(set([service.shard_id(k) for k in keys])) == 2
+        assert service.execute('a', 'step', 0)[0] == 501
+        # the sessions stay on their own worker across the requests
+        for k in keys:
+            assert all([o[0] == 200 for o in play(service, k)])
+        assert len(service) == 4
+        stats = service.stats()
+        assert stats['session_num'] == 4 and stats['created_num'] == 4
+        lines = service.metrics_text().splitlines()
+        assert 'sheep_live_envs 4.0' in lines
+        assert 'sheep_requests_total{command="step",status_code="200"} 20.0' in lines
+    finally:
+        service.close()
+
+    # the session limit is per worker
+    service = ShardedSheepService(2, max_env_num=1)
+    try:
+        for k in keys:
+            assert service.execute(k, 'reset', 1)[0] == 200
+        stats = service.stats()
+        assert stats['session_num'] == 2 and stats['evicted_num'] == 2
+    finally:
+        service.close()
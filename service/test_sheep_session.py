@@ -0,0 +1,50 @@
+import pytest
+from sheep_session import SessionStore
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.t = 0.
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.mark.unittest
+def test_naive():
+    clock = FakeClock()
+    store = SessionStore(max_size=2, timeout=10, clock=clock)
+    store.put('a', 1)
+    clock.t = 1
+    store.put('b', 2)
+    clock.t = 2
+    assert store.get('a') == 1  # refresh a, so b is the least recently used one
+    store.put('c', 3)
+    assert 'b' not in store and store.get('c') == 3
+    assert store.stats() == {'session_num': 2, 'created_num': 3, 'evicted_num': 1, 'expired_num': 0}
+
+    clock.t = 5
+    assert store.get('c') == 3
+    clock.t = 12.5
+    assert store.get('a') is None  # last accessed at 2
+    assert store.get('c') == 3
+    clock.t = 30
+    assert len(store) == 1 and store.get('c') is None
+    assert store.stats() == {'session_num': 0, 'created_num': 3, 'evicted_num': 1, 'expired_num': 2}
+
+
+@pytest.mark.unittest
+def test_on_remove():
+    clock = FakeClock()
+    removed = []
+    store = SessionStore(max_size=2, timeout=10, clock=clock, on_remove=lambda k, v: removed.append((k, v)))
+    store.put('a', 1)
+    store.put('b', 2)
+    store.put('c', 3)
+    assert removed == [('a', 1)]  # evicted
+    assert store.pop('b') == 2
+    assert removed == [('a', 1)]  # popped by the caller
+    clock.t = 20
+    assert store.get('c') is None
+    assert removed == [('a', 1), ('c', 3)]  # expired
@@ -0,0 +1,55 @@
+import pytest
+import numpy as np
+from sheep_env import SheepEnv
+from sheep_solver import solve, make_demonstration, SOLVED, UNSOLVABLE, BUDGET_EXCEEDED
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('level', [1, 5, 9, 10])
+def test_solve(level):
+    env = SheepEnv(level)
+    for seed in range(3):
+        env.seed(seed)
+        obs = env.reset()
+        # also from the middle of a game
+        for _ in range(seed * 2):
+            obs, _, done, _ = env.step(int(np.flatnonzero(obs['action_mask'])[0]))
+            assert not done
+        result = solve(env)
+        assert result['status'] == SOLVED
+        assert result['node_num'] >= len(result['actions'])
+        # replay the solution
+        for i, action in enumerate(result['actions']):
+            assert obs['action_mask'][action] == 1
+            obs, rew, done, _ = env.step(action)
+            assert done == (i == len(result['actions']) - 1)
+        assert env.cur_item_num == 0
+
+
+@pytest.mark.unittest
+def test_unsolvable_and_budget():
+    # the bucket is full after the second item (no triple can be completed before)
+    env = SheepEnv(5, bucket_length=2)
+    env.seed(0)
+    env.reset()
+    result = solve(env)
+    assert result['status'] == UNSOLVABLE and result['actions'] == []
+
+    env = SheepEnv(10)
+    env.seed(0)
+    env.reset()
+    result = solve(env, max_node_num=10)
+    assert result['status'] == BUDGET_EXCEEDED and result['node_num'] > 10
+
+
+@pytest.mark.unittest
+def test_make_demonstration():
+    env = SheepEnv(3, agent=True, max_padding=True)
+    env.seed(0)
+    env.reset()
+    data = make_demonstration(env)
+    assert len(data) == env.total_item_num
+    for d in data:
+        assert set(d['obs'].keys()) == set(['item_obs', 'bucket_obs', 'global_obs', 'action_mask'])
+        assert d['obs']['action_mask'][d['action']] == 1
+    assert env.cur_item_num == 0
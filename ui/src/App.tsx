@@ -34,16 +34,28 @@ interface MySymbol {
 
 type Scene = MySymbol[];
 
+// item sent by the backend (protocol version 2)
+interface ItemData {
+    uid: number;
+    icon: number;
+    x: number;
+    y: number;
+    accessible: number;
+    visible: number;
+}
+
+type ItemFlagData = Pick<ItemData, 'uid' | 'accessible' | 'visible'>;
+
+const protocolVersion = 2;
+
 // 8*8 grid with factor 4 (32x32)
-const makeScene: (level: number, icons: Icon[], new_scene_data: string[], agent_action: number) => Scene = (level, icons, new_scene_data, agent_action) => {
+const makeScene: (level: number, icons: Icon[], new_scene_data: ItemData[], agent_action: number) => Scene = (level, icons, new_scene_data, agent_action) => {
     const curLevel = Math.min(maxLevel, level);
     const iconPool = icons.slice(0, 2 * curLevel);
 
     const scene: Scene = [];
 
-    for (const raw_data of new_scene_data) {
-        const data = JSON.parse(raw_data);
-
+    for (const data of new_scene_data) {
         const count = scene.length;
         scene.push({
             isCover: !data.accessible,
@@ -51,7 +63,7 @@ const makeScene: (level: number, icons: Icon[], new_scene_data: string[], agent_
             isAgentTarget: count === agent_action,
             status: 0,
             icon: iconPool[data.icon],
-            id: data.uid,
+            id: String(data.uid),
             x: data.x,
             y: data.y,
         });
@@ -169,10 +181,10 @@ const App: FC = () => {
         setSortedQueue(updateSortedQueue);
     }, [queue]);
 
-    const update = (new_scene_data: string[]) => {
-        for (const raw_data of new_scene_data) {
-            const data = JSON.parse(raw_data);
-            const find = scene.find((s) => s.id === data.uid);
+    // only the items whose flags changed in the last step are sent back
+    const update = (changed_data: ItemFlagData[]) => {
+        for (const data of changed_data) {
+            const find = scene.find((s) => s.id === String(data.uid));
             if (find) {
                 if (find.status === 0) {
                     find.isCover = !data.accessible;
@@ -214,7 +226,7 @@ const App: FC = () => {
               'Content-Type': 'application/json'
             },
             method: 'POST',
-            body: JSON.stringify({command: 'reset', argument: level + 1, uid: uidApp})
+            body: JSON.stringify({command: 'reset', argument: level + 1, uid: uidApp, version: protocolVersion})
           })
           .then(response => response.json())
           .then(response => {
@@ -240,7 +252,7 @@ const App: FC = () => {
               'Content-Type': 'application/json'
             },
             method: 'POST',
-            body: JSON.stringify({command: 'reset', argument: level, uid: uidApp})
+            body: JSON.stringify({command: 'reset', argument: level, uid: uidApp, version: protocolVersion})
           })
           .then(response => response.json())
           .then(response => {
@@ -290,13 +302,13 @@ const App: FC = () => {
               'Content-Type': 'application/json'
             },
             method: 'POST',
-            body: JSON.stringify({command: 'step', argument: idx, uid: uidApp})
+            body: JSON.stringify({command: 'step', argument: idx, uid: uidApp, version: protocolVersion})
           })
           .then(response => response.json())
           .then(response => {
             setFinished(response.statusCode === 501)
             if (response.statusCode != 501) {
-                update(response.result.scene);
+                update(response.result.changed);
                 setLastAgentTarget(response.result.action);
                 updateScene[response.result.action].isAgentTarget = true;
                 setResItemNum(resItemNum - 1);